@@ -0,0 +1,266 @@
+import os
+import random
+import sys
+import time
+from collections import deque
+from functools import partial
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from artifact_store import content_key, source_digest
+from record_io import RecordWriter, iter_records
+from run_metrics import RecordStats, RunMetrics
+from workers import map_records
+
+from cot_scanner import scan_cot
+from format_random_cot import format_item
+from generate_step_sequences import iter_dag_sorts, parse_dependencies
+from renumber_steps import renumber_output_list
+from reorganize_steps import arrange_steps, record_instruction, reorganize_entry, select_dag_sequences, skip_reason
+from step_dag import StepDAG, process_cache
+
+# Intermediate stages that can be dumped for debugging, in pipeline order.
+STAGES = ("dependencies", "sequences", "steps", "reorganized", "renumbered")
+
+# Sources whose code determines the output of `augment_record`; part of the incremental-build key.
+# The shared modules decide which orders are sampled (`workers.sample_ranks`) and how records are read.
+ANSWER_DIR = os.path.dirname(os.path.abspath(__file__))
+CODE_DIR = os.path.dirname(ANSWER_DIR)
+SOURCE_FILES = tuple(
+    os.path.join(ANSWER_DIR, f"{name}.py")
+    for name in ("augment_pipeline", "cot_scanner", "format_random_cot", "generate_step_sequences", "order_policy",
+                 "renumber_steps", "reorganize_steps", "step_dag")
+) + tuple(os.path.join(CODE_DIR, f"{name}.py") for name in ("record_io", "workers"))
+
+
+def augment_record(record, output_field='output', max_sequences=None, sample_k=None, rng=None, taps=None, cache=None, stats=None, policy=None):
+    """
+    Runs every answer-augmentation stage on a single record in memory.
+
+    This is the fused equivalent of extract_answer_steps -> generate_step_sequences -> extract_steps_only
+    -> reorganize_steps -> renumber_steps -> format_random_cot.
+
+    Args:
+        record (dict): The input record containing `instruction` (or the FOLIO fields of
+            `reorganize_steps.record_instruction`) and the step-by-step solution.
+        output_field (str): Field of the record holding the step-by-step solution.
+        max_sequences (int, optional): Maximum number of step sequences enumerated per record.
+        sample_k (int, optional): Sample this many distinct step sequences uniformly instead of the first ones.
+            Without either, the original order and one random order are drawn from the DAG
+            (`reorganize_steps.select_dag_sequences`) without enumerating its orders.
+        rng (random.Random, optional): Random generator used for sampling.
+        taps (dict, optional): Maps a stage name from `STAGES` to a writer receiving that stage's records.
+        cache (DAGCache, optional): Cache reusing the counts and orderings of dependency graphs with the same shape.
+        stats (RecordStats, optional): Receives the time spent in each stage, the DAG size and why variants are dropped.
+        policy (OrderPolicy, optional): Chooses the step orders on the DAG instead of enumerating
+            sequences and picking from them; `max_sequences` and `sample_k` are then unused.
+
+    Returns:
+        list: The formatted training records ({"instruction", "input", "output"}); empty if the record is skipped.
+    """
+    taps = taps or {}
+    rng = rng or random
+    stats = stats or RecordStats()
+    output_text = record.get(output_field) or ''
+    start = time.perf_counter()
+
+    # Dependencies and step blocks both come from a single scan of the text.
+    scan = scan_cot(output_text)
+    entry = dict(record)
+    entry['Premises and steps required'] = conditions_info = scan.conditions()
+    if 'dependencies' in taps:
+        taps['dependencies'].write(entry)
+    start = stats.lap("scan", start)
+
+    graph = parse_dependencies(conditions_info['Used'])
+    dag = cache.lookup(graph) if cache is not None else StepDAG.from_graph(graph)
+    # Without a bound on the enumeration, the two selected orders are drawn from the DAG directly.
+    selected = policy is not None or (max_sequences is None and sample_k is None)
+    if policy is not None:
+        sequences = policy.select_labels(dag, rng) if len(dag) else [[]]
+    elif selected:
+        sequences = select_dag_sequences(dag, rng)
+    else:
+        sequences = list(iter_dag_sorts(dag, max_sequences=max_sequences, sample_k=sample_k, rng=rng, cache=cache))
+    entry['Reasonable sequence of steps'] = {
+        "Number of sequences": len(sequences),
+        "Total sequences": dag.count(),
+        "Sequences": sequences
+    }
+    if 'sequences' in taps:
+        taps['sequences'].write(entry)
+    stats.observe("dag_steps", len(dag.names))
+    stats.observe("dag_edges", sum(len(children) for children in graph.values()))
+    stats.observe("dag_orders", entry['Reasonable sequence of steps']["Total sequences"])
+    start = stats.lap("orders", start)
+
+    entry['output_list'] = scan.output_list()
+    if 'steps' in taps:
+        taps['steps'].write(entry)
+
+    instruction = record_instruction(entry)
+    reason = skip_reason(instruction, sequences, entry['output_list'])
+    if reason is not None:
+        print(f"Skipping entry due to {reason}: {instruction[:50]}...")
+        stats.skip(reason)
+        return []
+
+    if selected:
+        reorganized = arrange_steps(instruction, entry['output_list'], sequences, stats)
+    else:
+        reorganized = reorganize_entry(instruction, entry['output_list'], sequences, len(sequences), rng=rng, stats=stats)
+    start = stats.lap("reorganize", start)
+
+    formatted = []
+    for item in reorganized:
+        if 'reorganized' in taps:
+            taps['reorganized'].write(item)
+        item = dict(item, output_list=renumber_output_list(list(item['output_list'])))
+        if 'renumbered' in taps:
+            taps['renumbered'].write(item)
+        formatted.append(format_item(item))
+    stats.lap("renumber_format", start)
+
+    return formatted
+
+
+def run_pipeline(input_path, output_path, dump_paths=None, output_field='output', max_sequences=None, sample_k=None, seed=None, workers=1, cache_size=4096,
+                 metrics=None, policy=None, store=None):
+    """
+    Streams a JSON/JSONL file of CoT records through the fused answer-augmentation pipeline.
+
+    Records are read and written one at a time, so memory stays bounded by a single record
+    regardless of the corpus size.
+
+    Args:
+        input_path (str): Path to the input JSON/JSONL file with `instruction` and the step-by-step solution.
+        output_path (str): Path to the output file with the formatted training records (JSONL unless it ends with .json).
+        dump_paths (dict, optional): Maps a stage name from `STAGES` to a file receiving that stage's records.
+        output_field (str): Field of the record holding the step-by-step solution.
+        max_sequences (int, optional): Maximum number of step sequences enumerated per record.
+        sample_k (int, optional): Sample this many distinct step sequences uniformly instead of the first ones.
+        seed (int, optional): Base seed of the per-record random generators; results do not depend on `workers`.
+        workers (int): Number of worker processes.
+        cache_size (int, optional): Number of dependency shapes cached per process (see `DAGCache`); None disables the cache.
+        metrics (RunMetrics, optional): Receives the metrics of the "augment" stage: per-step time, DAG sizes and skip reasons.
+        policy (OrderPolicy, optional): Chooses the step orders of each record on its DAG (see `augment_record`).
+        store (ArtifactStore, optional): Enables the incremental build: the formatted records of each input
+            record are stored under a hash of the record, the pipeline code and the configuration, and only
+            records without a stored result are processed. Each record's random generator is then seeded
+            from its content hash instead of its position, so a record keeps its output when others are
+            added or removed.
+
+    Returns:
+        None (Generates the processed JSON file at `output_path`).
+    """
+    dump_paths = dump_paths or {}
+    unknown = set(dump_paths) - set(STAGES)
+    if unknown:
+        raise ValueError(f"Unknown stages: {', '.join(sorted(unknown))}. Expected one of: {', '.join(STAGES)}")
+    if store is not None and dump_paths:
+        raise ValueError("Intermediate stages cannot be dumped in an incremental build; cached records skip them.")
+
+    task = partial(_augment_task, output_field=output_field, max_sequences=max_sequences, sample_k=sample_k,
+                   stages=tuple(dump_paths), cache_size=cache_size, policy=policy)
+    taps = {stage: RecordWriter(path) for stage, path in dump_paths.items()}
+    metrics = metrics or RunMetrics()
+    num_records = 0
+    computed = 0
+    cache_hits = 0
+
+    with metrics.stage("augment") as stage_metrics:
+        stage_metrics.read_file(input_path)
+        try:
+            with RecordWriter(output_path) as writer:
+                if store is None:
+                    results = map_records(task, iter_records(input_path), workers=workers, seed=seed)
+                else:
+                    config = {"output_field": output_field, "max_sequences": max_sequences, "sample_k": sample_k, "seed": seed,
+                              "policy": policy.describe() if policy is not None else None}
+                    prefix = content_key(source_digest(SOURCE_FILES), config)
+                    results = _incremental_results(task, iter_records(input_path), store, prefix, workers, seed)
+                for formatted, buffers, cache_hit, stats in results:
+                    num_records += 1
+                    if stats is not None:
+                        computed += 1
+                        cache_hits += cache_hit
+                        stage_metrics.merge(stats)
+                    for stage, records in buffers.items():
+                        for record in records:
+                            taps[stage].write(record)
+                    for item in formatted:
+                        writer.write(item)
+        finally:
+            for tap in taps.values():
+                tap.close()
+
+        stage_metrics.records_in += num_records
+        stage_metrics.records_out += writer.count
+        stage_metrics.wrote_file(output_path)
+        for path in dump_paths.values():
+            stage_metrics.wrote_file(path)
+        if cache_size is not None:
+            stage_metrics.counters["dag cache lookups"] += computed
+            stage_metrics.counters["dag cache hits"] += cache_hits
+        if store is not None:
+            stage_metrics.counters["incremental records reused"] += num_records - computed
+            stage_metrics.counters["incremental records computed"] += computed
+
+    print(f"Successfully generated {writer.count} entries from {num_records} records.")
+    print(f"Processed file saved at: {output_path}")
+    if store is not None:
+        print(f"Incremental build: {num_records - computed} records reused, {computed} recomputed.")
+    if cache_size is not None and computed:
+        print(f"DAG cache: {cache_hits} hits out of {computed} lookups ({cache_hits / computed:.2%}).")
+
+
+def _augment_task(record, rng, output_field, max_sequences, sample_k, stages, cache_size, policy=None):
+    """
+    Runs `augment_record` in a worker, buffering the requested intermediate stages; also returns
+    whether the DAG shape was cached and the `RecordStats` of the record.
+    """
+    buffers = {stage: _StageBuffer() for stage in stages}
+    cache = process_cache(cache_size) if cache_size is not None else None
+    hits = cache.hits if cache is not None else 0
+    stats = RecordStats()
+    formatted = augment_record(record, output_field, max_sequences, sample_k, rng, buffers, cache, stats, policy)
+    return formatted, buffers, cache is not None and cache.hits > hits, stats
+
+
+def _incremental_results(task, records, store, prefix, workers, seed):
+    """
+    Yields `task` results like `map_records`, answering the records found in `store` from it and
+    storing the new ones; stored results come with empty buffers and no `RecordStats`.
+    """
+    found = deque()
+
+    def keyed_records():
+        for record in records:
+            key = content_key(prefix, record)
+            formatted = store.get(key)
+            found.append((key, formatted))
+            # Stored records are not sent to the workers.
+            yield key, record if formatted is None else None
+
+    for result in map_records(partial(_keyed_task, task=task, seed=seed), keyed_records(), workers=workers):
+        key, formatted = found.popleft()
+        if result is None:
+            yield formatted, {}, False, None
+        else:
+            store.put(key, result[0])
+            yield result
+    store.commit()
+
+
+def _keyed_task(item, rng, task, seed):
+    """Runs `task` on a (content key, record) pair with a generator seeded from the key; None for stored records."""
+    key, record = item
+    if record is None:
+        return None
+    return task(record, random.Random(f"{seed}:{key}"))
+
+
+class _StageBuffer(list):
+    """Collects snapshots of a stage's records so they can be sent back to the main process."""
+
+    def write(self, record):
+        self.append(dict(record))
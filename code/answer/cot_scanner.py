@@ -0,0 +1,112 @@
+import re
+
+# Every marker the scanner stops at, in a single alternation: step headers, dependency clauses
+# and the final conclusion.
+MARKER_PATTERN = re.compile(r"Step (\d+):|(Premises and steps required: )|(Final Conclusion)")
+
+# A "Premise(s)" / "Step(s)" reference followed by one or more numbers ("1", "1, 2", "1, 2, and 3", "1 and 2").
+REFERENCE_PATTERN = re.compile(r"(Premise|Step)s? (\d+(?:(?:\s*,\s*(?:and\s+)?|\s+and\s+)\d+)*)")
+NUMBER_PATTERN = re.compile(r"\d+")
+
+
+class CoTScan:
+    """
+    The parts of a step-by-step explanation found by `scan_cot`.
+
+    Attributes:
+        preamble (str): Text before the first "Step X:" header.
+        steps (list): The "Step X" blocks before the "Final Conclusion", unstripped.
+        dependencies (list): (step number, references) pairs, one per "Premises and steps required" clause.
+        final_conclusion (str or None): Text following the first "Final Conclusion", or None if there is none.
+    """
+
+    __slots__ = ("preamble", "steps", "dependencies", "final_conclusion")
+
+    def __init__(self, preamble, steps, dependencies, final_conclusion):
+        self.preamble = preamble
+        self.steps = steps
+        self.dependencies = dependencies
+        self.final_conclusion = final_conclusion
+
+    def conditions(self):
+        """
+        Returns the step dependencies in the format of `extract_answer_steps.extract_conditions_and_steps`.
+        """
+        return {
+            "Number of Steps": len(self.dependencies),
+            "Used": [{f"Step {step}": references} for step, references in self.dependencies]
+        }
+
+    def output_list(self):
+        """
+        Returns the stripped step blocks followed by the "Final Conclusion", as `extract_steps_only.extract_steps`.
+        """
+        blocks = [self.preamble] + self.steps
+        output_list = [block.strip() for block in blocks if block.strip().startswith("Step")]
+        if self.final_conclusion is not None:
+            output_list.append("Final Conclusion" + self.final_conclusion.strip())
+        return output_list
+
+
+def parse_references(clause):
+    """
+    Parses a dependency clause such as "Premises 1, 2, and Step 3" into ["Premise 1", "Premise 2", "Step 3"].
+    """
+    references = []
+    for kind, numbers in REFERENCE_PATTERN.findall(clause):
+        references.extend(f"{kind} {number}" for number in NUMBER_PATTERN.findall(numbers))
+    return references
+
+
+def scan_cot(output_text):
+    """
+    Scans a step-by-step explanation once and returns its step blocks, dependencies and final conclusion.
+
+    A dependency clause belongs to the closest preceding "Step X:" header that does not already
+    have one, and runs up to the next period. Step blocks are split at every "Step X:" header
+    before the first "Final Conclusion". Markers are found by a single compiled alternation and
+    clause ends with `str.find`, so the text is walked once, without the backtracking of lazy
+    DOTALL patterns when a terminator is missing.
+
+    Args:
+        output_text (str): The step-by-step explanation.
+
+    Returns:
+        CoTScan: The parsed explanation.
+    """
+    headers = []
+    dependencies = []
+    final_start = None
+    pending_step = None
+    clause_end = 0
+    clauses_done = False
+
+    for match in MARKER_PATTERN.finditer(output_text):
+        step, clause, final = match.groups()
+        if step is not None:
+            if final_start is None:
+                headers.append(match.start())
+            # Headers inside an already parsed clause cannot open a new one.
+            if pending_step is None and match.start() >= clause_end:
+                pending_step = step
+        elif clause is not None:
+            if pending_step is None or clauses_done or match.start() < clause_end:
+                continue
+            end = output_text.find(".", match.end())
+            if end < 0:
+                # Without a terminating period no later clause can be complete either.
+                clauses_done = True
+                pending_step = None
+                continue
+            dependencies.append((pending_step, parse_references(output_text[match.end():end])))
+            clause_end = end + 1
+            pending_step = None
+        elif final_start is None:
+            final_start = match.start()
+
+    steps_end = len(output_text) if final_start is None else final_start
+    bounds = headers + [steps_end]
+    preamble = output_text[:bounds[0]]
+    steps = [output_text[bounds[i]:bounds[i + 1]] for i in range(len(headers))]
+    final_conclusion = None if final_start is None else output_text[final_start + len("Final Conclusion"):]
+    return CoTScan(preamble, steps, dependencies, final_conclusion)
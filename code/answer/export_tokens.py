@@ -0,0 +1,265 @@
+import json
+import mmap
+import os
+import sys
+from array import array
+from bisect import bisect_left
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from record_io import iter_records
+
+# Token IDs and record indices are stored as unsigned 32-bit integers, offsets as unsigned 64-bit integers.
+TOKEN_TYPECODE = 'I'
+OFFSET_TYPECODE = 'Q'
+
+# Upper bounds (in tokens) of the length buckets; longer records go to a last overflow bucket.
+DEFAULT_BUCKETS = (128, 256, 512, 1024, 2048, 4096)
+
+
+class WhitespaceTokenizer:
+    """
+    Offline tokenizer for tests and dry runs: splits on whitespace and numbers words in order of appearance.
+    """
+
+    name = "whitespace"
+
+    def __init__(self):
+        self.vocab = {}
+
+    def encode(self, text):
+        vocab = self.vocab
+        return [vocab.setdefault(word, len(vocab)) for word in text.split()]
+
+    def describe(self):
+        return {"tokenizer": self.name, "vocab_size": len(self.vocab)}
+
+    def save(self, output_dir):
+        with open(os.path.join(output_dir, "vocab.json"), 'w', encoding='utf-8') as file:
+            json.dump(list(self.vocab), file, ensure_ascii=False)
+
+
+class HFTokenizer:
+    """
+    Hugging Face tokenizer of the model to fine-tune; `transformers` is only imported when it is used.
+    """
+
+    name = "hf"
+
+    def __init__(self, model_path):
+        from transformers import AutoTokenizer
+
+        self.model_path = model_path
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path)
+
+    def encode(self, text):
+        return self.tokenizer.encode(text, add_special_tokens=False)
+
+    def describe(self):
+        return {"tokenizer": self.name, "model": self.model_path, "vocab_size": len(self.tokenizer)}
+
+    def save(self, output_dir):
+        pass
+
+
+TOKENIZERS = {
+    WhitespaceTokenizer.name: WhitespaceTokenizer,
+    HFTokenizer.name: HFTokenizer,
+}
+
+
+def record_texts(record):
+    """
+    Returns the (prompt, response) texts of a training record with `instruction`, `input` and `output`.
+    """
+    prompt = record.get('instruction', '')
+    if record.get('input'):
+        prompt = f"{prompt}\n{record['input']}"
+    return prompt, record.get('output', '')
+
+
+def bucket_labels(boundaries):
+    return [f"<={bound}" for bound in boundaries] + [f">{boundaries[-1]}"]
+
+
+def export_tokens(inputs, output_dir, tokenizer, boundaries=DEFAULT_BUCKETS, type_field='augmentation'):
+    """
+    Tokenizes training records into a flat token buffer with an offsets index, bucketed by length.
+
+    The output directory holds:
+        tokens.bin          all token IDs (uint32), prompt then response, record after record
+        offsets.bin         n + 1 offsets (uint64) into tokens.bin; record i is tokens[offsets[i]:offsets[i + 1]]
+        prompt_lengths.bin  number of prompt tokens of each record (uint32), to mask the prompt in the loss
+        types.bin           augmentation type of each record (uint8, index into meta["types"])
+        order.bin           record indices (uint32) grouped by length bucket; bucket b is
+                            order[meta["bucket_offsets"][b]:meta["bucket_offsets"][b + 1]]
+        meta.json           tokenizer, buckets, types and per-type token-count histograms
+
+    Args:
+        inputs (list): (augmentation type, path) pairs of formatted training files.
+        output_dir (str): Directory to write the export to.
+        tokenizer: Object with `encode(text)`, `describe()` and `save(output_dir)` (see `TOKENIZERS`).
+        boundaries (tuple): Increasing upper bounds of the length buckets.
+        type_field (str): Record field overriding the augmentation type of its input file, when present.
+
+    Returns:
+        dict: The metadata written to meta.json.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    offsets = array(OFFSET_TYPECODE, [0])
+    prompt_lengths = array(TOKEN_TYPECODE)
+    types = array('B')
+    buckets = array('B')
+    type_names = []
+    type_index = {}
+    histograms = {}
+
+    with open(os.path.join(output_dir, "tokens.bin"), 'wb') as tokens_file:
+        for input_type, path in inputs:
+            for record in iter_records(path):
+                record_type = record.get(type_field, input_type)
+                if record_type not in type_index:
+                    if len(type_names) == 256:
+                        raise ValueError("At most 256 augmentation types can be exported.")
+                    type_index[record_type] = len(type_names)
+                    type_names.append(record_type)
+                    histograms[record_type] = {"records": 0, "tokens": 0, "max": 0, "buckets": [0] * (len(boundaries) + 1)}
+
+                prompt, response = record_texts(record)
+                prompt_ids = tokenizer.encode(prompt)
+                ids = array(TOKEN_TYPECODE, prompt_ids)
+                ids.extend(tokenizer.encode(response))
+                ids.tofile(tokens_file)
+
+                length = len(ids)
+                bucket = bisect_left(boundaries, length)
+                offsets.append(offsets[-1] + length)
+                prompt_lengths.append(len(prompt_ids))
+                types.append(type_index[record_type])
+                buckets.append(bucket)
+
+                histogram = histograms[record_type]
+                histogram["records"] += 1
+                histogram["tokens"] += length
+                histogram["max"] = max(histogram["max"], length)
+                histogram["buckets"][bucket] += 1
+
+    # Record indices grouped by bucket, in input order within a bucket.
+    order = array(TOKEN_TYPECODE)
+    bucket_offsets = [0]
+    for bucket in range(len(boundaries) + 1):
+        order.extend(index for index, value in enumerate(buckets) if value == bucket)
+        bucket_offsets.append(len(order))
+
+    for name, values in (("offsets", offsets), ("prompt_lengths", prompt_lengths), ("types", types), ("order", order)):
+        with open(os.path.join(output_dir, f"{name}.bin"), 'wb') as file:
+            values.tofile(file)
+    tokenizer.save(output_dir)
+
+    labels = bucket_labels(boundaries)
+    for histogram in histograms.values():
+        histogram["mean"] = histogram["tokens"] / histogram["records"]
+        histogram["buckets"] = dict(zip(labels, histogram["buckets"]))
+
+    meta = {
+        **tokenizer.describe(),
+        "records": len(prompt_lengths),
+        "tokens": offsets[-1],
+        "token_dtype": "uint32",
+        "bucket_boundaries": list(boundaries),
+        "bucket_offsets": bucket_offsets,
+        "types": type_names,
+        "histograms": histograms,
+    }
+    with open(os.path.join(output_dir, "meta.json"), 'w', encoding='utf-8') as file:
+        json.dump(meta, file, ensure_ascii=False, indent=2)
+    return meta
+
+
+class TokenizedCorpus:
+    """
+    Read-only, memory-mapped view of a directory written by `export_tokens`.
+
+    Records are zero-copy `memoryview`s of uint32 token IDs, so a training loader can start
+    without tokenizing and draw batches of similar length from `bucket(b)`.
+    """
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, "meta.json"), encoding='utf-8') as file:
+            self.meta = json.load(file)
+        self._maps = []
+        self._views = []
+        self.tokens = self._map(os.path.join(directory, "tokens.bin"), TOKEN_TYPECODE)
+        self.offsets = self._map(os.path.join(directory, "offsets.bin"), OFFSET_TYPECODE)
+        self.prompt_lengths = self._map(os.path.join(directory, "prompt_lengths.bin"), TOKEN_TYPECODE)
+        self.types = self._map(os.path.join(directory, "types.bin"), 'B')
+        self.order = self._map(os.path.join(directory, "order.bin"), TOKEN_TYPECODE)
+
+    def _map(self, path, typecode):
+        with open(path, 'rb') as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                return memoryview(array(typecode))
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        base = memoryview(mapped)
+        view = base.cast(typecode)
+        self._maps.append(mapped)
+        self._views.extend((view, base))
+        return view
+
+    def __len__(self):
+        return len(self.prompt_lengths)
+
+    def __getitem__(self, index):
+        return self.tokens[self.offsets[index]:self.offsets[index + 1]]
+
+    def type_of(self, index):
+        return self.meta["types"][self.types[index]]
+
+    def bucket(self, bucket):
+        """
+        Returns the indices of the records in length bucket `bucket`.
+        """
+        bucket_offsets = self.meta["bucket_offsets"]
+        return self.order[bucket_offsets[bucket]:bucket_offsets[bucket + 1]]
+
+    def close(self):
+        """
+        Unmaps the files; record and bucket views obtained from the corpus must have been dropped.
+        """
+        for view in self._views:
+            view.release()
+        for mapped in self._maps:
+            mapped.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def format_report(meta):
+    """
+    Formats the per-type token-count histograms of an export as text.
+    """
+    labels = bucket_labels(meta["bucket_boundaries"])
+    lines = [f"{meta['records']} records, {meta['tokens']} tokens ({meta['tokenizer']} tokenizer)"]
+    lines.append("type".ljust(24) + "records".rjust(9) + "mean".rjust(9) + "max".rjust(8) + "".join(label.rjust(8) for label in labels))
+    for name in meta["types"]:
+        histogram = meta["histograms"][name]
+        lines.append(
+            str(name)[:23].ljust(24) + str(histogram["records"]).rjust(9) + f"{histogram['mean']:.1f}".rjust(9)
+            + str(histogram["max"]).rjust(8) + "".join(str(histogram["buckets"][label]).rjust(8) for label in labels)
+        )
+    return "\n".join(lines)
+
+
+def parse_input(value):
+    """
+    Parses a `[TYPE=]PATH` input; the augmentation type defaults to the file name without extensions.
+    """
+    name, sep, path = value.partition('=')
+    if not sep:
+        path = value
+        name = os.path.basename(value).split('.')[0]
+    return name, path
+
@@ -1,10 +1,20 @@
-import json
-import re
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from record_io import iter_records, write_records
+from run_metrics import RunMetrics
+from workers import map_records
+
+from cot_scanner import scan_cot
 
 def extract_conditions_and_steps(output_text):
     """
     Parses the `model_output` field and extracts the dependencies of each step on premises and previous steps.
 
+    The text is parsed in a single pass by `cot_scanner.scan_cot`; a clause such as
+    "Steps 1, 2, and 3" yields all three steps.
+
     Args:
         output_text (str): The content of `model_output`, containing multiple steps and their dependencies.
 
@@ -18,60 +28,57 @@ def extract_conditions_and_steps(output_text):
             ]
         }
     """
-    pattern = r"Step (\d+):.*?Premises and steps required: (.*?)\."
-    matches = re.findall(pattern, output_text, re.DOTALL)
-
-    steps_used = []
-    for step, conditions in matches:
-        # Handle 'and' conjunctions, e.g., "Premise 1 and Premise 2" -> "Premise 1, Premise 2"
-        conditions = re.sub(r"\band\b", ",", conditions)
-        conditions = re.sub(r"\s*,\s*", ",", conditions)
-
-        # Extract "Premise X" or "Step X" (supports both singular and plural forms)
-        cond_steps = re.findall(r"Premises? (\d+(?:,\d+)*),?|Steps? (\d+(?:,\d+)*),?", conditions)
-
-        extracted = []
-        for premise_group, step_group in cond_steps:
-            if premise_group:
-                premises = [f"Premise {x.strip()}" for x in premise_group.split(",")]
-                extracted.extend(premises)
-            if step_group:
-                steps = [f"Step {x.strip()}" for x in step_group.split(",")]
-                extracted.extend(steps)
-
-        steps_used.append({f"Step {step}": extracted})
-
-    return {
-        "Number of Steps": len(matches),
-        "Used": steps_used
-    }
-
-def process_json_file(input_file, output_file):
+    return scan_cot(output_text).conditions()
+
+def process_entry(entry, rng=None):
+    """
+    Parses the `model_output` field of one entry and stores its step dependencies.
+
+    Args:
+        entry (dict): The entry containing the `model_output` field (modified in place).
+        rng (random.Random, optional): Unused; accepted for `map_records`.
+
+    Returns:
+        dict: The processed entry.
+    """
+    if 'model_output' in entry:
+        entry['Premises and steps required'] = extract_conditions_and_steps(entry['model_output'])
+    return entry
+
+def process_json_file(input_file, output_file, workers=1, metrics=None):
     """
-    Reads a JSON file, parses the `model_output` field, and stores the extracted step dependencies.
+    Streams a JSON/JSONL file, parses the `model_output` field, and stores the extracted step dependencies.
 
     Args:
-        input_file (str): Path to the input JSON file containing the `model_output` field.
-        output_file (str): Path to the output JSON file to store the extracted data.
+        input_file (str): Path to the input JSON/JSONL file containing the `model_output` field.
+        output_file (str): Path to the output file to store the extracted data (JSONL unless it ends with .json).
+        workers (int): Number of worker processes.
+        metrics (RunMetrics, optional): Receives the metrics of the "extract_dependencies" stage.
 
     Returns:
         None (but generates a processed JSON file at `output_file`)
     """
-    with open(input_file, 'r', encoding='utf-8') as file:
-        data = json.load(file)
+    metrics = metrics or RunMetrics()
+    with metrics.stage("extract_dependencies") as stage:
+        stage.read_file(input_file)
 
-    for entry in data:
-        if 'model_output' in entry:
-            conditions_info = extract_conditions_and_steps(entry['model_output'])
-            entry['Premises and steps required'] = conditions_info
+        def entries():
+            for entry in map_records(process_entry, stage.count_in(iter_records(input_file)), workers=workers):
+                if 'Premises and steps required' not in entry:
+                    stage.skip("no model_output")
+                elif not entry['Premises and steps required']['Number of Steps']:
+                    stage.skip("no dependency clauses")
+                else:
+                    stage.observe("dag_steps", entry['Premises and steps required']['Number of Steps'])
+                yield entry
 
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=4, ensure_ascii=False)
+        write_records(output_file, stage.count_out(entries()))
+        stage.wrote_file(output_file)
 
     print(f"Processed file saved at: {output_file}")
 
 if __name__ == "__main__":
     input_file_path = 'data/answer/process/folio_cot.json'
-    output_file_path = 'data/answer/process/folio_step_dependencies.json'
+    output_file_path = 'data/answer/process/folio_step_dependencies.jsonl'
     
     process_json_file(input_file_path, output_file_path)
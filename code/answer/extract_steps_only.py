@@ -1,44 +1,71 @@
-import json
-import re
+import os
+import sys
 
-def process_steps_only(input_file_path, output_file_path):
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from record_io import iter_records, write_records
+from run_metrics import RunMetrics
+from workers import map_records
+
+from cot_scanner import scan_cot
+
+def extract_steps(output_text):
     """
-    Extracts all steps ("Step X") and the "Final Conclusion" from the 'output' field in a JSON file.
+    Splits a step-by-step explanation into its "Step X" blocks followed by the "Final Conclusion".
 
     Args:
-        input_file_path (str): Path to the input JSON file containing the 'output' field with step-by-step explanations.
-        output_file_path (str): Path to the output JSON file where the extracted steps will be saved.
+        output_text (str): The step-by-step explanation.
 
     Returns:
-        None (Generates a processed JSON file at `output_file_path`).
+        list: The stripped step blocks, with the "Final Conclusion" block last when present.
     """
-    with open(input_file_path, 'r', encoding='utf-8') as file:
-        data = json.load(file)
+    return scan_cot(output_text).output_list()
+
+def process_entry(item, rng=None):
+    """
+    Stores the extracted steps of one item's 'output' field in its 'output_list'.
+
+    Args:
+        item (dict): The item containing the 'output' field (modified in place).
+        rng (random.Random, optional): Unused; accepted for `map_records`.
 
-    for item in data:
-        output_text = item.get('output', '')
+    Returns:
+        dict: The processed item.
+    """
+    item['output_list'] = extract_steps(item.get('output', ''))
+    return item
 
-        if "Final Conclusion" in output_text:
-            steps_part, final_conclusion = output_text.split("Final Conclusion", 1)
-            final_conclusion = "Final Conclusion" + final_conclusion.strip()
-        else:
-            steps_part = output_text
-            final_conclusion = None
+def process_steps_only(input_file_path, output_file_path, workers=1, metrics=None):
+    """
+    Extracts all steps ("Step X") and the "Final Conclusion" from the 'output' field in a JSON/JSONL file.
 
-        steps = re.split(r'(?=Step \d+:)', steps_part)
+    Args:
+        input_file_path (str): Path to the input JSON/JSONL file containing the 'output' field with step-by-step explanations.
+        output_file_path (str): Path to the output file where the extracted steps will be saved (JSONL unless it ends with .json).
+        workers (int): Number of worker processes.
+        metrics (RunMetrics, optional): Receives the metrics of the "extract_steps" stage.
 
-        item['output_list'] = [step.strip() for step in steps if step.strip().startswith("Step")]
+    Returns:
+        None (Generates a processed JSON file at `output_file_path`).
+    """
+    metrics = metrics or RunMetrics()
+    with metrics.stage("extract_steps") as stage:
+        stage.read_file(input_file_path)
 
-        if final_conclusion:
-            item['output_list'].append(final_conclusion)
+        def entries():
+            for item in map_records(process_entry, stage.count_in(iter_records(input_file_path)), workers=workers):
+                # reorganize_steps skips entries with fewer than two blocks.
+                if len(item['output_list']) < 2:
+                    stage.skip("fewer than two blocks")
+                stage.observe("steps", sum(block.startswith("Step") for block in item['output_list']))
+                yield item
 
-    with open(output_file_path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=4, ensure_ascii=False)
+        write_records(output_file_path, stage.count_out(entries()))
+        stage.wrote_file(output_file_path)
 
     print(f"Processed file saved at: {output_file_path}")
 
 if __name__ == '__main__':
     input_path = '/data/dell/hqx/FOLIO/code/gpt_condition.json' 
-    output_path = '/data/dell/hqx/FOLIO/answer_ran_new/folio_steps_only.json' 
+    output_path = '/data/dell/hqx/FOLIO/answer_ran_new/folio_steps_only.jsonl' 
     
     process_steps_only(input_path, output_path)
@@ -1,8 +1,12 @@
-import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from record_io import iter_records, write_records
+from run_metrics import RunMetrics
 
 def load_json(file_path):
-    with open(file_path, 'r', encoding='utf-8') as file:
-        return json.load(file)
+    return list(iter_records(file_path))
 
 
 def generate_output(output_list):
@@ -18,6 +22,10 @@ def generate_output(output_list):
     if len(output_list) < 2:
         return output_list[0] if output_list else ""
 
+    if output_list[0].startswith("Step"):
+        # Step blocks without a leading frame block, as extracted by `extract_steps_only`.
+        return "\n\n".join(output_list[:-1]) + f"\n{output_list[-1]}"
+
     first_part = f"{output_list[0]}\n{output_list[1]}"
     middle_parts = "\n\n".join(output_list[2:-1])
     last_part = f"\n{output_list[-1]}"
@@ -25,30 +33,43 @@ def generate_output(output_list):
     return first_part + ("\n\n" + middle_parts if middle_parts else "") + last_part
 
 
+def format_item(item):
+    return {
+        "instruction": item["instruction"],
+        "input": "",
+        "output": generate_output(item["output_list"])
+    }
+
+
 def process_data(data):
-    new_data = []
-    for item in data:
-        new_item = {
-            "instruction": item["instruction"],
-            "input": "",
-            "output": generate_output(item["output_list"])
-        }
-        new_data.append(new_item)
-    return new_data
+    return [format_item(item) for item in data]
 
 
 def save_json(data, file_path):
-    with open(file_path, 'w', encoding='utf-8') as file:
-        json.dump(data, file, ensure_ascii=False, indent=4)
+    write_records(file_path, data)
+
+
+def process_file(input_path, output_path, metrics=None):
+    """
+    Streams renumbered entries and writes them as formatted training records.
+
+    Args:
+        input_path (str): Path to the JSON/JSONL file of renumbered entries.
+        output_path (str): Path to the output file (JSONL unless it ends with .json).
+        metrics (RunMetrics, optional): Receives the metrics of the "format" stage.
+    """
+    metrics = metrics or RunMetrics()
+    with metrics.stage("format") as stage:
+        stage.read_file(input_path)
+        write_records(output_path, stage.count_out(map(format_item, stage.count_in(iter_records(input_path)))))
+        stage.wrote_file(output_path)
 
 
 def main():
-    input_json_path = 'data/answer/process/folio_renumbered_steps.json'
-    output_json_path = 'data/answer/process/folio_cot_ran.json'
+    input_json_path = 'data/answer/process/folio_renumbered_steps.jsonl'
+    output_json_path = 'data/answer/process/folio_cot_ran.jsonl'
 
-    data = load_json(input_json_path)
-    processed_data = process_data(data)
-    save_json(processed_data, output_json_path)
+    process_file(input_json_path, output_json_path)
 
     print(f"Processed data saved to: {output_json_path}")
 
@@ -1,6 +1,13 @@
-import json
-import itertools
-from collections import deque
+import os
+import sys
+from functools import partial
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from record_io import iter_records, write_records
+from run_metrics import RunMetrics
+from workers import map_records, sample_ranks
+
+from step_dag import StepDAG, process_cache
 
 def all_topological_sorts(graph):
     """
@@ -12,38 +19,83 @@ def all_topological_sorts(graph):
     Returns:
         list: A list of all possible topological sequences.
     """
-    indegree = {u: 0 for u in graph} 
-    for u in graph:
-        for v in graph[u]:
-            indegree[v] += 1 
+    return list(iter_topological_sorts(graph))
+
+def iter_topological_sorts(graph, max_sequences=None, sample_k=None, rng=None, cache=None):
+    """
+    Lazily yield topological orderings of a DAG instead of materializing all of them.
+
+    Without `sample_k` the orderings are produced in lexicographic order of the step positions in
+    `graph` (see `StepDAG`), so the first one keeps the original step order, stopping after
+    `max_sequences`. With `sample_k`, that many distinct orderings are drawn uniformly at random by
+    unranking sampled indices, so the cost depends on `sample_k` and not on the total number of orderings.
+
+    Args:
+        graph (dict): A dictionary representing a DAG where keys are step names and values are lists of dependent steps.
+        max_sequences (int, optional): Upper bound on the number of yielded sequences.
+        sample_k (int, optional): Number of distinct orderings to sample uniformly at random.
+        rng (random.Random, optional): Random generator used for sampling (defaults to the `random` module).
+        cache (DAGCache, optional): Cache reusing the counts and orderings of graphs with the same shape.
+
+    Yields:
+        list: One topological sequence at a time.
+    """
+    dag = cache.lookup(graph) if cache is not None else StepDAG.from_graph(graph)
+    return iter_dag_sorts(dag, max_sequences, sample_k, rng, cache)
+
+def iter_dag_sorts(dag, max_sequences=None, sample_k=None, rng=None, cache=None):
+    """
+    Same as `iter_topological_sorts` for an already built `StepDAG`.
+    """
+    limit = max_sequences
+    if sample_k is not None:
+        limit = sample_k if limit is None else min(limit, sample_k)
+    if limit is not None and limit <= 0:
+        return
+
+    if sample_k is not None:
+        total = dag.count()
+        if total > limit:
+            for rank in sample_ranks(total, limit, rng):
+                yield dag.labels(dag.unrank(rank))
+            return
 
-    start_nodes = deque([k for k, v in indegree.items() if v == 0]) 
-    result = []
+    if cache is not None:
+        for order in cache.iter_orders(dag, limit):
+            yield dag.labels(order)
+        return
 
-    def visit(path):
-        if len(path) == len(graph):
-            result.append(list(path)) 
+    for count, sequence in enumerate(dag.iter_labeled_orders(), start=1):
+        yield sequence
+        if limit is not None and count >= limit:
             return
 
-        for v in list(start_nodes):
-            start_nodes.remove(v)
-            path.append(v)
-            for nei in graph[v]:
-                indegree[nei] -= 1
-                if indegree[nei] == 0:
-                    start_nodes.append(nei)
+def count_topological_sorts(graph):
+    """
+    Count the topological orderings of a DAG without enumerating them.
+
+    Args:
+        graph (dict): A dictionary representing a DAG where keys are step names and values are lists of dependent steps.
+
+    Returns:
+        int: The number of valid topological sequences (0 if the graph contains a cycle).
+    """
+    return StepDAG.from_graph(graph).count()
 
-            visit(path)
+def sample_topological_sort(graph, rng=None):
+    """
+    Draw one topological ordering uniformly at random from all valid orderings.
 
-            for nei in graph[v]:
-                if indegree[nei] == 0:
-                    start_nodes.remove(nei)
-                indegree[nei] += 1
-            path.pop()
-            start_nodes.appendleft(v)
+    Args:
+        graph (dict): A dictionary representing a DAG where keys are step names and values are lists of dependent steps.
+        rng (random.Random, optional): Random generator used for sampling (defaults to the `random` module).
 
-    visit([])
-    return result
+    Returns:
+        list or None: A random topological sequence, or None if the graph has no valid ordering.
+    """
+    dag = StepDAG.from_graph(graph)
+    order = dag.sample(rng)
+    return None if order is None else dag.labels(order)
 
 def parse_dependencies(steps_used):
     """
@@ -71,37 +123,105 @@ def parse_dependencies(steps_used):
 
     return graph
 
-def process_json_file(input_file, output_file):
+def process_entry(entry, rng=None, max_sequences=None, sample_k=None, cache=None):
     """
-    Reads a JSON file, parses step dependencies, and generates all possible topological orderings.
+    Parses the step dependencies of one entry and stores its topological orderings.
 
     Args:
-        input_file (str): Path to the input JSON file containing step dependencies.
-        output_file (str): Path to the output JSON file to store the generated sequences.
+        entry (dict): The entry containing 'Premises and steps required' (modified in place).
+        rng (random.Random, optional): Random generator used when sampling orderings.
+        max_sequences (int, optional): Maximum number of sequences stored.
+        sample_k (int, optional): Store this many uniformly sampled distinct sequences instead of the first ones.
+        cache (DAGCache, optional): Cache reusing the counts and orderings of graphs with the same shape.
 
     Returns:
-        None (but generates a processed JSON file at `output_file`).
+        dict: The processed entry.
     """
-    with open(input_file, 'r', encoding='utf-8') as file:
-        data = json.load(file)
+    if 'Premises and steps required' in entry:
+        steps_used = entry['Premises and steps required']['Used']
+        graph = parse_dependencies(steps_used)
+        dag = cache.lookup(graph) if cache is not None else StepDAG.from_graph(graph)
+        sequences = list(iter_dag_sorts(dag, max_sequences=max_sequences, sample_k=sample_k, rng=rng, cache=cache))
+        entry['Reasonable sequence of steps'] = {
+            "Number of sequences": len(sequences),
+            "Total sequences": dag.count(),
+            "Sequences": sequences
+        }
+    return entry
+
+def process_json_file(input_file, output_file, max_sequences=None, sample_k=None, seed=None, workers=1, cache_size=4096, metrics=None):
+    """
+    Streams a JSON/JSONL file, parses step dependencies, and generates the topological orderings.
 
-    for entry in data:
-        if 'Premises and steps required' in entry:
-            steps_used = entry['Premises and steps required']['Used']
-            graph = parse_dependencies(steps_used)
-            sequences = all_topological_sorts(graph)
-            entry['Reasonable sequence of steps'] = {
-                "Number of sequences": len(sequences),
-                "Sequences": sequences
-            }
+    "Number of sequences" is the number of stored sequences, while "Total sequences" is the
+    number of valid orderings that exist, counted without enumerating them.
 
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=4, ensure_ascii=False)
+    Args:
+        input_file (str): Path to the input JSON/JSONL file containing step dependencies.
+        output_file (str): Path to the output file to store the generated sequences (JSONL unless it ends with .json).
+        max_sequences (int, optional): Maximum number of sequences stored per entry.
+        sample_k (int, optional): Store this many uniformly sampled distinct sequences instead of the first ones.
+        seed (int, optional): Seed for the sampling random generator.
+        workers (int): Number of worker processes.
+        cache_size (int, optional): Number of dependency shapes cached per process (see `DAGCache`); None disables the cache.
+        metrics (RunMetrics, optional): Receives the metrics of the "step_sequences" stage, including the DAG size distributions.
+
+    Returns:
+        None (but generates a processed JSON file at `output_file`).
+    """
+    task = partial(_cached_entry_task, max_sequences=max_sequences, sample_k=sample_k, cache_size=cache_size)
+    metrics = metrics or RunMetrics()
+    lookups = hits = 0
+
+    with metrics.stage("step_sequences") as stage:
+        stage.read_file(input_file)
+
+        def entries():
+            nonlocal lookups, hits
+            for entry, hit in map_records(task, stage.count_in(iter_records(input_file)), workers=workers, seed=seed):
+                lookups += hit is not None
+                hits += bool(hit)
+                observe_sequences(stage, entry)
+                yield entry
+
+        write_records(output_file, stage.count_out(entries()))
+        stage.wrote_file(output_file)
+        stage.counters["dag cache lookups"] += lookups
+        stage.counters["dag cache hits"] += hits
 
     print(f"Processed file saved at: {output_file}")
+    if lookups:
+        print(f"DAG cache: {hits} hits out of {lookups} lookups ({hits / lookups:.2%}).")
+
+def observe_sequences(stage, entry):
+    """
+    Records the DAG size and step-order counts of a processed entry, or why it will be skipped downstream.
+    """
+    if 'Reasonable sequence of steps' not in entry:
+        stage.skip("no step dependencies")
+        return
+    used = entry['Premises and steps required']['Used']
+    sequences = entry['Reasonable sequence of steps']
+    if not used:
+        stage.skip("no steps")
+    elif not sequences["Total sequences"]:
+        stage.skip("cyclic step dependencies")
+    stage.observe("dag_steps", len(used))
+    stage.observe("dag_edges", sum(dep.startswith("Step") for step_info in used for deps in step_info.values() for dep in deps))
+    stage.observe("dag_orders", sequences["Total sequences"])
+    stage.observe("sequences", sequences["Number of sequences"])
+
+def _cached_entry_task(entry, rng, max_sequences, sample_k, cache_size):
+    """Runs `process_entry` with the DAG cache of the current process; also returns whether the shape was cached (None without lookup)."""
+    if cache_size is None or 'Premises and steps required' not in entry:
+        return process_entry(entry, rng, max_sequences, sample_k), None
+    cache = process_cache(cache_size)
+    hits = cache.hits
+    entry = process_entry(entry, rng, max_sequences, sample_k, cache)
+    return entry, cache.hits > hits
 
 if __name__ == "__main__":
-    input_file_path = 'data/answer/process/folio_step_dependencies.json'
-    output_file_path = 'data/answer/process/folio_step_sequences.json'
+    input_file_path = 'data/answer/process/folio_step_dependencies.jsonl'
+    output_file_path = 'data/answer/process/folio_step_sequences.jsonl'
     
     process_json_file(input_file_path, output_file_path)
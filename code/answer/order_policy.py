@@ -0,0 +1,159 @@
+import heapq
+import os
+import sys
+from collections import OrderedDict
+from itertools import islice
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from workers import sample_ranks
+
+# Strategies of `OrderPolicy`.
+STRATEGIES = ("uniform", "farthest")
+
+
+def kendall_distance(order, positions):
+    """
+    Returns the Kendall-tau distance between an ordering and the original order: the number of
+    step pairs whose relative order differs.
+
+    Args:
+        order (list): An ordering of step indices.
+        positions (list): Position of each step index in the original order.
+
+    Returns:
+        int: The number of discordant pairs.
+    """
+    seen = 0
+    distance = 0
+    for step in order:
+        position = positions[step]
+        # Steps placed earlier that come later in the original order.
+        distance += (seen >> position).bit_count()
+        seen |= 1 << position
+    return distance
+
+
+class OrderPolicy:
+    """
+    Chooses the step orders of a record directly on its `StepDAG`, without enumerating the
+    orderings into an intermediate list.
+
+    The original order (ordering 0 of the DAG) is kept first when `include_original` is set, and
+    `k` other orderings are added:
+
+        uniform   k distinct orderings drawn uniformly by unranking sampled indices.
+        farthest  the k orderings with the largest Kendall-tau distance to the original one. DAGs
+                  with at most `exhaustive_limit` orderings are searched exhaustively (ties go to the
+                  lexicographically first orderings) and the result is cached per shape; larger DAGs
+                  pick among `candidates` uniformly sampled orderings and the greedy reversal of the
+                  original order.
+
+    With `fix_last`, only orderings that keep the last step of the original order last are
+    considered, unless there are none besides the original, in which case the constraint is dropped
+    for that record.
+
+    Args:
+        strategy (str): One of `STRATEGIES`.
+        k (int): Number of orderings besides the original one.
+        include_original (bool): Keep the original ordering first.
+        fix_last (bool): Keep the original last step last.
+        exhaustive_limit (int): Largest number of orderings searched exhaustively by "farthest".
+        candidates (int): Number of sampled orderings "farthest" chooses from beyond `exhaustive_limit`.
+        max_entries (int): Number of DAG shapes whose constrained DAG and farthest orderings are cached.
+    """
+
+    def __init__(self, strategy="uniform", k=1, include_original=True, fix_last=False, exhaustive_limit=10000, candidates=256,
+                 max_entries=4096):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown strategy '{strategy}'. Expected one of: {', '.join(STRATEGIES)}")
+        self.strategy = strategy
+        self.k = k
+        self.include_original = include_original
+        self.fix_last = fix_last
+        self.exhaustive_limit = exhaustive_limit
+        self.candidates = candidates
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+
+    def __getstate__(self):
+        # Workers receive the settings only; each process fills its own cache.
+        return {**self.__dict__, "_cache": OrderedDict()}
+
+    def describe(self):
+        """
+        Returns the settings that determine the selected orders.
+        """
+        return {name: value for name, value in self.__dict__.items() if not name.startswith('_')}
+
+    def _cached(self, key, build):
+        cache = self._cache
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+        value = cache[key] = build()
+        if len(cache) > self.max_entries:
+            cache.popitem(last=False)
+        return value
+
+    def select(self, dag, rng=None):
+        """
+        Returns the selected orderings of step indices; empty if the graph contains a cycle.
+        """
+        total = dag.count()
+        if total == 0:
+            return []
+        original = dag.unrank(0)
+        orders = [original] if self.include_original else []
+        if self.k <= 0 or total == 1:
+            return orders
+
+        space = dag
+        if self.fix_last:
+            constrained = self._cached(("last", dag.shape()), lambda: dag.constrain_last(original[-1]))
+            # Ordering 0 of the constrained DAG is still the original order.
+            if constrained.count() > 1:
+                space = constrained
+
+        if self.strategy == "uniform":
+            count = min(self.k, space.count() - 1)
+            orders.extend(space.unrank(rank + 1) for rank in sample_ranks(space.count() - 1, count, rng))
+        else:
+            orders.extend(self._farthest(space, original, rng))
+        return orders
+
+    def select_labels(self, dag, rng=None):
+        """
+        Same as `select`, with step names instead of indices.
+        """
+        return [dag.labels(order) for order in self.select(dag, rng)]
+
+    def _farthest(self, space, original, rng):
+        positions = [0] * len(original)
+        for position, step in enumerate(original):
+            positions[step] = position
+
+        def distance(order):
+            return kendall_distance(order, positions)
+
+        total = space.count()
+        if total <= self.exhaustive_limit:
+            key = ("farthest", space.shape())
+            return self._cached(key, lambda: heapq.nlargest(self.k, islice(space.iter_orders(), 1, None), key=distance))
+
+        ranks = sample_ranks(total - 1, min(self.candidates, total - 1), rng)
+        candidates = {tuple(space.unrank(rank + 1)) for rank in ranks}
+        candidates.add(tuple(self._reversal(space, positions)))
+        candidates.discard(tuple(original))
+        return [list(order) for order in heapq.nlargest(self.k, sorted(candidates), key=distance)]
+
+    @staticmethod
+    def _reversal(space, positions):
+        """Greedy ordering that always schedules the available step latest in the original order."""
+        order = []
+        placed = 0
+        while placed != space.full:
+            ready = space._indices(space.available(placed))
+            step = max(ready, key=positions.__getitem__)
+            placed |= 1 << step
+            order.append(step)
+        return order
@@ -1,5 +1,17 @@
-import json
+import os
 import re
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from record_io import iter_records, write_records
+from run_metrics import RunMetrics
+from workers import map_records
+
+# Step references, e.g. "Step 3" (but not "Step 3a" or "Step 31" when looking for 3).
+STEP_PATTERN = re.compile(r'\bStep (\d+)\b')
+
+# Header of a step block, e.g. "Step 3:".
+HEADER_PATTERN = re.compile(r'Step (\d+):')
 
 def renumber_steps(output_list):
     """
@@ -11,11 +23,11 @@ def renumber_steps(output_list):
     Returns:
         tuple: A mapping of old step numbers to new step numbers and a list of original step numbers.
     """
-    step_pattern = re.compile(r'Step (\d+)')
     original_steps = []
 
-    for item in output_list[1:-1]: 
-        match = step_pattern.search(item)
+    # Every block but the "Final Conclusion" that opens with a step header, in order.
+    for item in output_list[:-1]:
+        match = HEADER_PATTERN.match(item)
         if match:
             original_steps.append(int(match.group(1)))
 
@@ -23,49 +35,66 @@ def renumber_steps(output_list):
     return step_map, original_steps
 
 
-def process_file(input_path, output_path):
+def renumber_output_list(output_list):
     """
-    Reads a JSON file, renumbers the steps in 'output_list', and saves the processed data.
+    Renumbers every step reference in the output list so the steps read 'Step 1', 'Step 2', ... in order.
+
+    Each string is rewritten in a single `re.sub` pass whose callback maps the old number to the
+    new one, so replacements never shift the offsets of later matches (e.g. when 9 becomes 10).
 
     Args:
-        input_path (str): Path to the input JSON file.
-        output_path (str): Path to save the processed JSON file.
+        output_list (list): A list of strings containing step descriptions (modified in place).
 
     Returns:
-        None (writes the output to a file)
+        list: The renumbered output list.
     """
-    with open(input_path, 'r', encoding='utf-8') as file:
-        data = json.load(file)
+    step_map, _ = renumber_steps(output_list)
 
-    step_pattern = re.compile(r'\bStep (\d+)\b')
+    def replace(match):
+        new_step_num = step_map.get(int(match.group(1)))
+        return match.group(0) if new_step_num is None else f"Step {new_step_num}"
 
-    for entry in data:
-        output_list = entry.get('output_list', [])
-        
-        step_map, original_steps = renumber_steps(output_list)
+    output_list[:] = [STEP_PATTERN.sub(replace, text) for text in output_list]
+    return output_list
 
-        step_positions = []
-        for index, text in enumerate(output_list):
-            for match in step_pattern.finditer(text):
-                step_num = int(match.group(1))
-                if step_num in original_steps:
-                    step_positions.append((index, match.start(), step_num))
 
-        for idx, pos, original in step_positions:
-            if original in step_map:
-                new_step_num = step_map[original]
-                current_text = output_list[idx]
-                output_list[idx] = (
-                    current_text[:pos + 5] + str(new_step_num) + current_text[pos + 5 + len(str(original)):]
-                )
-            else:
-                print(f"Warning: Step number {original} not found in mapping.")
+def process_entry(entry, rng=None):
+    """
+    Renumbers the steps in the 'output_list' of one entry.
+
+    Args:
+        entry (dict): The entry containing 'output_list' (modified in place).
+        rng (random.Random, optional): Unused; accepted for `map_records`.
 
-    with open(output_path, 'w', encoding='utf-8') as file:
-        json.dump(data, file, indent=4, ensure_ascii=False)
+    Returns:
+        dict: The processed entry.
+    """
+    renumber_output_list(entry.get('output_list', []))
+    return entry
+
+
+def process_file(input_path, output_path, workers=1, metrics=None):
+    """
+    Streams a JSON/JSONL file, renumbers the steps in 'output_list', and saves the processed data.
+
+    Args:
+        input_path (str): Path to the input JSON/JSONL file.
+        output_path (str): Path to save the processed file (JSONL unless it ends with .json).
+        workers (int): Number of worker processes.
+        metrics (RunMetrics, optional): Receives the metrics of the "renumber" stage.
+
+    Returns:
+        None (writes the output to a file)
+    """
+    metrics = metrics or RunMetrics()
+    with metrics.stage("renumber") as stage:
+        stage.read_file(input_path)
+        entries = map_records(process_entry, stage.count_in(iter_records(input_path)), workers=workers)
+        write_records(output_path, stage.count_out(entries))
+        stage.wrote_file(output_path)
 
 
 if __name__ == "__main__":
-    input_path = 'data/answer/process/folio_reorganized_steps.json'
-    output_path = 'data/answer/process/folio_renumbered_steps.json'
+    input_path = 'data/answer/process/folio_reorganized_steps.jsonl'
+    output_path = 'data/answer/process/folio_renumbered_steps.jsonl'
     process_file(input_path, output_path)
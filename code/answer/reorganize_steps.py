@@ -1,74 +1,280 @@
-import json
+import os
 import random
+import sys
+from functools import lru_cache, partial
 
-def process_file(output_list_path, sequences_path, output_path):
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from record_index import zip_records
+from record_io import write_records
+from run_metrics import RecordStats, RunMetrics
+from workers import map_records
+
+from generate_step_sequences import parse_dependencies
+from renumber_steps import HEADER_PATTERN
+from step_dag import StepDAG
+
+# First line of the instructions of the CoT training data.
+COT_INSTRUCTION = ("Please solve the question step by step based on First-Order Logic rules such as Modus Ponens, "
+                   "determine whether the conclusion is true, false, or unknown based on these premises.")
+
+@lru_cache(maxsize=4096)
+def step_number(step):
     """
-    Reorganizes step sequences in the output_list based on the given sequences of logical steps.
+    Returns the number of a "Step X" name; each distinct name is parsed once.
+    """
+    return int(step.split()[1])
+
+def select_sequences(sequences, num_sequences, rng=None):
+    """
+    Picks the first sequence and, when there are more than two, one random extra sequence,
+    preferably one keeping the last step last.
 
     Args:
-        output_list_path (str): Path to the JSON file containing the extracted steps (output_list).
-        sequences_path (str): Path to the JSON file containing the generated reasonable step sequences.
-        output_path (str): Path to the output JSON file where the reorganized data will be saved.
+        sequences (list): The generated reasonable step sequences.
+        num_sequences (int): The number of generated sequences.
+        rng (random.Random, optional): Random generator used to pick the extra sequence (defaults to the `random` module).
 
     Returns:
-        None (Generates a processed JSON file at `output_path`).
+        list: The selected sequences.
+    """
+    rng = rng or random
+    if num_sequences <= 2:
+        return sequences
+    valid_sequences = [seq for seq in sequences[1:] if step_number(seq[-1]) == len(seq)]
+    return [sequences[0]] + (rng.sample(valid_sequences, 1) if valid_sequences else rng.sample(sequences[1:], 1))
+
+def select_dag_sequences(dag, rng=None):
+    """
+    Picks sequences like `select_sequences` from all the orders of a step DAG, without enumerating them.
+
+    The first order of the DAG is the original one. The extra order is drawn uniformly by
+    unranking: among the other orders ending with the last step (`StepDAG.constrain_last`) when
+    there are any, among all the other orders otherwise.
+
+    Args:
+        dag (StepDAG): The step DAG of the entry.
+        rng (random.Random, optional): Random generator used to pick the extra sequence (defaults to the `random` module).
+
+    Returns:
+        list: The selected sequences of step names; empty if the DAG contains a cycle.
+    """
+    rng = rng or random
+    total = dag.count()
+    if total <= 2:
+        return [dag.labels(order) for order in dag.iter_orders()]
+    first = dag.unrank(0)
+    last = f"Step {len(dag)}"
+    if last in dag.names:
+        index = dag.names.index(last)
+        constrained = dag.constrain_last(index)
+        # Orders ending with the last step keep the lexicographic order, so the first one is their rank 0.
+        offset = 1 if first[-1] == index else 0
+        candidates = constrained.count() - offset
+        if candidates > 0:
+            return [dag.labels(first), dag.labels(constrained.unrank(offset + rng.randrange(candidates)))]
+    return [dag.labels(first), dag.labels(dag.unrank(1 + rng.randrange(total - 1)))]
+
+def record_instruction(record):
     """
-    with open(output_list_path, 'r', encoding='utf-8') as file_list, open(sequences_path, 'r', encoding='utf-8') as file_sequences:
-        output_list_data = json.load(file_list)
-        sequences_data = json.load(file_sequences)
+    Returns the instruction of a record, built from its FOLIO fields ('premises', 'premises-FOL',
+    'conclusion', 'conclusion-FOL') in the format of the CoT training data when it has none.
 
+    Returns:
+        str: The instruction; empty if the record has neither an instruction nor premises and a conclusion.
+    """
+    if record.get('instruction'):
+        return record['instruction']
+    if not record.get('premises') or not record.get('conclusion'):
+        return ''
+    sections = [COT_INSTRUCTION, f"Premises:\n{record['premises']}"]
+    if record.get('premises-FOL'):
+        sections.append(f"Premises-FOL:\n{record['premises-FOL']}")
+    sections.append(f"Conclusion:\n{record['conclusion']}")
+    if record.get('conclusion-FOL'):
+        sections.append(f"Conclusion-FOL:\n{record['conclusion-FOL']}")
+    return "\n\n".join(sections)
+
+def skip_reason(instruction, sequences, output_list):
+    """
+    Returns why the steps of an entry cannot be rearranged in its sequences, or None if they can.
+
+    `arrange_steps` replaces every "Step X" block before the "Final Conclusion" with the steps of
+    each sequence, so a sequence must name exactly that many steps. An entry without
+    "Premises and steps required" clauses has an empty DAG, whose only sequence is empty.
+
+    Args:
+        instruction (str): The instruction of the entry.
+        sequences (list): The step sequences of the entry.
+        output_list (list): The extracted "Step X" blocks followed by the "Final Conclusion".
+
+    Returns:
+        str or None: The skip reason.
+    """
+    if not instruction:
+        return "missing instruction"
+    if not sequences or len(output_list) < 2:
+        return "missing sequences or insufficient steps"
+    if not sequences[0]:
+        return "no step dependencies"
+    if not output_list[-1].startswith("Final Conclusion"):
+        return "missing final conclusion"
+    if any(len(sequence) != len(output_list) - 1 for sequence in sequences):
+        return "step count differs from dependencies"
+    return None
+
+def arrange_steps(instruction, original_output_list, selected_sequences, stats=None):
+    """
+    Builds one variant of an entry per selected sequence, with the steps rearranged in that order.
+
+    Each "Step X" of a sequence is the block whose header is "Step X:"; the blocks before the
+    "Final Conclusion" are replaced by the steps of the sequence.
+
+    Args:
+        instruction (str): The instruction of the entry.
+        original_output_list (list): The extracted "Step X" blocks followed by the "Final Conclusion".
+        selected_sequences (list): The step sequences to build.
+        stats (RecordStats, optional): Receives the number of dropped configurations.
+
+    Returns:
+        list: The reorganized entries, each with "instruction" and "output_list".
+    """
     new_data = []
+    blocks = {}
+    for block in original_output_list[:-1]:
+        match = HEADER_PATTERN.match(block)
+        if match:
+            blocks.setdefault(int(match.group(1)), block)
+
+    for sequence in selected_sequences:
+        modified_output_list = original_output_list.copy()
+
+        steps_text = []
+        for step in sequence:
+            block = blocks.get(step_number(step))
+            if block is not None:
+                steps_text.append(block)
+            else:
+                print(f"Warning: {step} has no block among the {len(blocks)} steps. Skipping.")
+                continue
+
+        if len(steps_text) == len(sequence):
+            modified_output_list[:-1] = steps_text
+            new_entry = {
+                "instruction": instruction,
+                "output_list": modified_output_list
+            }
+            new_data.append(new_entry)
+        else:
+            print("Warning: Some steps could not be found, skipping this configuration.")
+            if stats is not None:
+                stats.skip("step out of range (configuration)")
+
+    return new_data
+
+def reorganize_entry(instruction, original_output_list, sequences, num_sequences, rng=None, stats=None):
+    """
+    Builds the reorganized variants of a single entry from its reasonable step sequences.
 
-    for list_entry, sequence_entry in zip(output_list_data, sequences_data):
-        instruction = list_entry.get('instruction', '')
-        original_output_list = list_entry.get('output_list', [])
+    Args:
+        instruction (str): The instruction of the entry.
+        original_output_list (list): The extracted "Step X" blocks followed by the "Final Conclusion".
+        sequences (list): The generated reasonable step sequences.
+        num_sequences (int): The number of generated sequences.
+        rng (random.Random, optional): Random generator used to pick the extra sequence (defaults to the `random` module).
+        stats (RecordStats, optional): Receives the number of dropped configurations.
 
+    Returns:
+        list: The reorganized entries, each with "instruction" and "output_list".
+    """
+    selected_sequences = select_sequences(sequences, num_sequences, rng)
+    return arrange_steps(instruction, original_output_list, selected_sequences, stats)
+
+def process_pair(pair, rng=None, stats=None, policy=None):
+    """
+    Reorganizes one entry given its extracted steps and its generated sequences.
+
+    Args:
+        pair (tuple): The (steps-only entry, sequences entry) pair.
+        rng (random.Random, optional): Random generator used to pick the extra sequence.
+        stats (RecordStats, optional): Receives why the entry or some of its configurations are dropped.
+        policy (OrderPolicy, optional): Chooses the orders on the step DAG of the second entry's
+            'Premises and steps required' instead of picking from its stored sequences.
+
+    Returns:
+        list: The reorganized entries; empty if the entry is skipped.
+    """
+    list_entry, sequence_entry = pair
+    instruction = record_instruction(list_entry)
+    original_output_list = list_entry.get('output_list', [])
+
+    if policy is not None:
+        steps_used = sequence_entry.get('Premises and steps required', {}).get('Used', [])
+        dag = StepDAG.from_graph(parse_dependencies(steps_used))
+        sequences = policy.select_labels(dag, rng) if len(dag) else [[]]
+    else:
         sequences = sequence_entry.get('Reasonable sequence of steps', {}).get('Sequences', [])
         num_sequences = sequence_entry.get('Reasonable sequence of steps', {}).get('Number of sequences', 0)
 
-        if not sequences or len(original_output_list) < 2:
-            print(f"Skipping entry due to missing sequences or insufficient steps: {instruction[:50]}...")
-            continue
+    reason = skip_reason(instruction, sequences, original_output_list)
+    if reason is not None:
+        print(f"Skipping entry due to {reason}: {instruction[:50]}...")
+        if stats is not None:
+            stats.skip(reason)
+        return []
 
-        selected_sequences = [sequences[0]]
+    if policy is not None:
+        return arrange_steps(instruction, original_output_list, sequences, stats)
 
-        if num_sequences > 2:
-            valid_sequences = [seq for seq in sequences[1:] if int(seq[-1].split()[1]) == len(seq)]
-            selected_sequences += random.sample(valid_sequences, 1) if valid_sequences else random.sample(sequences[1:], 1)
-        else:
-            selected_sequences = sequences  
-
-        for sequence in selected_sequences:
-            modified_output_list = original_output_list.copy()
-
-            steps_text = []
-            for step in sequence:
-                step_index = int(step.split()[1])
-                if step_index < len(modified_output_list):
-                    steps_text.append(modified_output_list[step_index])
-                else:
-                    print(f"Warning: Step {step_index} exceeds available steps ({len(modified_output_list)}). Skipping.")
-                    continue
-
-            if len(steps_text) == len(sequence):
-                modified_output_list[1:-1] = steps_text 
-                new_entry = {
-                    "instruction": instruction,
-                    "output_list": modified_output_list
-                }
-                new_data.append(new_entry)
-            else:
-                print("Warning: Some steps could not be found, skipping this configuration.")
+    return reorganize_entry(instruction, original_output_list, sequences, num_sequences, rng=rng, stats=stats)
+
+def _pair_task(pair, rng, policy=None):
+    """Runs `process_pair` in a worker and also returns the `RecordStats` of the entry."""
+    stats = RecordStats()
+    return process_pair(pair, rng, stats, policy), stats
+
+def process_file(output_list_path, sequences_path, output_path, workers=1, seed=None, metrics=None, policy=None):
+    """
+    Reorganizes step sequences in the output_list based on the given sequences of logical steps.
+
+    Args:
+        output_list_path (str): Path to the JSON/JSONL file containing the extracted steps (output_list).
+        sequences_path (str): Path to the JSON/JSONL file containing the generated reasonable step sequences.
+        output_path (str): Path to the output file where the reorganized data will be saved (JSONL unless it ends with .json).
+        workers (int): Number of worker processes.
+        seed (int, optional): Random seed; results do not depend on `workers`.
+        metrics (RunMetrics, optional): Receives the metrics of the "reorganize" stage.
+        policy (OrderPolicy, optional): Chooses the orders on each entry's step DAG. Only the
+            'Premises and steps required' of `sequences_path` are read then, so the dependency file
+            of extract_answer_steps can be passed instead of the enumerated sequences.
+
+    Raises:
+        ValueError: If the two input files do not have the same number of records.
+
+    Returns:
+        None (Generates a processed JSON file at `output_path`).
+    """
+    metrics = metrics or RunMetrics()
+    with metrics.stage("reorganize") as stage:
+        stage.read_file(output_list_path)
+        stage.read_file(sequences_path)
+
+        def entries():
+            pairs = stage.count_in(zip_records(output_list_path, sequences_path))
+            task = partial(_pair_task, policy=policy)
+            for reorganized, stats in map_records(task, pairs, workers=workers, seed=seed):
+                stage.merge(stats)
+                yield from reorganized
+
+        count = write_records(output_path, stage.count_out(entries()))
+        stage.wrote_file(output_path)
 
-    print(f"Successfully generated {len(new_data)} reorganized entries.")
-    with open(output_path, 'w', encoding='utf-8') as file:
-        json.dump(new_data, file, indent=4, ensure_ascii=False)
+    print(f"Successfully generated {count} reorganized entries.")
 
     print(f"Processed file saved at: {output_path}")
 
 if __name__ == "__main__":
-    output_list_path = 'data/answer/process/folio_steps_only.json'
-    sequences_path = 'data/answer/process/folio_step_sequences.json'
-    output_path = 'data/answer/process/folio_reorganized_steps.json'
+    output_list_path = 'data/answer/process/folio_steps_only.jsonl'
+    sequences_path = 'data/answer/process/folio_step_sequences.jsonl'
+    output_path = 'data/answer/process/folio_reorganized_steps.jsonl'
 
     process_file(output_list_path, sequences_path, output_path)
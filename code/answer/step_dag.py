@@ -0,0 +1,345 @@
+import random
+from array import array
+from collections import OrderedDict
+from itertools import islice
+
+
+def _masks(values):
+    """Stores bitmasks in a compact unsigned 64-bit array when they fit, in a list otherwise."""
+    values = list(values)
+    return array('Q', values) if len(values) <= 64 else values
+
+
+class StepDAG:
+    """
+    Integer-indexed step dependency DAG with predecessor and successor bitmasks.
+
+    Step `i` is the `i`-th name of the graph, and a set of steps is an int whose bit `i` is set
+    when step `i` belongs to it. All routines work on these bitsets, so scheduling a step costs a
+    few integer operations instead of dict updates and `deque.remove` calls on step names.
+
+    Orderings are produced in lexicographic order of step indices: the first ordering always
+    schedules the lowest-indexed available step first, i.e. it is the original step order when
+    dependencies point backwards, and `unrank(r)` is the `r`-th ordering yielded by `iter_orders`.
+
+    Args:
+        names (list): Step names ("Step X"), in index order.
+        edges (iterable): (u, v) index pairs meaning step v depends on step u.
+    """
+
+    __slots__ = ("names", "preds", "succs", "full", "_memo", "_orders")
+
+    def __init__(self, names, edges):
+        self.names = list(names)
+        preds = [0] * len(self.names)
+        succs = [0] * len(self.names)
+        for u, v in edges:
+            preds[v] |= 1 << u
+            succs[u] |= 1 << v
+        self.preds = _masks(preds)
+        self.succs = _masks(succs)
+        self.full = (1 << len(self.names)) - 1
+        self._memo = {self.full: 1}
+        self._orders = []
+
+    @classmethod
+    def from_graph(cls, graph):
+        """
+        Builds a DAG from the "Step X" adjacency dict of `parse_dependencies` (step -> dependent steps).
+        """
+        index = {name: i for i, name in enumerate(graph)}
+        return cls(graph, ((index[u], index[v]) for u in graph for v in graph[u]))
+
+    def to_graph(self):
+        """
+        Returns the "Step X" adjacency dict (step -> dependent steps) of the DAG.
+        """
+        return {name: self.labels(self._indices(self.succs[i])) for i, name in enumerate(self.names)}
+
+    def shape(self):
+        """
+        Returns the canonical form of the DAG: its predecessor bitmasks with steps numbered by position.
+
+        Graphs with the same shape (e.g. every three-step chain) have the same orderings of step
+        indices, whatever their step names.
+        """
+        return tuple(self.preds)
+
+    def relabel(self, names):
+        """
+        Returns a view of the DAG with other step names, sharing its bitmasks and memoized counts.
+        """
+        view = StepDAG.__new__(StepDAG)
+        view.names = list(names)
+        view.preds = self.preds
+        view.succs = self.succs
+        view.full = self.full
+        view._memo = self._memo
+        view._orders = self._orders
+        return view
+
+    def constrain_last(self, step):
+        """
+        Returns the DAG whose orderings are the orderings of this DAG that end with `step`.
+
+        Every other step becomes a predecessor of `step`; the result has no ordering (a cycle)
+        when `step` has successors.
+        """
+        view = StepDAG.__new__(StepDAG)
+        view.names = self.names
+        preds = list(self.preds)
+        succs = list(self.succs)
+        bit = 1 << step
+        preds[step] |= self.full & ~bit
+        for i in range(len(succs)):
+            if i != step:
+                succs[i] |= bit
+        view.preds = _masks(preds)
+        view.succs = _masks(succs)
+        view.full = self.full
+        view._memo = {self.full: 1}
+        view._orders = []
+        return view
+
+    def labels(self, order):
+        """
+        Maps an ordering of step indices to step names.
+        """
+        names = self.names
+        return [names[i] for i in order]
+
+    def __len__(self):
+        return len(self.names)
+
+    @staticmethod
+    def _indices(mask):
+        indices = []
+        while mask:
+            bit = mask & -mask
+            indices.append(bit.bit_length() - 1)
+            mask ^= bit
+        return indices
+
+    def available(self, placed):
+        """
+        Returns the bitset of steps that are not placed yet and whose predecessors all are.
+        """
+        preds = self.preds
+        free = self.full & ~placed
+        ready = 0
+        while free:
+            bit = free & -free
+            free ^= bit
+            mask = preds[bit.bit_length() - 1]
+            if mask & placed == mask:
+                ready |= bit
+        return ready
+
+    def _released(self, ready, placed, bit):
+        """Available set after placing `bit` (already added to `placed`) when `ready` was available before."""
+        ready ^= bit
+        preds = self.preds
+        successors = self.succs[bit.bit_length() - 1]
+        while successors:
+            succ = successors & -successors
+            successors ^= succ
+            mask = preds[succ.bit_length() - 1]
+            if mask & placed == mask:
+                ready |= succ
+        return ready
+
+    def iter_orders(self):
+        """
+        Yields every topological ordering as a list of step indices, in lexicographic order.
+
+        Nothing is yielded if the graph contains a cycle.
+        """
+        return self._iter_paths(range(len(self.names)))
+
+    def iter_labeled_orders(self):
+        """
+        Yields every topological ordering as a list of step names, in the order of `iter_orders`.
+        """
+        return self._iter_paths(self.names)
+
+    def _iter_paths(self, symbols):
+        """Depth-first enumeration over bitsets, building paths of `symbols[i]` for the placed steps `i`."""
+        if not self.names:
+            yield []
+            return
+        full = self.full
+        placed = 0
+        path = []
+        steps = []
+        ready_stack = [self.available(0)]
+        todo_stack = [ready_stack[0]]
+        while todo_stack:
+            todo = todo_stack[-1]
+            if not todo:
+                todo_stack.pop()
+                ready_stack.pop()
+                if steps:
+                    placed ^= steps.pop()
+                    path.pop()
+                continue
+            bit = todo & -todo
+            todo_stack[-1] = todo ^ bit
+            placed |= bit
+            if placed == full:
+                yield path + [symbols[bit.bit_length() - 1]]
+                placed ^= bit
+                continue
+            ready = self._released(ready_stack[-1], placed, bit)
+            if placed | ready == full and not ready & (ready - 1):
+                # A single step is left: emit the ordering without opening another frame.
+                yield path + [symbols[bit.bit_length() - 1], symbols[ready.bit_length() - 1]]
+                placed ^= bit
+                continue
+            steps.append(bit)
+            path.append(symbols[bit.bit_length() - 1])
+            ready_stack.append(ready)
+            todo_stack.append(ready)
+
+    def depth(self):
+        """
+        Returns the number of steps on the longest dependency chain, or None if the graph contains a cycle.
+
+        The steps are peeled layer by layer: each layer holds every step whose predecessors are all
+        in earlier layers, so the number of layers is the length of the longest chain.
+        """
+        layers = 0
+        placed = 0
+        while placed != self.full:
+            ready = self.available(placed)
+            if not ready:
+                return None
+            placed |= ready
+            layers += 1
+        return layers
+
+    def count(self, placed=0):
+        """
+        Counts the orderings that extend the placed set, memoized over downward-closed bitsets.
+
+        Returns:
+            int: The number of topological orderings (0 if the graph contains a cycle).
+        """
+        memo = self._memo
+        if placed in memo:
+            return memo[placed]
+        total = 0
+        ready = self.available(placed)
+        while ready:
+            bit = ready & -ready
+            ready ^= bit
+            total += self.count(placed | bit)
+        memo[placed] = total
+        return total
+
+    def unrank(self, rank):
+        """
+        Returns the ordering at position `rank` (0 <= rank < count()) of `iter_orders`.
+        """
+        order = []
+        placed = 0
+        while placed != self.full:
+            ready = self.available(placed)
+            while ready:
+                bit = ready & -ready
+                ready ^= bit
+                branch = self.count(placed | bit)
+                if rank < branch:
+                    break
+                rank -= branch
+            placed |= bit
+            order.append(bit.bit_length() - 1)
+        return order
+
+    def sample(self, rng=None):
+        """
+        Draws one ordering uniformly at random, or returns None if the graph contains a cycle.
+        """
+        total = self.count()
+        if total == 0:
+            return None
+        return self.unrank((rng or random).randrange(total))
+
+
+class DAGCache:
+    """
+    Bounded LRU cache of step DAGs keyed by their shape, so isomorphic dependency graphs are
+    counted and enumerated once.
+
+    Most records share a few dependency shapes (chains, two roots feeding a final step, ...).
+    A cached DAG keeps its memoized counts and, when there are at most `max_orders` of them, its
+    enumerated orderings of step indices; `lookup` relabels it with the step names of each record.
+
+    Args:
+        max_entries (int): Number of shapes kept; the least recently used shape is evicted beyond it.
+        max_orders (int): Enumerations longer than this are recomputed instead of stored.
+    """
+
+    def __init__(self, max_entries=4096, max_orders=10000):
+        self.max_entries = max_entries
+        self.max_orders = max_orders
+        self.shapes = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, graph):
+        """
+        Returns the DAG of a "Step X" adjacency dict, reusing the cached DAG of the same shape.
+        """
+        dag = StepDAG.from_graph(graph)
+        key = dag.shape()
+        cached = self.shapes.get(key)
+        if cached is None:
+            self.misses += 1
+            self.shapes[key] = dag
+            if len(self.shapes) > self.max_entries:
+                self.shapes.popitem(last=False)
+                self.evictions += 1
+            return dag
+        self.hits += 1
+        self.shapes.move_to_end(key)
+        return cached.relabel(dag.names)
+
+    def iter_orders(self, dag, limit=None):
+        """
+        Yields the first `limit` orderings of step indices of a DAG returned by `lookup`.
+
+        The orderings of a shape are enumerated once and replayed afterwards, unless there are
+        more than `max_orders` of them.
+        """
+        total = dag.count()
+        needed = total if limit is None else min(limit, total)
+        if needed > self.max_orders:
+            return islice(dag.iter_orders(), needed)
+        if len(dag._orders) < needed:
+            dag._orders[:] = islice(dag.iter_orders(), needed)
+        return islice(dag._orders, needed)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self.shapes),
+        }
+
+
+# DAG caches of the current process, by size; worker processes each build their own.
+_PROCESS_CACHES = {}
+
+
+def process_cache(max_entries=4096):
+    """
+    Returns the DAG cache of the current process, so picklable worker tasks can share one across records.
+    """
+    cache = _PROCESS_CACHES.get(max_entries)
+    if cache is None:
+        cache = _PROCESS_CACHES[max_entries] = DAGCache(max_entries)
+    return cache
@@ -0,0 +1,85 @@
+import os
+import random
+import re
+
+from augment_pipeline import augment_record
+from cot_scanner import scan_cot
+from reorganize_steps import select_dag_sequences
+from record_io import iter_records
+from run_metrics import RecordStats
+from step_dag import StepDAG
+
+PROCESS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "data", "train", "answer", "process", "folio_cot.json")
+
+
+def process_record(index=0):
+    for position, record in enumerate(iter_records(PROCESS_FILE)):
+        if position == index:
+            return record
+
+
+def step_body(block):
+    """A step block without its header, with step numbers masked."""
+    return re.sub(r'Step \d+', 'Step #', block.split('\n', 1)[1])
+
+
+def steps_and_references(text):
+    """Maps the number of every step block of an output to its body and to its referenced premises and steps."""
+    scan = scan_cot(text)
+    bodies = {int(block.split(':', 1)[0].split()[1]): step_body(block.strip()) for block in scan.steps}
+    return bodies, {int(step): set(references) for step, references in scan.dependencies}
+
+
+def test_real_record_is_reordered_with_renumbered_headers_and_references():
+    record = process_record()
+    original, original_references = steps_and_references(record['model_output'])
+    assert len(original) == 5
+
+    outputs = augment_record(record, output_field='model_output', rng=random.Random(0))
+    assert len(outputs) == 2
+    for output in outputs:
+        assert output['instruction'].startswith("Please solve the question step by step")
+        assert record['premises'] in output['instruction'] and record['conclusion'] in output['instruction']
+        headers = [int(number) for number in re.findall(r'(?m)^Step (\d+):', output['output'])]
+        assert headers == [1, 2, 3, 4, 5]
+        assert output['output'].rstrip().endswith(record['model_output'].rstrip()[-60:])
+
+        bodies, references = steps_and_references(output['output'])
+        # Each new step is an original step; its references point to the same premises and steps.
+        moved = {new: next(old for old, body in original.items() if body == text) for new, text in bodies.items()}
+        assert sorted(moved.values()) == [1, 2, 3, 4, 5]
+        for new, old in moved.items():
+            renamed = {f"Step {moved[int(name.split()[1])]}" if name.startswith("Step") else name for name in references[new]}
+            assert renamed == original_references[old]
+            assert all(int(name.split()[1]) < new for name in references[new] if name.startswith("Step"))
+
+    first, second = (list(steps_and_references(output['output'])[0].values()) for output in outputs)
+    assert first == list(original.values())
+    assert second != first
+
+
+def test_records_without_dependencies_are_skipped():
+    record = dict(process_record(), model_output="Step 1: Look at Premise 1.\nStep 2: Conclude.\nFinal Conclusion: True.")
+    stats = RecordStats()
+    assert augment_record(record, output_field='model_output', stats=stats) == []
+    assert stats.skips == {"no step dependencies": 1}
+
+
+def test_misaligned_steps_are_skipped():
+    text = ("Step 1: A.\nPremises and steps required: Premise 1.\n"
+            "Step 2: B.\nPremises and steps required: Premise 2.\n"
+            "Step 3: C.\nFinal Conclusion: True.")
+    stats = RecordStats()
+    assert augment_record(dict(process_record(), model_output=text), output_field='model_output', stats=stats) == []
+    assert stats.skips == {"step count differs from dependencies": 1}
+
+
+def test_dag_selection_keeps_the_original_order_and_the_last_step():
+    # Steps 1-4 are independent and step 5 depends on all of them: 24 orders, all ending with step 5.
+    names = [f"Step {i}" for i in range(1, 6)]
+    dag = StepDAG(names, [(i, 4) for i in range(4)])
+    for seed in range(20):
+        first, second = select_dag_sequences(dag, random.Random(seed))
+        assert first == names
+        assert second != first and second[-1] == "Step 5" and sorted(second) == names
+    assert select_dag_sequences(StepDAG(names[:2], [(0, 1), (1, 0)])) == []
@@ -0,0 +1,45 @@
+import random
+import sys
+
+from generate_step_sequences import count_topological_sorts, iter_topological_sorts
+
+
+def chains(count, length):
+    """Builds `count` independent chains of `length` steps, numbered chain after chain."""
+    graph = {}
+    for chain in range(count):
+        steps = [f"Step {chain * length + i + 1}" for i in range(length)]
+        for step, successor in zip(steps, steps[1:] + [None]):
+            graph[step] = [successor] if successor else []
+    return graph
+
+
+def is_topological(graph, sequence):
+    position = {step: index for index, step in enumerate(sequence)}
+    return sorted(sequence) == sorted(graph) and all(position[u] < position[v] for u in graph for v in graph[u])
+
+
+def test_sampling_beyond_sys_maxsize_orders():
+    # 40! / 10!^4 orders, more than `random.sample` can index.
+    graph = chains(4, 10)
+    assert count_topological_sorts(graph) > sys.maxsize
+    sequences = list(iter_topological_sorts(graph, sample_k=5, rng=random.Random(0)))
+    assert len(sequences) == 5
+    assert len({tuple(sequence) for sequence in sequences}) == 5
+    assert all(is_topological(graph, sequence) for sequence in sequences)
+    assert sequences == list(iter_topological_sorts(graph, sample_k=5, rng=random.Random(0)))
+
+
+def test_sampling_returns_distinct_orders():
+    graph = chains(2, 3)
+    sequences = list(iter_topological_sorts(graph, sample_k=19, rng=random.Random(1)))
+    assert count_topological_sorts(graph) == 20
+    assert len({tuple(sequence) for sequence in sequences}) == 19
+    assert all(is_topological(graph, sequence) for sequence in sequences)
+
+
+def test_enumeration_starts_with_the_original_order():
+    graph = chains(2, 3)
+    sequences = list(iter_topological_sorts(graph, max_sequences=4))
+    assert len(sequences) == 4
+    assert sequences[0] == list(graph)
@@ -0,0 +1,84 @@
+import os
+
+import augment_pipeline
+from augment_pipeline import augment_record, run_pipeline
+from artifact_store import ArtifactStore
+from record_io import iter_records, write_records
+
+PROCESS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "data", "train", "answer", "process", "folio_cot.json")
+
+
+def process_records(count=3):
+    """The first `count` records of the process file that are augmented into two outputs each."""
+    records = []
+    for record in iter_records(PROCESS_FILE):
+        if len(augment_record(record, output_field='model_output')) == 2:
+            records.append(record)
+        if len(records) == count:
+            return records
+
+
+def build(tmp_path, records, name, **config):
+    """Runs an incremental build of `records` against the store of `tmp_path`; returns the output bytes and the store."""
+    input_path = tmp_path / f"{name}.input.jsonl"
+    output_path = tmp_path / f"{name}.output.jsonl"
+    write_records(str(input_path), records)
+    store = ArtifactStore(str(tmp_path / "store.sqlite"))
+    run_pipeline(str(input_path), str(output_path), output_field='model_output', seed=0, store=store, **config)
+    return output_path.read_bytes(), store
+
+
+def test_unchanged_rebuild_reuses_every_record(tmp_path):
+    records = process_records()
+    first, store = build(tmp_path, records, "first")
+    assert (store.hits, store.misses) == (0, 3)
+    store.close()
+
+    second, store = build(tmp_path, records, "second")
+    assert (store.hits, store.misses) == (3, 0)
+    assert second == first
+    store.close()
+
+
+def test_changed_record_recomputes_only_itself(tmp_path):
+    records = process_records()
+    first, store = build(tmp_path, records, "first")
+    store.close()
+
+    records[1] = dict(records[1], conclusion=records[1]['conclusion'] + " ")
+    second, store = build(tmp_path, records, "second")
+    assert (store.hits, store.misses) == (2, 1)
+    assert store.stats()["entries"] == 4
+    # The stale entry of the old record is the only one this build did not use.
+    assert store.prune() == 1
+    assert store.stats()["entries"] == 3
+    store.close()
+
+    first_lines, second_lines = first.splitlines(), second.splitlines()
+    assert len(first_lines) == len(second_lines) == 6
+    assert [line for index, line in enumerate(second_lines) if line != first_lines[index]] == second_lines[2:4]
+
+
+def test_config_change_invalidates_entries(tmp_path):
+    records = process_records()
+    build(tmp_path, records, "first")[1].close()
+
+    _, store = build(tmp_path, records, "second", max_sequences=1)
+    assert (store.hits, store.misses) == (0, 3)
+    assert store.prune() == 3
+    store.close()
+
+
+def test_source_change_invalidates_entries(tmp_path, monkeypatch):
+    source = tmp_path / "stage.py"
+    source.write_text("VERSION = 1\n")
+    monkeypatch.setattr(augment_pipeline, "SOURCE_FILES", augment_pipeline.SOURCE_FILES + (str(source),))
+    records = process_records()
+    build(tmp_path, records, "first")[1].close()
+
+    source.write_text("VERSION = 2\n")
+    _, store = build(tmp_path, records, "second")
+    assert (store.hits, store.misses) == (0, 3)
+    assert store.prune() == 3
+    assert store.stats()["entries"] == 3
+    store.close()
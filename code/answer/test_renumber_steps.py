@@ -0,0 +1,42 @@
+from renumber_steps import renumber_output_list
+
+
+def blocks(order, references=None):
+    """Builds an output list whose middle blocks are the steps of `order`; `references` maps a step to its body."""
+    references = references or {}
+    return (["Solution:"]
+            + [f"Step {step}: {references.get(step, 'Reason.')}" for step in order]
+            + ["Final Conclusion: True, by Step 1."])
+
+
+def test_single_digit_step_becomes_ten():
+    output_list = renumber_output_list(blocks([1, 2, 3, 4, 5, 6, 7, 8, 10, 9], {9: "From Step 10."}))
+    assert output_list[9] == "Step 9: Reason."
+    assert output_list[10] == "Step 10: From Step 9."
+
+
+def test_two_digit_step_becomes_single_digit():
+    output_list = renumber_output_list(blocks([1, 10, 2, 3, 4, 5, 6, 7, 8, 9], {3: "From Step 10 and Step 2."}))
+    assert output_list[2] == "Step 2: Reason."
+    assert output_list[4] == "Step 4: From Step 2 and Step 3."
+
+
+def test_last_step_moved_first():
+    order = [12, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11]
+    output_list = renumber_output_list(blocks(order, {11: "Using Step 12, Step 1 and Step 9."}))
+    assert [text.split(':')[0] for text in output_list[1:-1]] == [f"Step {step}" for step in range(1, 13)]
+    assert output_list[12] == "Step 12: Using Step 1, Step 2 and Step 10."
+
+
+def test_adjacent_references_keep_their_offsets():
+    # Rewriting the first reference used to shift the second one, producing "Step 112and".
+    order = [1, 2, 3, 4, 5, 6, 7, 8, 12, 9, 10, 11]
+    output_list = renumber_output_list(blocks(order, {11: "Step 9 and Step 12 and Step 10,Step 11."}))
+    assert output_list[12] == "Step 12: Step 10 and Step 9 and Step 11,Step 12."
+    assert "Step 112" not in " ".join(output_list)
+
+
+def test_prefixes_and_unknown_steps_are_left_alone():
+    output_list = renumber_output_list(blocks([2, 1], {1: "Step 1 of Step 12 and Step 2a."}))
+    assert output_list[1:3] == ["Step 1: Reason.", "Step 2: Step 2 of Step 12 and Step 2a."]
+    assert output_list[-1] == "Final Conclusion: True, by Step 2."
@@ -0,0 +1,114 @@
+import hashlib
+import json
+import sqlite3
+import time
+
+
+def content_key(prefix, record):
+    """
+    Returns the content address of a record: a SHA-256 of `prefix` (code and configuration
+    digest) and the canonical JSON of the record.
+    """
+    payload = json.dumps(record, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(f"{prefix}\n{payload}".encode('utf-8')).hexdigest()
+
+
+def source_digest(paths):
+    """
+    Returns a SHA-256 over the contents of source files, so any code change yields a new digest.
+    """
+    digest = hashlib.sha256()
+    for path in sorted(paths):
+        with open(path, 'rb') as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+class ArtifactStore:
+    """
+    Content-addressed store of per-record stage outputs, in a SQLite database.
+
+    Outputs are stored under `content_key` addresses, so a record is recomputed only when its
+    content, the stage code or the stage configuration changes. Every build stamps the entries it
+    produces or reuses; `prune` drops the entries the last build did not use.
+
+    Args:
+        path (str): Path to the SQLite database.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.build = time.time_ns()
+        self.hits = 0
+        self.misses = 0
+        self._touched = []
+        self._pending = 0
+
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS artifacts (key TEXT PRIMARY KEY, value TEXT NOT NULL, build INTEGER NOT NULL)"
+        )
+        self.connection.commit()
+
+    def get(self, key):
+        """
+        Returns the stored output of `key` (a JSON value), or None if there is none.
+        """
+        row = self.connection.execute("SELECT value FROM artifacts WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._touched.append((self.build, key))
+        self._written()
+        return json.loads(row[0])
+
+    def put(self, key, value):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO artifacts (key, value, build) VALUES (?, ?, ?)",
+            (key, json.dumps(value, ensure_ascii=False), self.build),
+        )
+        self._written()
+
+    def _written(self):
+        # Commit regularly, so an interrupted build keeps most of its work.
+        self._pending += 1
+        if self._pending >= 10000:
+            self.commit()
+
+    def _flush(self):
+        self.connection.executemany("UPDATE artifacts SET build = ? WHERE key = ?", self._touched)
+        self._touched = []
+
+    def commit(self):
+        self._flush()
+        self.connection.commit()
+        self._pending = 0
+
+    def prune(self):
+        """
+        Deletes the entries not produced or reused by this build.
+
+        Returns:
+            int: The number of deleted entries.
+        """
+        self.commit()
+        deleted = self.connection.execute("DELETE FROM artifacts WHERE build != ?", (self.build,)).rowcount
+        self.connection.commit()
+        return deleted
+
+    def stats(self):
+        entries = self.connection.execute("SELECT COUNT(*) FROM artifacts").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+    def close(self):
+        self.commit()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,294 @@
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+CODE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for directory in ('', 'condition', 'answer', os.path.join('test', 'accuracy')):
+    sys.path.insert(0, os.path.join(CODE_DIR, directory))
+
+import synthetic
+from record_io import write_records
+
+# Distinct synthetic inputs generated per case; larger corpora cycle through them, so memory
+# stays bounded while every call still does the full work.
+POOL_SIZE = 10_000
+
+DEFAULT_OPTIONS = {"width": 3, "depth": 3, "density": 0.5, "seed": 0}
+
+CASES = {}
+
+
+def case(name):
+    """
+    Registers a benchmark case: `setup(count, rng, options)` returns `(run, cleanup)`, where `run()`
+    processes `count` records and `cleanup` (or None) releases what the setup created.
+    """
+    def register(setup):
+        CASES[name] = setup
+        return setup
+    return register
+
+
+def _pool(count, make):
+    return [make(i) for i in range(min(count, POOL_SIZE))]
+
+
+@case("process_instruction")
+def _process_instruction(count, rng, options):
+    from condition_ran import process_instruction
+
+    datasets = sorted(synthetic.INSTRUCTIONS)
+    pool = _pool(count, lambda i: synthetic.INSTRUCTIONS[datasets[i % 3]](rng, rng.randint(4, 24)))
+
+    def run():
+        for i in range(count):
+            process_instruction(pool[i % len(pool)], rng)
+    return run, None
+
+
+@case("extract_conditions_and_steps")
+def _extract_conditions_and_steps(count, rng, options):
+    from extract_answer_steps import extract_conditions_and_steps
+
+    pool = _pool(count, lambda i: synthetic.cot_output(rng, synthetic.random_dag(rng, options["width"], options["depth"], options["density"])))
+
+    def run():
+        for i in range(count):
+            extract_conditions_and_steps(pool[i % len(pool)])
+    return run, None
+
+
+@case("all_topological_sorts")
+def _all_topological_sorts(count, rng, options):
+    from generate_step_sequences import all_topological_sorts
+
+    pool = _pool(count, lambda i: synthetic.random_dag(rng, options["width"], options["depth"], options["density"]))
+
+    def run():
+        for i in range(count):
+            all_topological_sorts(pool[i % len(pool)])
+    return run, None
+
+
+@case("renumber_process_file")
+def _renumber_process_file(count, rng, options):
+    from renumber_steps import process_file
+
+    directory = tempfile.mkdtemp(prefix="order_centric_bench_")
+    input_path = os.path.join(directory, "reorganized.jsonl")
+    output_path = os.path.join(directory, "renumbered.jsonl")
+    pool = _pool(count, lambda i: {"instruction": "", "output_list": synthetic.output_list(rng, options["width"] * options["depth"])})
+    write_records(input_path, (pool[i % len(pool)] for i in range(count)))
+
+    def run():
+        process_file(input_path, output_path)
+    return run, lambda: shutil.rmtree(directory, ignore_errors=True)
+
+
+@case("extract_last_answer")
+def _extract_last_answer(count, rng, options):
+    import folio_acc
+    import logicnli_acc
+    import ruletaker_acc
+
+    extractors = (("folio", folio_acc.extract_last_answer), ("logicnli", logicnli_acc.extract_last_answer),
+                  ("ruletaker", ruletaker_acc.extract_last_answer))
+    pool = _pool(count, lambda i: (extractors[i % 3][1], synthetic.model_output(rng, extractors[i % 3][0])))
+
+    def run():
+        for i in range(count):
+            extract, text = pool[i % len(pool)]
+            extract(text)
+    return run, None
+
+
+def peak_rss_mb():
+    """
+    Returns the peak resident set size of the current process in MiB, or None where it is unavailable.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+def measure(name, size, options=None, repeat=3):
+    """
+    Times one case on a synthetic corpus of `size` records (a key of `synthetic.SIZES`).
+
+    Returns:
+        dict: The case, size, record count, best wall time over `repeat` runs, records/sec and peak RSS.
+    """
+    options = {**DEFAULT_OPTIONS, **(options or {})}
+    count = synthetic.SIZES[size]
+    run, cleanup = CASES[name](count, random.Random(options["seed"]), options)
+    try:
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - start)
+    finally:
+        if cleanup is not None:
+            cleanup()
+    seconds = min(times)
+    return {
+        "case": name,
+        "size": size,
+        "records": count,
+        "seconds": seconds,
+        "records_per_sec": count / seconds if seconds else float('inf'),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run_isolated(name, size, options=None, repeat=3):
+    """
+    Runs `measure` in a fresh interpreter, so that the peak RSS belongs to this case alone.
+    """
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(measure, name, size, options, repeat).result()
+
+
+def option_mismatches(baseline, options):
+    """
+    Returns the synthetic-corpus options whose value in a baseline report differs from `options`, as "key=saved (now value)".
+    """
+    saved = baseline.get("options", {})
+    return [f"{key}={saved.get(key)!r} (now {value!r})" for key, value in options.items() if saved.get(key) != value]
+
+
+def compare(results, baseline, tolerance, options=None):
+    """
+    Compares results with a baseline report written by `--save-baseline`, whose results are keyed by "case@size".
+
+    Throughputs only compare on the same synthetic corpora, so a baseline measured with other
+    `options` (DAG width, depth, density or seed) is rejected.
+
+    Returns:
+        list: The results slower than the baseline by more than `tolerance` (a fraction), with their ratio.
+
+    Raises:
+        ValueError: If the options of the baseline differ from `options`.
+    """
+    mismatched = option_mismatches(baseline, options) if options is not None else []
+    if mismatched:
+        raise ValueError(f"the baseline was measured with other options: {', '.join(mismatched)}")
+    regressions = []
+    for result in results:
+        reference = baseline["results"].get(f"{result['case']}@{result['size']}")
+        if reference is None:
+            continue
+        result["baseline_records_per_sec"] = reference["records_per_sec"]
+        result["ratio"] = result["records_per_sec"] / reference["records_per_sec"]
+        if result["ratio"] < 1 - tolerance:
+            regressions.append(result)
+    return regressions
+
+
+def format_results(results):
+    lines = ["case".ljust(30) + "size".rjust(6) + "records/s".rjust(14) + "seconds".rjust(10) + "peak MiB".rjust(10) + "vs base".rjust(9)]
+    for result in results:
+        rss = result["peak_rss_mb"]
+        ratio = result.get("ratio")
+        lines.append(
+            result["case"].ljust(30) + result["size"].rjust(6) + f"{result['records_per_sec']:,.0f}".rjust(14)
+            + f"{result['seconds']:.3f}".rjust(10) + (f"{rss:.0f}" if rss is not None else "-").rjust(10)
+            + (f"{ratio:.2f}x" if ratio is not None else "-").rjust(9)
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the augmentation and scoring hot paths on synthetic corpora.")
+    parser.add_argument("--cases", nargs='+', choices=sorted(CASES), default=sorted(CASES), help="Cases to run")
+    parser.add_argument("--sizes", nargs='+', choices=list(synthetic.SIZES), default=["1k"], help="Corpus sizes")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case; the fastest is kept")
+    parser.add_argument("--width", type=int, default=DEFAULT_OPTIONS["width"], help="Steps per layer of the synthetic DAGs")
+    parser.add_argument("--depth", type=int, default=DEFAULT_OPTIONS["depth"], help="Layers of the synthetic DAGs")
+    parser.add_argument("--density", type=float, default=DEFAULT_OPTIONS["density"], help="Edge probability between consecutive layers")
+    parser.add_argument("--seed", type=int, default=DEFAULT_OPTIONS["seed"], help="Seed of the synthetic corpora")
+    parser.add_argument("--output", type=str, default=None, help="Write the results to this JSON file")
+    parser.add_argument("--baseline", type=str, default=None, help="Baseline JSON to compare against; exits with 1 on regressions")
+    parser.add_argument("--save-baseline", type=str, default=None, help="Write the results as a new baseline JSON")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown against the baseline (fraction)")
+    args = parser.parse_args()
+
+    options = {"width": args.width, "depth": args.depth, "density": args.density, "seed": args.seed}
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            baseline = json.load(file)
+        mismatched = option_mismatches(baseline, options)
+        if mismatched:
+            parser.error(f"the baseline was measured with other options: {', '.join(mismatched)}")
+
+    results = []
+    for size in args.sizes:
+        for name in args.cases:
+            results.append(run_isolated(name, size, options, args.repeat))
+            print(f"{name} @ {size}: {results[-1]['records_per_sec']:,.0f} records/s", file=sys.stderr)
+
+    regressions = compare(results, baseline, args.tolerance) if baseline is not None else []
+
+    print(format_results(results))
+
+    report = {"options": options, "python": sys.version.split()[0], "results": results}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+    if args.save_baseline:
+        baseline = {f"{result['case']}@{result['size']}": result for result in results}
+        with open(args.save_baseline, 'w', encoding='utf-8') as file:
+            json.dump({"options": options, "python": report["python"], "results": baseline}, file, indent=2)
+        print(f"Baseline saved to: {args.save_baseline}")
+
+    if regressions:
+        for result in regressions:
+            print(f"Regression: {result['case']} @ {result['size']} runs at {result['ratio']:.2f}x the baseline.")
+        sys.exit(1)
+
+
+# pytest-benchmark entry points, on the 1k corpora:
+#   pytest code/benchmark/run_benchmarks.py -o python_files=run_benchmarks.py -o python_functions='bench_*'
+def _bench(benchmark, name, size="1k"):
+    run, cleanup = CASES[name](synthetic.SIZES[size], random.Random(DEFAULT_OPTIONS["seed"]), DEFAULT_OPTIONS)
+    try:
+        benchmark(run)
+    finally:
+        if cleanup is not None:
+            cleanup()
+
+
+def bench_process_instruction(benchmark):
+    _bench(benchmark, "process_instruction")
+
+
+def bench_extract_conditions_and_steps(benchmark):
+    _bench(benchmark, "extract_conditions_and_steps")
+
+
+def bench_all_topological_sorts(benchmark):
+    _bench(benchmark, "all_topological_sorts")
+
+
+def bench_renumber_process_file(benchmark):
+    _bench(benchmark, "renumber_process_file")
+
+
+def bench_extract_last_answer(benchmark):
+    _bench(benchmark, "extract_last_answer")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+# Corpus sizes accepted by the benchmarks, by name.
+SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1M": 1_000_000}
+
+NAMES = ("Anne", "Bob", "Erin", "Harry", "Vivian", "Rhett", "Philip", "Giles", "Kilby", "Ramon")
+ADJECTIVES = ("big", "furry", "green", "white", "young", "nice", "red", "eager", "lazy", "modest")
+
+FOLIO_INTRO = (
+    "Please solve the question step by step based on First-Order Logic rules such as Modus Ponens, "
+    "determine whether the conclusion is true, false, or unknown based on these premises.\n\nPremises:\n"
+)
+LOGICNLI_INTRO = (
+    "Please determine whether the hypothesis is entailment, neutral, self_contradiction or contradiction "
+    "based on given premises. "
+)
+RULETAKER_INTRO = "Please determine whether the hypothesis is entailment or not entailment based on given premises. \n\n"
+
+ANSWERS = {
+    "folio": ("True", "False", "Uncertain"),
+    "logicnli": ("entailment", "neutral", "self_contradiction", "contradiction"),
+    "ruletaker": ("entailment", "not entailment"),
+}
+
+
+def sentence(rng):
+    name, other = rng.sample(NAMES, 2)
+    first, second = rng.sample(ADJECTIVES, 2)
+    if rng.random() < 0.5:
+        return f"{name} is {first}."
+    return f"If {name} is {first} then {other} is {second}."
+
+
+def folio_instruction(rng, premises):
+    lines = [sentence(rng) for _ in range(premises)]
+    fol = [f"∀x ({line.split()[-1].rstrip('.').capitalize()}(x) → P{i}(x))" for i, line in enumerate(lines)]
+    return (
+        FOLIO_INTRO
+        + "\n".join(f"{i}. {line}" for i, line in enumerate(lines, start=1))
+        + "\nPremises-FOL:\n"
+        + "\n".join(f"{i}. {line}" for i, line in enumerate(fol, start=1))
+        + f"\nConclusion:\n{sentence(rng)}\nConclusion-FOL:\nP0(anne)"
+    )
+
+
+def logicnli_instruction(rng, premises):
+    body = "\n".join(f"{i}. {sentence(rng)}" for i in range(1, premises + 1))
+    return f"{LOGICNLI_INTRO}{body} hypothesis: {sentence(rng)}"
+
+
+def ruletaker_instruction(rng, premises):
+    body = "\n".join(f"{i}. {sentence(rng).rstrip('.')}" for i in range(1, premises + 1))
+    return f"{RULETAKER_INTRO}{body}\n\n\nquestion {sentence(rng)}"
+
+
+INSTRUCTIONS = {
+    "folio": folio_instruction,
+    "logicnli": logicnli_instruction,
+    "ruletaker": ruletaker_instruction,
+}
+
+
+def instruction_records(rng, dataset, count, min_premises=4, max_premises=24):
+    """
+    Yields FOLIO/LogicNLI/RuleTaker-shaped test records with `instruction`, `input` and `output`.
+    """
+    make = INSTRUCTIONS[dataset]
+    for _ in range(count):
+        yield {
+            "instruction": make(rng, rng.randint(min_premises, max_premises)),
+            "input": "",
+            "output": rng.choice(ANSWERS[dataset]),
+        }
+
+
+def random_dag(rng, width, depth, density=0.5):
+    """
+    Returns a layered "Step X" dependency graph: `depth` layers of `width` steps, each step of a
+    layer depending on every step of the previous layer with probability `density` (and at least one).
+
+    The graph maps every step to the steps depending on it, like `parse_dependencies`.
+    """
+    layers = []
+    number = 1
+    for _ in range(depth):
+        layers.append([f"Step {number + i}" for i in range(width)])
+        number += width
+    graph = {step: [] for layer in layers for step in layer}
+    for previous, layer in zip(layers, layers[1:]):
+        for step in layer:
+            parents = [parent for parent in previous if rng.random() < density] or [rng.choice(previous)]
+            for parent in parents:
+                graph[parent].append(step)
+    return graph
+
+
+def cot_output(rng, graph, answer="True"):
+    """
+    Writes a step-by-step solution whose "Premises and steps required" clauses encode `graph`.
+    """
+    parents = {step: [] for step in graph}
+    for step, children in graph.items():
+        for child in children:
+            parents[child].append(step)
+
+    blocks = ["Let's analyze the premises step by step.\n\n### Solution:"]
+    for step in graph:
+        required = [f"Premise {rng.randint(1, 9)}"] + parents[step]
+        blocks.append(
+            f"{step}: {sentence(rng)}\nFrom {', '.join(required)}, we derive that {sentence(rng)}\n\n"
+            f"Premises and steps required: {', '.join(required)}."
+        )
+    blocks.append(f"Final Conclusion: The conclusion is {answer}.")
+    return "\n\n".join(blocks)
+
+
+def output_list(rng, steps, shuffle=True):
+    """
+    Returns a reorganized `output_list` (intro, shuffled steps referring to each other, final conclusion), as renumber_steps reads it.
+    """
+    numbers = list(range(1, steps + 1))
+    if shuffle:
+        rng.shuffle(numbers)
+    items = ["### Solution:"]
+    for number in numbers:
+        reference = f" Using Step {rng.randint(1, steps)}," if steps > 1 else ""
+        items.append(f"Step {number}:{reference} {sentence(rng)}\nPremises and steps required: Premise 1, Step {number}.")
+    items.append(f"Final Conclusion: follows from Step {numbers[-1]}.")
+    return items
+
+
+def model_output(rng, dataset, length=600):
+    """
+    Returns a model answer of about `length` characters that ends with a label.
+    """
+    text = []
+    size = 0
+    while size < length:
+        text.append(sentence(rng))
+        size += len(text[-1]) + 1
+    answer = rng.choice(ANSWERS[dataset])
+    return " ".join(text) + f"\nTherefore, the answer is {answer}."
@@ -1,63 +1,178 @@
-import json
 import random
 import argparse
+import math
 import os
+import sys
+from functools import partial
 
-def process_instruction(instruction: str) -> str:
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from record_io import iter_records, write_records
+from run_metrics import RunMetrics, add_metrics_arguments, write_reports
+from workers import map_records, sample_ranks
+
+from premise_templates import Segments, split_instruction, split_premise_list
+
+def process_instruction(instruction: str, rng: random.Random = None) -> str:
     """
     处理 instruction 字段，打乱中间部分的语句顺序，并保持开头和结尾不变。
+    支持的格式见 premise_templates 中注册的模板（FOLIO、LogicNLI、RuleTaker 等），无法识别的格式原样返回。
     
     Args:
         instruction (str): 原始 instruction 字符串
+        rng (random.Random, optional): 用于打乱顺序的随机数生成器，默认使用 random 模块
     
     Returns:
         str: 处理后的 instruction 字符串
     """
-    split_point = instruction.find(
-        "Please determine whether the conclusion is true, false, or uncertain based on these premises.\n\nPremises:\n"
-    )
-    if split_point == -1:
-        return instruction  
+    segments = split_instruction(instruction)
+    if segments is None:
+        return instruction
+
+    return shuffle_segments(segments, rng)
+
+def shuffle_segments(segments: Segments, rng: random.Random = None) -> str:
+    """
+    随机打乱已切分的前提，并重新编号。
+    
+    Args:
+        segments (Segments): 切分后的 instruction
+        rng (random.Random, optional): 随机数生成器
+    
+    Returns:
+        str: 打乱后的字符串
+    """
+    order = list(range(len(segments.premises)))
+    (rng or random).shuffle(order)
+    return segments.join(order)
+
+def unrank_permutation(n: int, rank: int) -> list:
+    """
+    按字典序返回 0..n-1 的第 rank 个排列（Lehmer 编码），第 0 个排列为原始顺序。
+    
+    Args:
+        n (int): 元素个数
+        rank (int): 排列序号，0 <= rank < n!
+    
+    Returns:
+        list: 下标排列
+    """
+    remaining = list(range(n))
+    order = []
+    for position in range(n - 1, -1, -1):
+        digit, rank = divmod(rank, math.factorial(position))
+        order.append(remaining.pop(digit))
+    return order
+
+def sample_orders(n: int, k: int, rng: random.Random = None, include_original: bool = False) -> list:
+    """
+    从 n! 个排列中无放回地抽取至多 k 个互不相同的顺序，不展开整个排列空间。
+    
+    Args:
+        n (int): 前提个数
+        k (int): 需要的顺序个数（超过可用排列数时取全部）
+        rng (random.Random, optional): 随机数生成器
+        include_original (bool): 是否把原始顺序作为第一个结果；否则原始顺序不会被抽到
+    
+    Returns:
+        list: 下标排列的列表
+    """
+    total = math.factorial(n)
+    orders = [list(range(n))] if include_original and k > 0 else []
+    # 序号 0 是原始顺序，只在 1..n!-1 中抽样
+    count = min(k - len(orders), total - 1)
+    if count > 0:
+        orders.extend(unrank_permutation(n, rank + 1) for rank in sample_ranks(total - 1, count, rng))
+    return orders
+
+def item_segments(item: dict):
+    """
+    找到单条数据中需要打乱的字段并切分。
+    
+    Returns:
+        tuple: (字段名, Segments)；没有可识别的字段时为 (None, None)
+    """
+    if "instruction" in item:
+        return "instruction", split_instruction(item["instruction"])
+    # 原始 LogicNLI（premise）与 RuleTaker（context）格式：字段本身就是编号的前提列表
+    for field in ("premise", "context"):
+        if field in item:
+            return field, split_premise_list(item[field])
+    return None, None
+
+def process_item(item: dict, rng: random.Random = None) -> dict:
+    """
+    打乱单条数据的 instruction 字段。
+    
+    Args:
+        item (dict): 单条数据
+        rng (random.Random, optional): 该条数据的随机数生成器
+    
+    Returns:
+        dict: 处理后的数据
+    """
+    return _item_task(item, rng)[0][0]
+
+def process_item_samples(item: dict, rng: random.Random = None, samples: int = 1, include_original: bool = False) -> list:
+    """
+    为单条数据生成 samples 个前提顺序互不相同的副本。
     
-    intro = instruction[:split_point + len(
-        "Please determine whether the conclusion is true, false, or uncertain based on these premises.\n\nPremises:\n"
-    )]
-    remaining_text = instruction[split_point + len(
-        "Please determine whether the conclusion is true, false, or uncertain based on these premises.\n\nPremises:\n"
-    ):]
-
-    parts = remaining_text.split("\n")
-
-    if len(parts) < 2:
-        return instruction 
-    # 获取需要打乱的部分（除最后两行有关hypothesis的部分）
-    body_parts = parts[:-2]
-    last_two_parts = parts[-2:]  
-
-    processed_parts = [part.split(". ", 1)[-1] for part in body_parts]
-    random.shuffle(processed_parts)
-    numbered_parts = [f"{i+1}. {part}" for i, part in enumerate(processed_parts)]
+    Args:
+        item (dict): 单条数据
+        rng (random.Random, optional): 该条数据的随机数生成器
+        samples (int): 每条数据输出的副本数（前提较少时可能更少）
+        include_original (bool): 是否包含原始顺序的副本
     
-    return intro + "\n".join(numbered_parts) + "\n" + "\n".join(last_two_parts)
+    Returns:
+        list: 处理后的数据列表；无法识别格式的数据原样输出一条
+    """
+    return _item_task(item, rng, samples, include_original)[0]
+
+def _item_task(item: dict, rng: random.Random = None, samples: int = None, include_original: bool = False) -> tuple:
+    """
+    map_records 的任务：返回 (处理后的数据列表, 前提数)；无法识别格式时前提数为 None。
+    """
+    field, segments = item_segments(item)
+    if segments is None:
+        return [item], None
+    premises = len(segments.premises)
+    if samples is None:
+        item[field] = shuffle_segments(segments, rng)
+        return [item], premises
+    orders = sample_orders(premises, samples, rng, include_original)
+    return [{**item, field: segments.join(order)} for order in orders], premises
 
-def process_json(input_file: str, output_file: str):
+def process_json(input_file: str, output_file: str, workers: int = 1, seed: int = None, samples: int = None, include_original: bool = False,
+                 metrics: RunMetrics = None):
     """
-    处理 JSON 文件，修改 instruction 字段，并输出新的 JSON 文件。
+    处理 JSON/JSONL 文件，修改 instruction 字段，并流式输出新的文件（默认紧凑 JSONL，.json 后缀输出 JSON 数组）。
     
     Args:
-        input_file (str): 输入 JSON 文件路径
-        output_file (str): 输出 JSON 文件路径
+        input_file (str): 输入 JSON/JSONL 文件路径（支持 .gz / .zst 压缩）
+        output_file (str): 输出文件路径
+        workers (int): 并行进程数，按数据下标分片，输出顺序与输入一致
+        seed (int, optional): 随机种子；每条数据使用由种子和下标派生的随机数生成器，结果与进程数无关
+        samples (int, optional): 每条数据输出 samples 个前提顺序互不相同的副本，一次遍历完成扩增
+        include_original (bool): 配合 samples 使用，副本中包含原始顺序
+        metrics (RunMetrics, optional): 记录本阶段（condition_shuffle）的耗时、数据量、跳过原因和前提数分布
     """
+    metrics = metrics or RunMetrics()
+    task = partial(_item_task, samples=samples, include_original=include_original)
     try:
-        with open(input_file, 'r', encoding='utf-8') as file:
-            data = json.load(file)
+        with metrics.stage("condition_shuffle") as stage:
+            stage.read_file(input_file)
 
-        for item in data:
-            if "instruction" in item:
-                item["instruction"] = process_instruction(item["instruction"])
+            def records():
+                for items, premises in map_records(task, stage.count_in(iter_records(input_file)), workers=workers, seed=seed):
+                    if premises is None:
+                        stage.skip("no premise list (copied unchanged)")
+                    else:
+                        stage.observe("premises", premises)
+                        if samples is not None and len(items) < samples:
+                            stage.counters["records with fewer orders than samples"] += 1
+                    yield from items
 
-        with open(output_file, 'w', encoding='utf-8') as file:
-            json.dump(data, file, ensure_ascii=False, indent=4)
+            write_records(output_file, stage.count_out(records()))
+            stage.wrote_file(output_file)
 
         print(f"Processed file has been saved to: {output_file}")
 
@@ -68,12 +183,20 @@ def main():
     """
     主函数，使用 argparse 解析命令行参数，并执行 JSON 处理。
     """
-    parser = argparse.ArgumentParser(description="Process a JSON file to shuffle instruction data.")
-    parser.add_argument("input_file", type=str, help="Path to the input JSON file")
-    parser.add_argument("output_file", type=str, help="Path to save the processed JSON file")
+    parser = argparse.ArgumentParser(description="Process a JSON/JSONL file to shuffle instruction data.")
+    parser.add_argument("input_file", type=str, help="Path to the input JSON/JSONL file (optionally .gz/.zst)")
+    parser.add_argument("output_file", type=str, help="Path to save the processed file (JSONL unless it ends with .json)")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed (results do not depend on --workers)")
+    parser.add_argument("--samples", type=int, default=None, help="Emit this many distinct premise orders per record")
+    parser.add_argument("--include-original", action="store_true", help="With --samples, keep the original order as one of the copies")
+    add_metrics_arguments(parser)
     args = parser.parse_args()
 
-    process_json(args.input_file, args.output_file)
+    metrics = RunMetrics(run="condition")
+    process_json(args.input_file, args.output_file, workers=args.workers, seed=args.seed,
+                 samples=args.samples, include_original=args.include_original, metrics=metrics)
+    write_reports(metrics, args.metrics_json, args.metrics_prom)
 
 if __name__ == "__main__":
     main()
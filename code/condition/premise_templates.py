@@ -0,0 +1,168 @@
+import re
+
+# Leading "N." / "N. " numbering of a premise line.
+NUMBER_PATTERN = re.compile(r"\s*(\d+)\.\s?")
+
+
+class Segments:
+    """
+    An instruction split into its intro, its premises and its hypothesis tail.
+
+    Each premise is a tuple holding one line per premise block, so parallel blocks (e.g. FOLIO
+    premises and their FOL translations) are always permuted together.
+    """
+
+    __slots__ = ("template", "intro", "headers", "premises", "numbers", "tail")
+
+    def __init__(self, template, intro, headers, premises, numbers, tail):
+        self.template = template
+        self.intro = intro
+        self.headers = headers
+        self.premises = premises
+        self.numbers = numbers
+        self.tail = tail
+
+    def join(self, order=None, renumber=True):
+        """
+        Rebuilds the instruction with the premises in the given order.
+
+        Args:
+            order (list, optional): Premise indices in their new order (default: original order).
+            renumber (bool): Number the premises 1..n in their new order instead of keeping their original numbers.
+
+        Returns:
+            str: The rebuilt instruction.
+        """
+        if order is None:
+            order = range(len(self.premises))
+        parts = [self.intro]
+        for block, header in enumerate(self.headers):
+            parts.append(header)
+            parts.append("\n".join(
+                f"{position if renumber else self.numbers[index]}. {self.premises[index][block]}"
+                for position, index in enumerate(order, start=1)
+            ))
+        parts.append(self.tail)
+        return "".join(parts)
+
+
+class PremiseTemplate:
+    """
+    Describes where the premises of an instruction format start and end.
+
+    Args:
+        name (str): Name of the template (a valid identifier).
+        marker (str): Regex matching the text right before the premises; the intro ends with it.
+        tail (str, optional): Regex matching the start of the hypothesis tail; None if the premises run to the end.
+        block_separator (str, optional): Regex separating parallel premise blocks (e.g. "Premises-FOL:").
+    """
+
+    def __init__(self, name, marker, tail=None, block_separator=None):
+        self.name = name
+        self.marker = marker
+        self.tail_pattern = re.compile(tail) if tail else None
+        self.block_pattern = re.compile(block_separator) if block_separator else None
+
+    def split(self, instruction, start):
+        """
+        Splits `instruction` whose premises start at offset `start`.
+
+        Returns:
+            Segments or None: None if the instruction does not follow the template.
+        """
+        end = len(instruction)
+        if self.tail_pattern is not None:
+            tail_match = self.tail_pattern.search(instruction, start)
+            if tail_match is None:
+                return None
+            end = tail_match.start()
+
+        headers = [""]
+        bounds = [start]
+        if self.block_pattern is not None:
+            for match in self.block_pattern.finditer(instruction, start, end):
+                bounds.extend((match.start(), match.end()))
+                headers.append(match.group(0))
+        bounds.append(end)
+
+        blocks = [instruction[bounds[i]:bounds[i + 1]].split("\n") for i in range(0, len(bounds), 2)]
+        if len({len(lines) for lines in blocks}) != 1:
+            return None
+
+        numbers = []
+        premises = []
+        for lines in zip(*blocks):
+            texts = []
+            for line in lines:
+                number = NUMBER_PATTERN.match(line)
+                texts.append(line[number.end():] if number else line)
+            first = NUMBER_PATTERN.match(lines[0])
+            numbers.append(first.group(1) if first else str(len(numbers) + 1))
+            premises.append(tuple(texts))
+
+        return Segments(self, instruction[:start], headers, premises, numbers, instruction[end:])
+
+
+TEMPLATES = {}
+_LOCATOR = None
+
+
+def register_template(template):
+    """
+    Adds a template to the registry; templates registered first win when several match at the same position.
+    """
+    global _LOCATOR
+    TEMPLATES[template.name] = template
+    _LOCATOR = re.compile("|".join(f"(?P<{name}>{t.marker})" for name, t in TEMPLATES.items()))
+
+
+register_template(PremiseTemplate(
+    "folio",
+    r"based on these premises\.\n\nPremises:\n",
+    tail=r"\n+Conclusion:\n",
+    block_separator=r"\n+Premises-FOL:\n",
+))
+register_template(PremiseTemplate(
+    "logicnli",
+    r"based on given premises\. (?=\d+\.)",
+    tail=r"\s*hypothesis: ",
+))
+register_template(PremiseTemplate(
+    "ruletaker",
+    r"based on given premises\. *\n+",
+    tail=r"\n+question ",
+))
+register_template(PremiseTemplate(
+    "numbered",
+    r"\A(?=1\.)",
+    tail=r"\n+hypothesis: ",
+))
+
+# Template of bare premise lists such as the LogicNLI `premise` and RuleTaker `context` fields.
+PREMISE_LIST = PremiseTemplate("premise_list", r"\A", tail=r"\s*\Z")
+
+
+def split_instruction(instruction):
+    """
+    Splits an instruction into intro, premises and hypothesis tail with the first matching template.
+
+    All template markers are compiled into a single locator, so the instruction is scanned once
+    to find both the format and the start of the premises.
+
+    Args:
+        instruction (str): The instruction.
+
+    Returns:
+        Segments or None: None if no registered template matches.
+    """
+    match = _LOCATOR.search(instruction)
+    if match is None:
+        return None
+    return TEMPLATES[match.lastgroup].split(instruction, match.end())
+
+
+def split_premise_list(text):
+    """
+    Splits a bare numbered premise list (one premise per line).
+    """
+    return PREMISE_LIST.split(text, 0)
@@ -0,0 +1,309 @@
+import hashlib
+import re
+from array import array
+from collections import Counter, deque
+from functools import partial
+
+from record_io import RecordWriter, iter_records
+from run_metrics import RunMetrics
+from workers import map_records
+
+# Fields whose concatenation is compared, in this order.
+DEFAULT_FIELDS = ("instruction", "input", "output")
+
+# Kinds of duplicates, as reported per source.
+EXACT = "exact"
+NEAR = "near"
+
+_WORDS = re.compile(r'\w+')
+_DIGITS = re.compile(r'\d+')
+_OFFSET = 0x9E3779B1
+
+
+def _hash64(text):
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def record_text(record, fields=DEFAULT_FIELDS):
+    """
+    Returns the compared text of a record: its non-empty `fields`, one per line.
+    """
+    return '\n'.join(str(record[field]) for field in fields if record.get(field))
+
+
+def minhash(text, num_perm=128, shingle_size=5):
+    """
+    Returns the MinHash signature of the word shingles of a text, or None if it has no words.
+
+    The signature uses one-permutation hashing: every shingle is hashed once and the hash space
+    is split into `num_perm` bins that each keep their smallest value, so the cost is linear in
+    the number of shingles instead of `num_perm` times it. Empty bins borrow the value of the next
+    non-empty bin (rotation densification), which keeps the fraction of equal bins an unbiased
+    estimate of the Jaccard similarity of the shingle sets.
+
+    Args:
+        text (str): The text.
+        num_perm (int): Number of bins of the signature.
+        shingle_size (int): Number of consecutive (lowercased) words per shingle.
+
+    Returns:
+        array: The signature as 32-bit values, or None.
+    """
+    words = _WORDS.findall(text.lower())
+    if not words:
+        return None
+    span = max(1, len(words) - shingle_size + 1)
+    bins = [None] * num_perm
+    for start in range(span):
+        value = _hash64(' '.join(words[start:start + shingle_size]))
+        slot = value % num_perm
+        value //= num_perm
+        current = bins[slot]
+        if current is None or value < current:
+            bins[slot] = value
+
+    # Rotation densification; the offset keeps values borrowed from different distances apart.
+    signature = array('I', bytes(4 * num_perm))
+    for slot in range(num_perm):
+        distance = 0
+        donor = slot
+        while bins[donor] is None:
+            donor = (donor + 1) % num_perm
+            distance += 1
+        signature[slot] = (bins[donor] + distance * _OFFSET) & 0xFFFFFFFF
+    return signature
+
+
+def line_bag(text):
+    """
+    Returns a digest of the multiset of the non-empty lines of a text, ignoring numbers.
+
+    Records that are reorderings of the same lines (a shuffled premise list, renumbered step
+    orders) have the same bag.
+    """
+    lines = sorted(' '.join(_DIGITS.sub('', line).split()) for line in text.split('\n'))
+    return _hash64('\n'.join(line for line in lines if line))
+
+
+def fingerprint(record, fields=DEFAULT_FIELDS, num_perm=128, shingle_size=5):
+    """
+    Returns the (exact key, MinHash signature, line bag) of a record.
+
+    The exact key hashes the compared text with runs of whitespace collapsed.
+    """
+    text = record_text(record, fields)
+    return _hash64(' '.join(text.split())), minhash(text, num_perm, shingle_size), line_bag(text)
+
+
+def similarity(first, second):
+    """
+    Returns the Jaccard similarity estimated from two MinHash signatures: the fraction of equal bins.
+    """
+    return sum(a == b for a, b in zip(first, second)) / len(first)
+
+
+class Deduplicator:
+    """
+    Streaming index of exact and near-duplicate records.
+
+    Records are checked in order and the first occurrence is kept. A record is an exact duplicate
+    when its whitespace-normalized text was seen before, and a near duplicate when the estimated
+    Jaccard similarity of its word shingles with a kept record is at least `threshold`. Near
+    candidates are found by locality-sensitive hashing: the signature is cut into `bands` bands,
+    and records sharing a band are compared. Each band bucket remembers its latest record.
+
+    Step orders and shuffled premises of one sample are near duplicates of each other by
+    construction; with `keep_order_variants`, a match with the same lines in another order is not
+    counted as a duplicate.
+
+    Memory is bounded: the index holds the last `max_entries` kept records, older ones are evicted
+    and no longer match.
+
+    Args:
+        threshold (float): Similarity from which records are near duplicates; above 1 disables them.
+        num_perm (int): Number of MinHash bins.
+        bands (int): Number of LSH bands; must divide `num_perm`.
+        max_entries (int): Number of kept records held in the index.
+        keep_order_variants (bool): Keep near duplicates that reorder the lines of the match.
+    """
+
+    def __init__(self, threshold=0.95, num_perm=128, bands=16, max_entries=1_000_000, keep_order_variants=True):
+        if num_perm % bands:
+            raise ValueError(f"bands ({bands}) must divide num_perm ({num_perm}).")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.max_entries = max_entries
+        self.keep_order_variants = keep_order_variants
+        self.exact = {}
+        self.buckets = [{} for _ in range(bands)]
+        self.entries = {}
+        self.order = deque()
+        self.next_slot = 0
+        self.evictions = 0
+        self.order_variants = 0
+
+    def _band_keys(self, signature):
+        # Built-in hashes of bytes are only stable within a process, which holds the whole index.
+        rows = self.num_perm // self.bands
+        data = signature.tobytes()
+        return [hash(data[4 * rows * band:4 * rows * (band + 1)]) for band in range(self.bands)]
+
+    def check(self, key, origin):
+        """
+        Checks the fingerprint of a record and indexes it when it is kept.
+
+        Args:
+            key (tuple): The `fingerprint` of the record.
+            origin: Identifies the record in reports (e.g. its source and position).
+
+        Returns:
+            tuple: (None, None, None) for a kept record, otherwise (kind, origin of the kept
+                record, similarity).
+        """
+        exact, signature, bag = key
+        slot = self.exact.get(exact)
+        if slot is not None:
+            return EXACT, self.entries[slot][3], 1.0
+
+        band_keys = None
+        if signature is not None and self.threshold <= 1:
+            band_keys = self._band_keys(signature)
+            variant = False
+            seen = set()
+            for band, band_key in enumerate(band_keys):
+                slot = self.buckets[band].get(band_key)
+                if slot is None or slot in seen:
+                    continue
+                seen.add(slot)
+                _, other_signature, other_bag, other_origin = self.entries[slot]
+                score = similarity(signature, other_signature)
+                if score < self.threshold:
+                    continue
+                if self.keep_order_variants and bag == other_bag:
+                    variant = True
+                    continue
+                return NEAR, other_origin, score
+            if variant:
+                self.order_variants += 1
+
+        self._add(exact, signature, bag, origin, band_keys)
+        return None, None, None
+
+    def _add(self, exact, signature, bag, origin, band_keys):
+        slot = self.next_slot
+        self.next_slot += 1
+        self.entries[slot] = (exact, signature, bag, origin)
+        self.exact[exact] = slot
+        if band_keys is not None:
+            for bucket, band_key in zip(self.buckets, band_keys):
+                bucket[band_key] = slot
+        self.order.append(slot)
+        if len(self.order) > self.max_entries:
+            self._evict(self.order.popleft())
+
+    def _evict(self, slot):
+        exact, signature, _, _ = self.entries.pop(slot)
+        if self.exact.get(exact) == slot:
+            del self.exact[exact]
+        if signature is not None and self.threshold <= 1:
+            for bucket, band_key in zip(self.buckets, self._band_keys(signature)):
+                if bucket.get(band_key) == slot:
+                    del bucket[band_key]
+        self.evictions += 1
+
+
+def _fingerprint_task(item, rng, fields, num_perm, shingle_size):
+    source, record = item
+    if not any(field in record for field in fields):
+        raise ValueError(f"Record {str(record)[:80]!r} of {source} has none of the compared fields: {', '.join(fields)}.")
+    return source, record, fingerprint(record, fields, num_perm, shingle_size)
+
+
+def _sourced(inputs, source_field):
+    for name, path in inputs:
+        for record in iter_records(path):
+            if source_field:
+                source = record.setdefault(source_field, name)
+            else:
+                source = name
+            yield source, record
+
+
+def dedup_files(inputs, output_file, fields=DEFAULT_FIELDS, threshold=0.95, num_perm=128, bands=16, shingle_size=5,
+                max_entries=1_000_000, keep_order_variants=True, source_field=None, removed_file=None, workers=1, metrics=None):
+    """
+    Streams the records of several files into one file without exact and near duplicates.
+
+    Fingerprints are computed by `workers` processes; duplicates are decided in input order by a
+    `Deduplicator`, so the output does not depend on the number of workers.
+
+    Args:
+        inputs (list): (source name, path) pairs, read in order.
+        output_file (str): Path of the deduplicated JSON/JSONL output.
+        fields (tuple): Record fields compared.
+        threshold, num_perm, bands, max_entries, keep_order_variants: See `Deduplicator`.
+        shingle_size (int): Number of words per shingle.
+        source_field (str, optional): Record field holding the source of a record; records without it
+            get the source name of their input file. The source is then used in the report.
+        removed_file (str, optional): Also write the dropped records, with what they duplicate.
+        workers (int): Number of worker processes computing fingerprints.
+        metrics (RunMetrics, optional): Receives the metrics of the "dedup" stage.
+
+    Returns:
+        dict: Per-source counts of records, kept records, exact and near duplicates, and the number
+            of duplicates of each source whose kept copy belongs to each source.
+    """
+    metrics = metrics or RunMetrics()
+    index = Deduplicator(threshold, num_perm, bands, max_entries, keep_order_variants)
+    sources = {}
+    task = partial(_fingerprint_task, fields=fields, num_perm=num_perm, shingle_size=shingle_size)
+    removed = RecordWriter(removed_file) if removed_file else None
+
+    with metrics.stage("dedup") as stage:
+        for _, path in inputs:
+            stage.read_file(path)
+        try:
+            with RecordWriter(output_file) as writer:
+                items = stage.count_in(_sourced(inputs, source_field))
+                for source, record, key in map_records(task, items, workers):
+                    counts = sources.get(source)
+                    if counts is None:
+                        counts = sources[source] = {"records": 0, "kept": 0, EXACT: 0, NEAR: 0, "duplicate_of": Counter()}
+                    position = counts["records"]
+                    counts["records"] += 1
+                    kind, match, score = index.check(key, (source, position))
+                    if kind is None:
+                        counts["kept"] += 1
+                        writer.write(record)
+                        continue
+                    counts[kind] += 1
+                    counts["duplicate_of"][match[0]] += 1
+                    stage.skip(f"{kind} duplicate")
+                    if removed is not None:
+                        removed.write({"source": source, "position": position, "kind": kind, "similarity": score,
+                                       "duplicate_of": {"source": match[0], "position": match[1]}, "record": record})
+                stage.records_out += writer.count
+        finally:
+            if removed is not None:
+                removed.close()
+        stage.wrote_file(output_file)
+        stage.counters["order variants kept"] += index.order_variants
+        stage.counters["index evictions"] += index.evictions
+
+    for counts in sources.values():
+        counts["duplicate_of"] = dict(counts["duplicate_of"].most_common())
+    return {"sources": sources, "order_variants": index.order_variants, "evictions": index.evictions}
+
+
+def format_report(report):
+    """
+    Formats the per-source counts of `dedup_files` as a table.
+    """
+    lines = ["source".ljust(24) + "records".rjust(10) + "kept".rjust(10) + "exact".rjust(10) + "near".rjust(10) + "  duplicates of"]
+    for source, counts in report["sources"].items():
+        duplicates = ", ".join(f"{name}: {count}" for name, count in counts["duplicate_of"].items()) or "-"
+        lines.append(source.ljust(24) + str(counts["records"]).rjust(10) + str(counts["kept"]).rjust(10)
+                     + str(counts[EXACT]).rjust(10) + str(counts[NEAR]).rjust(10) + "  " + duplicates)
+    lines.append(f"Order variants kept: {report['order_variants']}; index evictions: {report['evictions']}.")
+    return "\n".join(lines)
@@ -0,0 +1,181 @@
+import argparse
+import json
+import os
+import sys
+
+CODE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(CODE_DIR, 'answer'))
+
+from artifact_store import ArtifactStore
+from dedup import DEFAULT_FIELDS, dedup_files, format_report as format_dedup_report
+from record_index import RecordIndex, build_index
+from run_metrics import RunMetrics, add_metrics_arguments, write_reports
+
+from augment_pipeline import STAGES, run_pipeline
+from order_policy import STRATEGIES, OrderPolicy
+from export_tokens import DEFAULT_BUCKETS, TOKENIZERS, HFTokenizer, WhitespaceTokenizer, export_tokens, format_report, parse_input
+
+
+def parse_dump(value):
+    """
+    Parses a `STAGE=PATH` argument of `--dump`.
+    """
+    stage, sep, path = value.partition('=')
+    if not sep or stage not in STAGES:
+        raise argparse.ArgumentTypeError(f"Expected STAGE=PATH with STAGE in: {', '.join(STAGES)}")
+    return stage, path
+
+
+def augment(args):
+    metrics = RunMetrics(run="augment")
+    policy = None
+    if args.policy:
+        policy = OrderPolicy(args.policy, k=args.orders, include_original=not args.no_original, fix_last=args.fix_last)
+    store = ArtifactStore(args.incremental) if args.incremental else None
+    try:
+        run_pipeline(
+            args.input_file,
+            args.output_file,
+            dump_paths=dict(args.dump),
+            output_field=args.output_field,
+            max_sequences=args.max_sequences,
+            sample_k=args.sample_k,
+            seed=args.seed,
+            workers=args.workers,
+            cache_size=args.dag_cache_size or None,
+            metrics=metrics,
+            policy=policy,
+            store=store,
+        )
+        if store is not None and args.prune:
+            print(f"Pruned {store.prune()} stale entries from {args.incremental}.")
+    finally:
+        if store is not None:
+            store.close()
+    write_reports(metrics, args.metrics_json, args.metrics_prom)
+
+
+def dedup(args):
+    metrics = RunMetrics(run="dedup")
+    report = dedup_files(
+        args.inputs,
+        args.output_file,
+        fields=tuple(args.fields),
+        threshold=args.threshold,
+        num_perm=args.num_perm,
+        bands=args.bands,
+        shingle_size=args.shingle_size,
+        max_entries=args.max_entries,
+        keep_order_variants=not args.drop_order_variants,
+        source_field=args.source_field or None,
+        removed_file=args.removed,
+        workers=args.workers,
+        metrics=metrics,
+    )
+    print(format_dedup_report(report))
+    print(f"Deduplicated records saved to: {args.output_file}")
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        print(f"Duplicate report saved to: {args.report}")
+    write_reports(metrics, args.metrics_json, args.metrics_prom)
+
+
+def export(args):
+    if args.tokenizer == "hf" and not args.model:
+        raise SystemExit("--model is required with the hf tokenizer")
+    tokenizer = HFTokenizer(args.model) if args.tokenizer == "hf" else WhitespaceTokenizer()
+    meta = export_tokens(args.inputs, args.output_dir, tokenizer, tuple(sorted(args.buckets)))
+    print(format_report(meta))
+    print(f"Export saved to: {args.output_dir}")
+
+
+def index(args):
+    id_field = args.id_field or None
+    if args.get is None and args.id is None:
+        for path in args.files:
+            build_index(path, id_field)
+            print(f"Index saved to: {path}.idx")
+        return
+    for path in args.files:
+        with RecordIndex(path, id_field) as records:
+            record = records[args.get] if args.get is not None else records.get(args.id)
+            print(json.dumps(record, ensure_ascii=False, indent=2))
+
+
+def main():
+    """
+    Entry point of the order-centric augmentation tools.
+    """
+    parser = argparse.ArgumentParser(prog="order_centric", description="Order-centric data augmentation.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    augment_parser = subparsers.add_parser("augment", help="Run the answer-order augmentation pipeline in a single pass.")
+    augment_parser.add_argument("input_file", type=str, help="Path to the input JSON file with step-by-step solutions")
+    augment_parser.add_argument("output_file", type=str, help="Path to save the formatted training JSON file")
+    augment_parser.add_argument("--output-field", type=str, default="output", help="Field holding the step-by-step solution")
+    augment_parser.add_argument("--max-sequences", type=int, default=None, help="Maximum number of step orders enumerated per record")
+    augment_parser.add_argument("--sample-k", type=int, default=None, help="Sample this many distinct step orders per record")
+    augment_parser.add_argument("--seed", type=int, default=None, help="Random seed (results do not depend on --workers)")
+    augment_parser.add_argument("--workers", type=int, default=1, help="Number of worker processes")
+    augment_parser.add_argument("--dag-cache-size", type=int, default=4096,
+                                help="Number of dependency-graph shapes whose step orders are cached per process; 0 disables the cache")
+    augment_parser.add_argument("--policy", choices=STRATEGIES, default=None,
+                                help="Choose step orders on the dependency DAG: uniformly at random, or the farthest from the original by Kendall tau "
+                                     "(replaces --max-sequences/--sample-k and the default first-plus-one-random selection)")
+    augment_parser.add_argument("--orders", type=int, default=1, help="With --policy, number of orders besides the original one")
+    augment_parser.add_argument("--fix-last", action="store_true", help="With --policy, keep the original last step last")
+    augment_parser.add_argument("--no-original", action="store_true", help="With --policy, do not keep the original order")
+    augment_parser.add_argument("--incremental", type=str, default=None, metavar="STORE",
+                                help="SQLite store of per-record outputs; only new or changed records (or a changed pipeline) are recomputed")
+    augment_parser.add_argument("--prune", action="store_true", help="With --incremental, drop stored outputs not used by this build")
+    augment_parser.add_argument("--dump", type=parse_dump, action="append", default=[], metavar="STAGE=PATH",
+                                help=f"Also write an intermediate stage ({', '.join(STAGES)}) to PATH; repeatable")
+    add_metrics_arguments(augment_parser)
+    augment_parser.set_defaults(func=augment)
+
+    dedup_parser = subparsers.add_parser("dedup", help="Merge training files without exact and near-duplicate records.")
+    dedup_parser.add_argument("inputs", type=parse_input, nargs='+', metavar="[SOURCE=]PATH",
+                              help="Training files and their source name (default: file name), read in order")
+    dedup_parser.add_argument("--output-file", type=str, required=True, help="Path of the deduplicated JSON/JSONL file")
+    dedup_parser.add_argument("--fields", type=str, nargs='+', default=list(DEFAULT_FIELDS), help="Record fields compared")
+    dedup_parser.add_argument("--threshold", type=float, default=0.95,
+                              help="Estimated Jaccard similarity of word shingles from which records are near duplicates; above 1 keeps exact deduplication only")
+    dedup_parser.add_argument("--shingle-size", type=int, default=5, help="Words per shingle")
+    dedup_parser.add_argument("--num-perm", type=int, default=128, help="Number of MinHash bins")
+    dedup_parser.add_argument("--bands", type=int, default=16, help="Number of LSH bands (must divide --num-perm)")
+    dedup_parser.add_argument("--max-entries", type=int, default=1_000_000,
+                              help="Kept records held in the index; older records are evicted and no longer match")
+    dedup_parser.add_argument("--drop-order-variants", action="store_true",
+                              help="Also drop near duplicates that only reorder the lines of a kept record (step orders, shuffled premises)")
+    dedup_parser.add_argument("--source-field", type=str, default="",
+                              help="Record field holding the source of a record, set to the input's source name when missing")
+    dedup_parser.add_argument("--removed", type=str, default=None, help="Also write the dropped records, with the record they duplicate")
+    dedup_parser.add_argument("--report", type=str, default=None, help="Write the per-source duplicate counts to this JSON file")
+    dedup_parser.add_argument("--workers", type=int, default=1, help="Number of worker processes computing fingerprints")
+    add_metrics_arguments(dedup_parser)
+    dedup_parser.set_defaults(func=dedup)
+
+    export_parser = subparsers.add_parser("export", help="Tokenize formatted training files into a memory-mapped, length-bucketed export.")
+    export_parser.add_argument("inputs", type=parse_input, nargs='+', metavar="[TYPE=]PATH",
+                               help="Formatted training files and their augmentation type (default: file name)")
+    export_parser.add_argument("--output-dir", type=str, required=True, help="Directory of the export")
+    export_parser.add_argument("--tokenizer", choices=sorted(TOKENIZERS), default="whitespace", help="Tokenizer")
+    export_parser.add_argument("--model", type=str, default=None, help="Model path of the hf tokenizer")
+    export_parser.add_argument("--buckets", type=int, nargs='+', default=list(DEFAULT_BUCKETS), help="Upper bounds of the length buckets")
+    export_parser.set_defaults(func=export)
+
+    index_parser = subparsers.add_parser("index", help="Build sidecar record indexes, or fetch one record through them.")
+    index_parser.add_argument("files", type=str, nargs='+', help="JSON/JSONL data files (not compressed)")
+    index_parser.add_argument("--id-field", type=str, default="instruction", help="Field the record IDs are derived from; empty to skip IDs")
+    lookup = index_parser.add_mutually_exclusive_group()
+    lookup.add_argument("--get", type=int, default=None, metavar="POSITION", help="Print the record at this position")
+    lookup.add_argument("--id", type=str, default=None, help="Print the record with this ID")
+    index_parser.set_defaults(func=index)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+import json
+import mmap
+import os
+import re
+import struct
+from array import array
+from bisect import bisect_left
+from itertools import zip_longest
+
+from record_io import iter_records, record_id
+
+# Sidecar layout: header, then `count` record start offsets, `count` end offsets and, when the
+# index has IDs, `count` sorted 64-bit record IDs with the position of each.
+INDEX_MAGIC = b"OCIDX001"
+INDEX_HEADER = struct.Struct("<8sQQQQ")  # magic, count, source size, source mtime (ns), has IDs
+INDEX_SUFFIX = ".idx"
+
+# Top-level tokens of a JSON array: complete strings (skipped at once) and structural characters.
+_ARRAY_TOKENS = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"|[\[\]{},]')
+
+
+def index_path(path):
+    """
+    Returns the path of the sidecar index of a data file.
+    """
+    return path + INDEX_SUFFIX
+
+
+def _record_spans(data):
+    """Yields the (start, end) byte spans of the records of a JSON array or JSONL buffer."""
+    position = 0
+    while position < len(data) and data[position:position + 1].isspace():
+        position += 1
+
+    if data[position:position + 1] != b'[':
+        while position < len(data):
+            end = data.find(b'\n', position)
+            if end < 0:
+                end = len(data)
+            if data[position:end].strip():
+                yield position, end
+            position = end + 1
+        return
+
+    depth = 0
+    element_start = position + 1
+    for match in _ARRAY_TOKENS.finditer(data, position):
+        char = data[match.start()]
+        if char in b'[{':
+            depth += 1
+        elif char in b']}':
+            depth -= 1
+            if depth == 0:
+                if data[element_start:match.start()].strip():
+                    yield element_start, match.start()
+                return
+        elif char == ord(',') and depth == 1:
+            yield element_start, match.start()
+            element_start = match.end()
+    raise ValueError("Unterminated JSON array.")
+
+
+def build_index(path, id_field='instruction'):
+    """
+    Builds the sidecar index of a JSON array or JSONL file (not compressed).
+
+    The index holds the byte span of every record and, with `id_field`, the sorted record IDs
+    (see `record_io.record_id`), so that `RecordIndex` can fetch any record by position or ID
+    without parsing the rest of the file. Building parses every record once when IDs are requested.
+
+    Args:
+        path (str): Path to the data file.
+        id_field (str, optional): Field the record IDs are derived from; None skips the IDs.
+
+    Returns:
+        str: Path of the written index.
+    """
+    if path.endswith(('.gz', '.zst')):
+        raise ValueError(f"{path}: compressed files cannot be indexed; decompress them first.")
+
+    starts = array('Q')
+    ends = array('Q')
+    ids = []
+    stat = os.stat(path)
+    with open(path, 'rb') as file:
+        data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if stat.st_size else b''
+        try:
+            for start, end in _record_spans(data):
+                if id_field is not None:
+                    record = json.loads(data[start:end])
+                    ids.append((int(record_id(record, id_field), 16), len(starts)))
+                starts.append(start)
+                ends.append(end)
+        finally:
+            if stat.st_size:
+                data.close()
+
+    with open(index_path(path), 'wb') as file:
+        file.write(INDEX_HEADER.pack(INDEX_MAGIC, len(starts), stat.st_size, stat.st_mtime_ns, id_field is not None))
+        starts.tofile(file)
+        ends.tofile(file)
+        if id_field is not None:
+            ids.sort()
+            array('Q', (key for key, _ in ids)).tofile(file)
+            array('Q', (position for _, position in ids)).tofile(file)
+    return index_path(path)
+
+
+class RecordIndex:
+    """
+    Random access to the records of a JSON array or JSONL file through its sidecar index.
+
+    The data file and the index are memory-mapped: fetching a record parses only that record.
+    The index is (re)built when it is missing or older than the data file.
+
+    Args:
+        path (str): Path to the data file.
+        id_field (str, optional): Field the record IDs are derived from when the index has to be built.
+        build (bool): Build a missing or stale index instead of raising FileNotFoundError.
+    """
+
+    def __init__(self, path, id_field='instruction', build=True):
+        self.path = path
+        if not self._fresh():
+            if not build:
+                raise FileNotFoundError(f"No up-to-date index for {path}; build it with build_index.")
+            build_index(path, id_field)
+
+        self._files = []
+        self._views = []
+        self.data = self._map(path)
+        index = self._map(index_path(path))
+        _, count, _, _, has_ids = INDEX_HEADER.unpack_from(index)
+        self.count = count
+        body = memoryview(index)[INDEX_HEADER.size:]
+        self._views.append(body)
+        self.starts = self._cast(body[:8 * count])
+        self.ends = self._cast(body[8 * count:16 * count])
+        self.ids = self._cast(body[16 * count:24 * count]) if has_ids else None
+        self.id_positions = self._cast(body[24 * count:32 * count]) if has_ids else None
+
+    def _fresh(self):
+        try:
+            with open(index_path(self.path), 'rb') as file:
+                header = file.read(INDEX_HEADER.size)
+        except FileNotFoundError:
+            return False
+        if len(header) < INDEX_HEADER.size:
+            return False
+        magic, _, size, mtime_ns, _ = INDEX_HEADER.unpack(header)
+        stat = os.stat(self.path)
+        return magic == INDEX_MAGIC and size == stat.st_size and mtime_ns == stat.st_mtime_ns
+
+    def _map(self, path):
+        with open(path, 'rb') as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                return b''
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._files.append(mapped)
+        return mapped
+
+    def _cast(self, view):
+        view = view.cast('Q')
+        self._views.append(view)
+        return view
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, position):
+        if position < 0:
+            position += self.count
+        if not 0 <= position < self.count:
+            raise IndexError(f"Record {position} out of range for {self.path} ({self.count} records).")
+        return json.loads(self.data[self.starts[position]:self.ends[position]])
+
+    def records(self, start=0, stop=None):
+        """
+        Yields the records in positions [start, stop), e.g. one shard of the file.
+        """
+        for position in range(*slice(start, stop).indices(self.count)):
+            yield self[position]
+
+    def position_of(self, item_id):
+        """
+        Returns the position of the first record with the given ID, or None if there is none.
+        """
+        if self.ids is None:
+            raise ValueError(f"The index of {self.path} was built without record IDs.")
+        key = int(item_id, 16)
+        found = bisect_left(self.ids, key)
+        if found < self.count and self.ids[found] == key:
+            return self.id_positions[found]
+        return None
+
+    def get(self, item_id):
+        """
+        Returns the first record with the given ID.
+
+        Raises:
+            KeyError: If no record has this ID.
+        """
+        position = self.position_of(item_id)
+        if position is None:
+            raise KeyError(item_id)
+        return self[position]
+
+    def close(self):
+        for view in reversed(self._views):
+            view.release()
+        for mapped in self._files:
+            mapped.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def zip_records(*paths):
+    """
+    Streams the records of several files side by side, like `zip`, but fails instead of truncating.
+
+    Raises:
+        ValueError: If the files do not have the same number of records.
+    """
+    missing = object()
+    for records in zip_longest(*(iter_records(path) for path in paths), fillvalue=missing):
+        if any(record is missing for record in records):
+            raise ValueError(f"{' and '.join(paths)} have different numbers of records.")
+        yield records
+
+
+def join_by_id(results_path, items_path, id_field='instruction'):
+    """
+    Pairs every result carrying an `id` with the record of `items_path` that has this ID.
+
+    The items file is accessed through its index, so results may be in any order or cover only
+    part of the items.
+
+    Raises:
+        KeyError: If a result's ID matches no item.
+
+    Yields:
+        tuple: (result, item) pairs in the order of the results file.
+    """
+    with RecordIndex(items_path, id_field) as items:
+        for result in iter_records(results_path):
+            yield result, items.get(result['id'])
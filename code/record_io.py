@@ -0,0 +1,173 @@
+import gzip
+import hashlib
+import json
+from itertools import chain
+
+# Formats understood by the readers and writers of this module.
+FORMATS = ("jsonl", "json")
+
+
+def open_text(path, mode='r'):
+    """
+    Opens a text file, transparently (de)compressing `.gz` and `.zst` files.
+
+    Args:
+        path (str): Path to the file.
+        mode (str): 'r', 'w' or 'a'.
+
+    Returns:
+        file object: A text-mode file object using UTF-8.
+    """
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    if path.endswith('.zst'):
+        try:
+            import zstandard
+        except ImportError as e:
+            raise ImportError("Reading or writing .zst files requires the 'zstandard' package.") from e
+        return zstandard.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def record_id(record, field='instruction'):
+    """
+    Returns a stable identifier of a record: a content hash of its `field` (the instruction by default).
+
+    Args:
+        record (dict): The record.
+        field (str): The field the identifier is derived from.
+
+    Returns:
+        str: A 16-character hexadecimal identifier.
+    """
+    return hashlib.sha256(str(record.get(field, '')).encode('utf-8')).hexdigest()[:16]
+
+
+def detect_format(path):
+    """
+    Returns the record format implied by the file name: 'json' for `*.json[.gz|.zst]`, 'jsonl' otherwise.
+    """
+    name = path
+    for suffix in ('.gz', '.zst'):
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+    return "json" if name.endswith('.json') else "jsonl"
+
+
+def iter_records(path, chunk_size=1 << 16):
+    """
+    Lazily yields the records of a JSON array or JSONL file, optionally gzip/zstd compressed.
+
+    The format is detected from the content: a file starting with '[' is read as a JSON array,
+    anything else as one JSON value per line. Only one record is held in memory at a time.
+
+    Args:
+        path (str): Path to the input file.
+        chunk_size (int): Number of characters read at once from a JSON array.
+
+    Yields:
+        dict: One record at a time.
+    """
+    with open_text(path, 'r') as file:
+        buffer = file.read(chunk_size).lstrip()
+        while not buffer:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                return
+            buffer = chunk.lstrip()
+
+        if not buffer.startswith('['):
+            yield from _iter_json_lines(buffer, file)
+            return
+
+        decoder = json.JSONDecoder()
+        buffer = buffer[1:]
+        eof = False
+        while True:
+            buffer = buffer.lstrip()
+            if buffer.startswith(','):
+                buffer = buffer[1:].lstrip()
+            if buffer.startswith(']'):
+                return
+            try:
+                record, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                chunk = file.read(chunk_size)
+                eof = not chunk
+                buffer += chunk
+                continue
+            yield record
+            buffer = buffer[end:]
+
+
+def _iter_json_lines(head, file):
+    """Yields the records of a JSONL file whose first characters were already read into `head`."""
+    # Complete the partially read last line so that `head` ends on a line boundary.
+    head += file.readline()
+    for line in chain(head.split('\n'), file):
+        if line.strip():
+            yield json.loads(line)
+
+
+class RecordWriter:
+    """
+    Writes records incrementally as compact JSONL (default) or as a compact JSON array.
+
+    The format is taken from `fmt` or, when omitted, from the file name (see `detect_format`).
+    """
+
+    def __init__(self, path, fmt=None, mode='w'):
+        self.format = fmt or detect_format(path)
+        if self.format not in FORMATS:
+            raise ValueError(f"Unknown format '{self.format}'. Expected one of: {', '.join(FORMATS)}")
+        if self.format == "json" and mode != 'w':
+            raise ValueError("JSON arrays can only be written from scratch; use the 'jsonl' format to append.")
+        self.path = path
+        self.file = open_text(path, mode)
+        self.count = 0
+        if self.format == "json":
+            self.file.write('[')
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False)
+        if self.format == "json":
+            self.file.write(',\n' if self.count else '\n')
+            self.file.write(line)
+        else:
+            self.file.write(line + '\n')
+        self.count += 1
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            if self.format == "json":
+                self.file.write('\n]\n')
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def write_records(path, records, fmt=None):
+    """
+    Streams records to a file.
+
+    Args:
+        path (str): Path to the output file.
+        records (iterable): The records to write.
+        fmt (str, optional): 'jsonl' or 'json'; inferred from the file name when omitted.
+
+    Returns:
+        int: The number of records written.
+    """
+    with RecordWriter(path, fmt) as writer:
+        for record in records:
+            writer.write(record)
+    return writer.count
@@ -0,0 +1,332 @@
+import json
+import os
+import sys
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Prefix of every Prometheus metric name.
+METRIC_PREFIX = "order_centric"
+
+# Upper bounds of the histogram buckets of each distribution; other distributions use DEFAULT_BOUNDS.
+DEFAULT_BOUNDS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+BOUNDS = {
+    "premises": (2, 4, 6, 8, 10, 12, 16, 20, 24, 32),
+    "steps": (1, 2, 3, 4, 5, 6, 8, 10, 12, 16, 20, 32),
+    "dag_steps": (1, 2, 3, 4, 5, 6, 8, 10, 12, 16, 20, 32),
+    "dag_edges": (0, 1, 2, 4, 8, 16, 32, 64),
+    # Factorials: a chain has 1 order, n independent steps have n!.
+    "dag_orders": (1, 2, 6, 24, 120, 720, 5040, 40320, 362880, 3628800),
+    "sequences": (1, 2, 4, 8, 16, 32, 64, 128, 256, 1024),
+}
+
+
+def peak_rss_bytes(who="self"):
+    """
+    Returns the peak resident set size in bytes of this process ("self") or of its largest
+    terminated child process ("children"), or None where it is unavailable.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF if who == "self" else resource.RUSAGE_CHILDREN)
+    # Linux reports kilobytes, macOS bytes.
+    return usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+
+
+def file_size(path):
+    """Returns the size of a file on disk, or 0 if it does not exist."""
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+class Histogram:
+    """
+    Counts observations in fixed buckets, like a Prometheus histogram, and keeps their sum and maximum.
+    """
+
+    def __init__(self, bounds=DEFAULT_BOUNDS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def to_dict(self):
+        labels = [f"<={bound}" for bound in self.bounds] + [f">{self.bounds[-1]}"]
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else None,
+            "max": self.max,
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class RecordStats:
+    """
+    Measurements of a single record, collected where the record is processed (possibly in a
+    worker process) and merged into the `StageMetrics` of the main process.
+
+    Attributes:
+        skips (dict): Number of dropped records or variants by reason.
+        seconds (dict): Time spent in each step of the record's processing.
+        values (list): (distribution, value) observations.
+    """
+
+    __slots__ = ("skips", "seconds", "values")
+
+    def __init__(self):
+        self.skips = {}
+        self.seconds = {}
+        self.values = []
+
+    def skip(self, reason, count=1):
+        self.skips[reason] = self.skips.get(reason, 0) + count
+
+    def observe(self, name, value):
+        self.values.append((name, value))
+
+    def lap(self, name, start):
+        """
+        Adds the time elapsed since `start` to step `name` and returns the current time, to start the next step.
+        """
+        now = time.perf_counter()
+        self.seconds[name] = self.seconds.get(name, 0.0) + now - start
+        return now
+
+
+class StageMetrics:
+    """
+    Metrics of one pipeline stage: wall time, records in and out, skipped records by reason,
+    bytes read and written, peak memory, distributions and free-form counters.
+
+    A skipped record is dropped by the stage, or passed through without its transformation
+    (e.g. an output without dependency clauses), in which case a later stage drops it.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.seconds = 0.0
+        self.records_in = 0
+        self.records_out = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.skips = Counter()
+        self.counters = Counter()
+        self.step_seconds = Counter()
+        self.distributions = {}
+        self.peak_rss_bytes = None
+        self.children_peak_rss_bytes = None
+
+    def count_in(self, records):
+        """Yields `records`, counting them as the input of the stage."""
+        for record in records:
+            self.records_in += 1
+            yield record
+
+    def count_out(self, records):
+        """Yields `records`, counting them as the output of the stage."""
+        for record in records:
+            self.records_out += 1
+            yield record
+
+    def skip(self, reason, count=1):
+        self.skips[reason] += count
+
+    def observe(self, name, value):
+        histogram = self.distributions.get(name)
+        if histogram is None:
+            histogram = self.distributions[name] = Histogram(BOUNDS.get(name, DEFAULT_BOUNDS))
+        histogram.observe(value)
+
+    def read_file(self, path):
+        self.bytes_read += file_size(path)
+
+    def wrote_file(self, path):
+        self.bytes_written += file_size(path)
+
+    def merge(self, stats):
+        """
+        Adds the `RecordStats` of one record.
+        """
+        self.skips.update(stats.skips)
+        self.step_seconds.update(stats.seconds)
+        for name, value in stats.values:
+            self.observe(name, value)
+
+    def to_dict(self):
+        return {
+            "stage": self.name,
+            "seconds": self.seconds,
+            "records_in": self.records_in,
+            "records_out": self.records_out,
+            "records_per_sec": self.records_in / self.seconds if self.seconds else None,
+            "skipped": sum(self.skips.values()),
+            "skip_reasons": dict(self.skips.most_common()),
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+            "peak_rss_bytes": self.peak_rss_bytes,
+            "children_peak_rss_bytes": self.children_peak_rss_bytes,
+            "step_seconds": dict(self.step_seconds),
+            "counters": dict(self.counters),
+            "distributions": {name: histogram.to_dict() for name, histogram in self.distributions.items()},
+        }
+
+
+class RunMetrics:
+    """
+    Collects the metrics of the stages of a run and writes them as a JSON report or as
+    Prometheus textfile metrics.
+
+    Stage functions accept an optional `metrics` argument and record into `metrics.stage(name)`;
+    several stages of a chained run share one `RunMetrics`.
+
+    Args:
+        run (str, optional): Name of the run, used as the `run` label of the Prometheus metrics.
+    """
+
+    def __init__(self, run=None):
+        self.run = run
+        self.started = datetime.now(timezone.utc)
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Times the enclosed block as (part of) stage `name` and yields its `StageMetrics`.
+
+        The peak memory of the process and of its finished worker processes is sampled on exit.
+        """
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = StageMetrics(name)
+        start = time.perf_counter()
+        try:
+            yield stage
+        finally:
+            stage.seconds += time.perf_counter() - start
+            stage.peak_rss_bytes = peak_rss_bytes("self")
+            stage.children_peak_rss_bytes = peak_rss_bytes("children")
+
+    def report(self):
+        return {
+            "run": self.run,
+            "started": self.started.isoformat(timespec="seconds"),
+            "seconds": sum(stage.seconds for stage in self.stages.values()),
+            "argv": sys.argv,
+            "python": sys.version.split()[0],
+            "stages": [stage.to_dict() for stage in self.stages.values()],
+        }
+
+    def write_json(self, path):
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(self.report(), file, ensure_ascii=False, indent=2)
+
+    def write_prometheus(self, path):
+        """
+        Writes the metrics in the Prometheus text format, e.g. for the node_exporter textfile collector.
+
+        The file is written next to `path` and renamed into place, so a collector never reads a partial file.
+        """
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            file.write(self.prometheus_text())
+        os.replace(temp_path, path)
+
+    def prometheus_text(self):
+        run = {"run": self.run} if self.run else {}
+        families = {}
+
+        def sample(name, kind, help_text, labels, value, suffix=""):
+            family = families.setdefault(name, [f"# HELP {METRIC_PREFIX}_{name} {help_text}", f"# TYPE {METRIC_PREFIX}_{name} {kind}"])
+            if value is not None:
+                family.append(f"{METRIC_PREFIX}_{name}{suffix}{_labels({**run, **labels})} {_number(value)}")
+
+        for stage in self.stages.values():
+            labels = {"stage": stage.name}
+            sample("stage_seconds", "gauge", "Wall time of the stage.", labels, stage.seconds)
+            sample("stage_records", "gauge", "Records read and written by the stage.", {**labels, "direction": "in"}, stage.records_in)
+            sample("stage_records", "gauge", "Records read and written by the stage.", {**labels, "direction": "out"}, stage.records_out)
+            for reason, count in stage.skips.items():
+                sample("stage_skipped_records", "gauge", "Records dropped or passed through untransformed by the stage, by reason.", {**labels, "reason": reason}, count)
+            sample("stage_bytes", "gauge", "Bytes read and written by the stage.", {**labels, "direction": "read"}, stage.bytes_read)
+            sample("stage_bytes", "gauge", "Bytes read and written by the stage.", {**labels, "direction": "written"}, stage.bytes_written)
+            sample("stage_peak_rss_bytes", "gauge", "Peak resident memory at the end of the stage.", {**labels, "process": "main"}, stage.peak_rss_bytes)
+            sample("stage_peak_rss_bytes", "gauge", "Peak resident memory at the end of the stage.", {**labels, "process": "workers"}, stage.children_peak_rss_bytes)
+            for step, seconds in stage.step_seconds.items():
+                sample("stage_step_seconds", "gauge", "Time spent in each step of the stage, summed over workers.", {**labels, "step": step}, seconds)
+            for counter, value in stage.counters.items():
+                sample("stage_events", "gauge", "Stage-specific event counts.", {**labels, "event": counter}, value)
+            for name, histogram in stage.distributions.items():
+                help_text = f"Distribution of {name.replace('_', ' ')} per record."
+                cumulative = 0
+                for bound, count in zip(histogram.bounds, histogram.counts):
+                    cumulative += count
+                    sample(name, "histogram", help_text, {**labels, "le": _number(bound)}, cumulative, "_bucket")
+                sample(name, "histogram", help_text, {**labels, "le": "+Inf"}, histogram.count, "_bucket")
+                sample(name, "histogram", help_text, labels, histogram.sum, "_sum")
+                sample(name, "histogram", help_text, labels, histogram.count, "_count")
+
+        return "".join(line + "\n" for family in families.values() for line in family)
+
+    def format_summary(self):
+        """
+        Formats one line per stage: wall time, records in/out, dropped records and throughput.
+        """
+        lines = ["stage".ljust(24) + "seconds".rjust(10) + "in".rjust(10) + "out".rjust(10) + "skipped".rjust(9) + "records/s".rjust(12)]
+        for stage in self.stages.values():
+            rate = stage.records_in / stage.seconds if stage.seconds else 0
+            lines.append(
+                stage.name[:23].ljust(24) + f"{stage.seconds:.2f}".rjust(10) + str(stage.records_in).rjust(10)
+                + str(stage.records_out).rjust(10) + str(sum(stage.skips.values())).rjust(9) + f"{rate:,.0f}".rjust(12)
+            )
+            for reason, count in stage.skips.most_common():
+                lines.append(f"    skipped {count}: {reason}")
+        return "\n".join(lines)
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for value in labels.values())
+    return "{" + ",".join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + "}"
+
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def add_metrics_arguments(parser):
+    """
+    Adds the `--metrics-json` and `--metrics-prom` options to an argument parser.
+    """
+    parser.add_argument("--metrics-json", type=str, default=None, help="Write a JSON run report with per-stage metrics to this file")
+    parser.add_argument("--metrics-prom", type=str, default=None, help="Write the metrics in Prometheus textfile format to this file")
+
+
+def write_reports(metrics, json_path=None, prom_path=None):
+    """
+    Prints the per-stage summary and writes the requested reports.
+    """
+    print(metrics.format_summary())
+    if json_path:
+        metrics.write_json(json_path)
+        print(f"Run report saved to: {json_path}")
+    if prom_path:
+        metrics.write_prometheus(prom_path)
+        print(f"Prometheus metrics saved to: {prom_path}")
@@ -1,64 +1,29 @@
 import json
-import re
 
-def extract_last_answer(model_output):
-    pattern = re.compile(r"(entailment|neutral|self_contradiction|self-contradiction|contradiction)", re.IGNORECASE)
-    matches = pattern.findall(model_output)
-    
-    if matches:
-        last_match = matches[-1].lower() 
-        if last_match in ["self_contradiction", "self-contradiction"]:
-            return "self_contradiction"
-        return last_match
-    return None  
-
-def process_files(result_file_path, test_file_path, accuracy_file_path):
-    with open(result_file_path, 'r', encoding='utf-8') as file:
-        cot_ori_data = json.load(file)
-
-    with open(test_file_path, 'r', encoding='utf-8') as file:
-        folio_test_data = json.load(file)
-
-    correct_count = 0
-    total_count = 0
-    new_data = []
+from scorer import LABEL_SPECS, score_file
+from record_io import open_text
 
-    for cot_item, folio_item in zip(cot_ori_data, folio_test_data):
-        model_output = cot_item.get('model_output', '')
-        folio_output = folio_item.get('output', '').lower()
+spec = LABEL_SPECS["logicnli"]
 
-        extracted_answer = extract_last_answer(model_output)
-        correct = False
 
-        if extracted_answer and extracted_answer == folio_output:
-            correct = True
-            correct_count += 1
-        
-        total_count += 1
-        folio_item['model_output'] = model_output
-        folio_item['extracted_answer'] = extracted_answer
-        folio_item['correct'] = correct
-
-        new_data.append(folio_item)
-
-    accuracy = correct_count / total_count if total_count > 0 else 0
+def extract_last_answer(model_output):
+    return spec.extract(model_output)
 
-    output_content = {
-        "accuracy": accuracy,
-        "total": total_count,
-        "correct": correct_count,
-        "data": new_data
-    }
+def process_files(result_file_path, test_file_path, accuracy_file_path, summary_file_path=None):
+    summary = score_file(spec, result_file_path, test_file_path, accuracy_file_path)
 
-    with open(accuracy_file_path, 'w', encoding='utf-8') as out_file:
-        json.dump(output_content, out_file, ensure_ascii=False, indent=4)
+    if summary_file_path:
+        with open_text(summary_file_path, 'w') as out_file:
+            json.dump(summary, out_file, ensure_ascii=False)
 
-    print(f"Processed {total_count} items. Accuracy: {accuracy:.2%}")
+    print(f"Processed {summary['total']} items. Accuracy: {summary['accuracy']:.2%}")
+    return summary
 
 if __name__ == "__main__":
     result_file_path = 'results/Sequential/logicnli.json'
     test_file_path = "data/test/Sequential/logicnli.json"
     # test_file_path = "data/test/Shuffled/logicnli.json"
-    accuracy_file_path = 'results/Sequential/logicnli_acc.json'
+    accuracy_file_path = 'results/Sequential/logicnli_acc.jsonl'
+    summary_file_path = 'results/Sequential/logicnli_acc_summary.json'
 
-    process_files(result_file_path, test_file_path, accuracy_file_path)
\ No newline at end of file
+    process_files(result_file_path, test_file_path, accuracy_file_path, summary_file_path)
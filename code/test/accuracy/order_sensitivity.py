@@ -0,0 +1,336 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+import sys
+
+import numpy as np
+
+CODE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+for directory in ('', 'condition', 'answer'):
+    sys.path.insert(0, os.path.join(CODE_DIR, directory))
+
+from cot_scanner import scan_cot
+from generate_step_sequences import parse_dependencies
+from premise_templates import split_instruction
+from record_io import iter_records
+from step_dag import StepDAG
+
+# Upper bounds of the premise-count and DAG-depth buckets; the last bucket is open.
+PREMISE_BOUNDS = (4, 8, 12, 16, 24)
+DEPTH_BOUNDS = (1, 2, 3, 4, 6)
+
+# Quantities with bootstrap confidence intervals, computed from per-key sums of the pairs.
+STATISTICS = ("sequential_accuracy", "shuffled_accuracy", "accuracy_gap", "flip_rate", "answer_flip_rate")
+
+
+def _normalize(text):
+    return " ".join(text.split())
+
+
+def order_key(instruction):
+    """
+    Returns a key of a test item that does not depend on the order of its premises, and its premise count.
+
+    The instruction is split by `premise_templates.split_instruction`; the key hashes the intro,
+    the sorted premise texts without their numbers and the hypothesis tail, all with whitespace
+    normalized, so a Sequential item and its Shuffled variants share it. Instructions without a
+    known premise format are keyed by their whole text.
+
+    Returns:
+        tuple: (16-character hexadecimal key, number of premises or None).
+    """
+    segments = split_instruction(instruction)
+    if segments is None:
+        payload, premises = _normalize(instruction), None
+    else:
+        texts = sorted(text for text in (_normalize(" ".join(premise)) for premise in segments.premises) if text)
+        payload = "\x1e".join([_normalize(segments.intro), *texts, _normalize(segments.tail)])
+        premises = len(texts)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16], premises
+
+
+def dag_depth(model_output):
+    """
+    Returns the length of the longest step-dependency chain of a step-by-step output, or None when
+    it has no "Premises and steps required" clauses (or they form a cycle).
+    """
+    scan = scan_cot(model_output or '')
+    if not scan.dependencies:
+        return None
+    return StepDAG.from_graph(parse_dependencies(scan.conditions()["Used"])).depth()
+
+
+def load_items(path, depths=False):
+    """
+    Reads scored test items (`scorer.py --items-suffix` or `evaluate.py --items-suffix`) into columns.
+
+    Args:
+        path (str): Path to the scored items with `instruction`, `extracted_answer` and `correct`.
+        depths (bool): Also compute the DAG depth of each `model_output`.
+
+    Returns:
+        dict: "keys" (list), "correct" (bool array), "answers" (list), "premises" and "depths"
+            (int arrays, -1 when unknown).
+    """
+    keys = []
+    correct = []
+    answers = []
+    premises = []
+    depth_values = []
+    for index, item in enumerate(iter_records(path)):
+        if 'correct' not in item:
+            raise ValueError(f"{path}: item {index} is not scored; write scored items with --items-suffix.")
+        key, count = order_key(item['instruction'])
+        keys.append(key)
+        correct.append(item['correct'])
+        answers.append(item.get('extracted_answer'))
+        premises.append(-1 if count is None else count)
+        if depths:
+            depth = dag_depth(item.get('model_output'))
+            depth_values.append(-1 if depth is None else depth)
+    return {
+        "keys": keys,
+        "correct": np.array(correct, dtype=bool),
+        "answers": answers,
+        "premises": np.array(premises, dtype=np.int64),
+        "depths": np.array(depth_values if depths else [-1] * len(keys), dtype=np.int64),
+    }
+
+
+def mcnemar(b, c):
+    """
+    McNemar test of paired correctness: `b` pairs right only in the Sequential order, `c` only in the Shuffled one.
+
+    Uses the exact two-sided binomial test below 25 discordant pairs, and the continuity-corrected
+    chi-square statistic (1 degree of freedom) otherwise.
+
+    Returns:
+        dict: Discordant counts, statistic, p-value and method.
+    """
+    n = b + c
+    if n == 0:
+        return {"b": b, "c": c, "statistic": 0.0, "p_value": 1.0, "method": "none"}
+    if n < 25:
+        tail = sum(math.comb(n, i) for i in range(min(b, c) + 1)) / 2 ** n
+        return {"b": b, "c": c, "statistic": float(min(b, c)), "p_value": min(1.0, 2 * tail), "method": "exact"}
+    statistic = (abs(b - c) - 1) ** 2 / n
+    return {"b": b, "c": c, "statistic": statistic, "p_value": math.erfc(math.sqrt(statistic / 2)), "method": "chi2"}
+
+
+def bucket_labels(bounds):
+    """Labels of the buckets of `_buckets`: "<=a", "a+1-b" (or "b"), ..., ">z"."""
+    labels = [f"<={bounds[0]}"]
+    for low, bound in zip(bounds, bounds[1:]):
+        labels.append(str(bound) if bound == low + 1 else f"{low + 1}-{bound}")
+    return labels + [f">{bounds[-1]}"]
+
+
+def _buckets(values, bounds):
+    """Bucket index of each value (`searchsorted` on the bounds); unknown values (-1) go to an extra last bucket."""
+    index = np.searchsorted(np.asarray(bounds), values, side='left')
+    return np.where(values < 0, len(bounds) + 1, index)
+
+
+def _by_bucket(bucket, count, sequential, shuffled, flips, labels):
+    pairs = np.bincount(bucket, minlength=count)
+    sums = [np.bincount(bucket, weights=values, minlength=count) for values in (sequential, shuffled, flips)]
+    rows = {}
+    for index, label in enumerate(labels):
+        if pairs[index]:
+            n = int(pairs[index])
+            rows[label] = {
+                "pairs": n,
+                "sequential_accuracy": sums[0][index] / n,
+                "shuffled_accuracy": sums[1][index] / n,
+                "flip_rate": sums[2][index] / n,
+            }
+    return rows
+
+
+def bootstrap(cluster_sums, cluster_pairs, resamples=1000, confidence=0.95, seed=0):
+    """
+    Percentile confidence intervals of `STATISTICS`, resampling whole keys (an item and all its
+    Shuffled variants) with replacement, since the pairs of one key are not independent.
+
+    Args:
+        cluster_sums (ndarray): (keys, 4) per-key sums of Sequential correct, Shuffled correct,
+            correctness flips and answer flips.
+        cluster_pairs (ndarray): Number of pairs of each key.
+
+    Returns:
+        dict: Maps each statistic to its (low, high) interval.
+    """
+    rng = np.random.default_rng(seed)
+    keys = len(cluster_pairs)
+    columns = np.column_stack([cluster_sums, cluster_pairs]).astype(np.float64)
+    # Resample in blocks that keep the gathered (block, keys, 5) array around 32 MiB.
+    block = max(1, (1 << 22) // (keys * columns.shape[1]))
+    totals = []
+    for start in range(0, resamples, block):
+        draws = rng.integers(0, keys, size=(min(block, resamples - start), keys))
+        totals.append(columns[draws].sum(axis=1))
+    totals = np.concatenate(totals)
+    rates = totals[:, :4] / totals[:, 4:5]
+    values = np.column_stack([rates[:, 0], rates[:, 1], rates[:, 1] - rates[:, 0], rates[:, 2], rates[:, 3]])
+    alpha = (1 - confidence) / 2
+    low, high = np.quantile(values, [alpha, 1 - alpha], axis=0)
+    return {name: (float(low[i]), float(high[i])) for i, name in enumerate(STATISTICS)}
+
+
+def analyze(sequential, shuffled, resamples=1000, confidence=0.95, seed=0):
+    """
+    Pairs every Shuffled item with the Sequential item of the same `order_key` and measures order sensitivity.
+
+    Args:
+        sequential (dict): `load_items` columns of the Sequential results (with depths).
+        shuffled (dict): `load_items` columns of the Shuffled results.
+        resamples (int): Number of bootstrap resamples; 0 skips the intervals.
+        confidence (float): Confidence level of the intervals.
+        seed (int): Seed of the bootstrap.
+
+    Returns:
+        dict: Pair counts, accuracies and their gap, flip rates (correctness and extracted answer),
+            the McNemar test, bootstrap intervals, and per premise-count and DAG-depth buckets.
+    """
+    position = {}
+    for index, key in enumerate(sequential["keys"]):
+        position.setdefault(key, index)
+    matched = np.array([position.get(key, -1) for key in shuffled["keys"]], dtype=np.int64)
+    paired = matched >= 0
+    seq_index = matched[paired]
+    shuf_index = np.flatnonzero(paired)
+
+    answer_codes = {}
+    seq_answers = np.array([answer_codes.setdefault(answer, len(answer_codes)) for answer in sequential["answers"]], dtype=np.int64)
+    shuf_answers = np.array([answer_codes.setdefault(answer, len(answer_codes)) for answer in shuffled["answers"]], dtype=np.int64)
+
+    s = sequential["correct"][seq_index]
+    t = shuffled["correct"][shuf_index]
+    flips = s != t
+    answer_flips = seq_answers[seq_index] != shuf_answers[shuf_index]
+    pairs = len(seq_index)
+
+    report = {
+        "sequential_items": len(sequential["keys"]),
+        "shuffled_items": len(shuffled["keys"]),
+        "pairs": pairs,
+        "unmatched_shuffled": int((~paired).sum()),
+        "duplicate_sequential_keys": len(sequential["keys"]) - len(position),
+    }
+    if not pairs:
+        return report
+
+    report.update({
+        "sequential_accuracy": float(s.mean()),
+        "shuffled_accuracy": float(t.mean()),
+        "accuracy_gap": float(t.mean() - s.mean()),
+        "flip_rate": float(flips.mean()),
+        "answer_flip_rate": float(answer_flips.mean()),
+        "mcnemar": mcnemar(int((s & ~t).sum()), int((~s & t).sum())),
+    })
+
+    if resamples:
+        clusters, cluster_index = np.unique(seq_index, return_inverse=True)
+        sums = np.column_stack([
+            np.bincount(cluster_index, weights=values, minlength=len(clusters)) for values in (s, t, flips, answer_flips)
+        ])
+        report["confidence"] = confidence
+        report["intervals"] = bootstrap(sums, np.bincount(cluster_index, minlength=len(clusters)), resamples, confidence, seed)
+
+    for name, values, bounds in (("by_premises", sequential["premises"][seq_index], PREMISE_BOUNDS),
+                                 ("by_depth", sequential["depths"][seq_index], DEPTH_BOUNDS)):
+        labels = bucket_labels(bounds) + ["unknown"]
+        report[name] = _by_bucket(_buckets(values, bounds), len(labels), s, t, flips, labels)
+    return report
+
+
+def analyze_files(sequential_path, shuffled_path, **options):
+    """
+    Runs `analyze` on two scored items files; `options` are its bootstrap arguments.
+    """
+    report = analyze(load_items(sequential_path, depths=True), load_items(shuffled_path), **options)
+    return {"sequential": sequential_path, "shuffled": shuffled_path, **report}
+
+
+def sweep_jobs(results_dir, items_suffix):
+    """
+    Finds the (checkpoint, dataset, Sequential items, Shuffled items) of an `evaluate.py` results directory.
+    """
+    jobs = []
+    for checkpoint in sorted(os.listdir(results_dir)):
+        sequential_dir = os.path.join(results_dir, checkpoint, "Sequential")
+        shuffled_dir = os.path.join(results_dir, checkpoint, "Shuffled")
+        if not os.path.isdir(sequential_dir) or not os.path.isdir(shuffled_dir):
+            continue
+        for name in sorted(os.listdir(sequential_dir)):
+            if name.endswith(items_suffix) and os.path.exists(os.path.join(shuffled_dir, name)):
+                jobs.append((checkpoint, name[:-len(items_suffix)], os.path.join(sequential_dir, name), os.path.join(shuffled_dir, name)))
+    return jobs
+
+
+def format_reports(reports):
+    """
+    Formats reports as a compact table: accuracies, gap with its interval, flip rates and McNemar p-value,
+    followed by the flip rate per premise-count and DAG-depth bucket.
+    """
+    lines = ["name".ljust(28) + "pairs".rjust(7) + "seq".rjust(8) + "shuf".rjust(8) + "gap [CI]".rjust(24)
+             + "flip".rjust(8) + "ans.flip".rjust(9) + "McNemar p".rjust(11)]
+    for report in reports:
+        if not report["pairs"]:
+            lines.append(report["name"].ljust(28) + "0".rjust(7) + "  (no paired items)")
+            continue
+        interval = report.get("intervals", {}).get("accuracy_gap")
+        gap = f"{report['accuracy_gap']:+.2%}" + (f" [{interval[0]:+.1%}, {interval[1]:+.1%}]" if interval else "")
+        lines.append(
+            report["name"].ljust(28) + str(report["pairs"]).rjust(7) + f"{report['sequential_accuracy']:.2%}".rjust(8)
+            + f"{report['shuffled_accuracy']:.2%}".rjust(8) + gap.rjust(24) + f"{report['flip_rate']:.2%}".rjust(8)
+            + f"{report['answer_flip_rate']:.2%}".rjust(9) + f"{report['mcnemar']['p_value']:.3g}".rjust(11)
+        )
+        for name in ("by_premises", "by_depth"):
+            cells = ", ".join(f"{label}: {row['flip_rate']:.1%} ({row['pairs']})" for label, row in report[name].items())
+            lines.append("  " + ("premises" if name == "by_premises" else "depth").ljust(10) + "flip " + cells)
+    return "\n".join(lines)
+
+
+def parse_job(value):
+    """
+    Parses a `NAME:SEQUENTIAL_ITEMS:SHUFFLED_ITEMS` analysis job.
+    """
+    parts = value.split(':')
+    if len(parts) != 3:
+        raise argparse.ArgumentTypeError("Expected NAME:SEQUENTIAL_ITEMS:SHUFFLED_ITEMS")
+    return tuple(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the order sensitivity of scored Sequential and Shuffled results.")
+    parser.add_argument("jobs", type=parse_job, nargs='*', metavar="NAME:SEQUENTIAL_ITEMS:SHUFFLED_ITEMS", help="Pairs of scored items files")
+    parser.add_argument("--sweep", type=str, default=None, metavar="RESULTS_DIR",
+                        help="Analyze every checkpoint and dataset of an evaluate.py results directory")
+    parser.add_argument("--items-suffix", type=str, default="_acc.jsonl", help="Suffix of the scored items files of --sweep")
+    parser.add_argument("--bootstrap", type=int, default=1000, help="Bootstrap resamples (0 skips the intervals)")
+    parser.add_argument("--confidence", type=float, default=0.95, help="Confidence level of the intervals")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the bootstrap")
+    parser.add_argument("--report", type=str, default=None, help="Write the full reports to this JSON file")
+    args = parser.parse_args()
+
+    jobs = list(args.jobs)
+    if args.sweep:
+        jobs.extend((f"{checkpoint}/{dataset}", sequential, shuffled)
+                    for checkpoint, dataset, sequential, shuffled in sweep_jobs(args.sweep, args.items_suffix))
+    if not jobs:
+        parser.error("no jobs: pass NAME:SEQUENTIAL_ITEMS:SHUFFLED_ITEMS pairs or --sweep")
+
+    reports = [{"name": name, **analyze_files(sequential, shuffled, resamples=args.bootstrap, confidence=args.confidence, seed=args.seed)}
+               for name, sequential, shuffled in jobs]
+    print(format_reports(reports))
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as file:
+            json.dump(reports, file, ensure_ascii=False, indent=2)
+        print(f"Report saved to: {args.report}")
+
+
+if __name__ == "__main__":
+    main()
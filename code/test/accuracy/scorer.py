@@ -0,0 +1,203 @@
+import argparse
+import os
+import re
+import sys
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from record_index import zip_records
+from record_io import RecordWriter, record_id
+
+# Label emitted for outputs in which no label could be found.
+NO_ANSWER = "none"
+
+
+class LabelSpec:
+    """
+    Describes the answer labels of a dataset and extracts the last one mentioned in a model output.
+
+    The search runs backwards from the end of the output: the labels are matched in reverse on
+    growing windows of the reversed tail, so only the end of the text is scanned in the usual case
+    where the answer comes last.
+    """
+
+    def __init__(self, name, labels, aliases=None, word_boundary=False, initial_window=256):
+        """
+        Args:
+            name (str): Name of the dataset.
+            labels (tuple): The label strings that can appear in an output (case-insensitive).
+            aliases (dict, optional): Maps a matched label to its canonical form.
+            word_boundary (bool): Only match labels delimited by word boundaries.
+            initial_window (int): Number of trailing characters searched first.
+        """
+        self.name = name
+        self.labels = labels
+        self.aliases = aliases or {}
+        self.classes = sorted({self.aliases.get(label, label) for label in labels})
+        self.initial_window = initial_window
+        self.max_length = max(len(label) for label in labels)
+        # Longest labels first, so that e.g. "self_contradiction" wins over "contradiction".
+        alternatives = "|".join(re.escape(label[::-1]) for label in sorted(labels, key=len, reverse=True))
+        boundary = r"\b" if word_boundary else ""
+        self.reversed_pattern = re.compile(f"{boundary}({alternatives}){boundary}", re.IGNORECASE)
+
+    def extract(self, model_output):
+        """
+        Returns the canonical form of the last label in `model_output`, or None if there is none.
+        """
+        length = len(model_output)
+        window = self.initial_window
+        while True:
+            start = max(0, length - window)
+            tail = model_output[start:][::-1]
+            match = self.reversed_pattern.search(tail)
+            # A match too close to the cut may be the end of a longer label starting before it.
+            if match and (start == 0 or match.end() < len(tail) - self.max_length):
+                label = match.group(1)[::-1].lower()
+                return self.aliases.get(label, label)
+            if start == 0:
+                return None
+            window *= 4
+
+
+LABEL_SPECS = {
+    "folio": LabelSpec(
+        "folio",
+        ("true", "false", "uncertain", "unknown"),
+        aliases={"uncertain": "unknown"},
+    ),
+    "logicnli": LabelSpec(
+        "logicnli",
+        ("entailment", "neutral", "self_contradiction", "self-contradiction", "contradiction"),
+        aliases={"self-contradiction": "self_contradiction"},
+    ),
+    "ruletaker": LabelSpec(
+        "ruletaker",
+        ("entailment", "not entailment"),
+        word_boundary=True,
+    ),
+}
+
+
+def iter_aligned(result_file_path, test_file_path):
+    """
+    Yields (result, test item) pairs, checking that both files describe the same records.
+
+    Raises:
+        ValueError: If the files have different lengths, or a result's `id` does not match its test item.
+    """
+    for index, (result, item) in enumerate(zip_records(result_file_path, test_file_path)):
+        if 'id' in result and result['id'] != record_id(item):
+            raise ValueError(f"Result {index} does not belong to test item {index}: the files are not aligned.")
+        yield result, item
+
+
+def score_item(spec, confusion, item, model_output):
+    """
+    Scores one model output against its test item: adds it to the (gold, predicted) `confusion`
+    counter and returns the item with `model_output`, `extracted_answer` and `correct`.
+    """
+    gold = item.get('output', '').lower()
+    extracted_answer = spec.extract(model_output)
+    confusion[gold, extracted_answer or NO_ANSWER] += 1
+    item['model_output'] = model_output
+    item['extracted_answer'] = extracted_answer
+    item['correct'] = bool(extracted_answer) and extracted_answer == gold
+    return item
+
+
+def score_file(spec, result_file_path, test_file_path, items_file_path=None):
+    """
+    Scores one results file against its test set.
+
+    Args:
+        spec (LabelSpec): The label specification of the dataset.
+        result_file_path (str): Path to the model outputs.
+        test_file_path (str): Path to the test set with gold `output` labels.
+        items_file_path (str, optional): Path to write the test items with `model_output`,
+            `extracted_answer` and `correct`.
+
+    Returns:
+        dict: Accuracy, confusion matrix (gold -> predicted -> count) and per-label precision, recall and F1.
+    """
+    confusion = Counter()
+    writer = RecordWriter(items_file_path) if items_file_path else None
+
+    try:
+        for result, item in iter_aligned(result_file_path, test_file_path):
+            item = score_item(spec, confusion, item, result.get('model_output', ''))
+            if writer is not None:
+                writer.write(item)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return summarize(spec, confusion, result_file_path, test_file_path)
+
+
+def summarize(spec, confusion, result_file_path=None, test_file_path=None):
+    """
+    Builds the summary of a confusion counter keyed by (gold, predicted).
+    """
+    total = sum(confusion.values())
+    correct = sum(count for (gold, predicted), count in confusion.items() if gold == predicted)
+
+    matrix = {}
+    for (gold, predicted), count in sorted(confusion.items()):
+        matrix.setdefault(gold, {})[predicted] = count
+
+    per_label = {}
+    for label in sorted(set(spec.classes) | set(matrix)):
+        true_positives = confusion[label, label]
+        predicted = sum(count for (_, p), count in confusion.items() if p == label)
+        support = sum(matrix.get(label, {}).values())
+        precision = true_positives / predicted if predicted else 0.0
+        recall = true_positives / support if support else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        per_label[label] = {"precision": precision, "recall": recall, "f1": f1, "support": support}
+
+    return {
+        "dataset": spec.name,
+        "results": result_file_path,
+        "test": test_file_path,
+        "accuracy": correct / total if total else 0,
+        "total": total,
+        "correct": correct,
+        "unanswered": sum(count for (_, predicted), count in confusion.items() if predicted == NO_ANSWER),
+        "confusion": matrix,
+        "per_label": per_label,
+    }
+
+
+def parse_job(value):
+    """
+    Parses a `DATASET:RESULTS:TEST` scoring job.
+    """
+    parts = value.split(':')
+    if len(parts) != 3 or parts[0] not in LABEL_SPECS:
+        raise argparse.ArgumentTypeError(f"Expected DATASET:RESULTS:TEST with DATASET in: {', '.join(sorted(LABEL_SPECS))}")
+    return tuple(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score any number of results files against their test sets.")
+    parser.add_argument("jobs", type=parse_job, nargs='+', metavar="DATASET:RESULTS:TEST", help="Scoring jobs")
+    parser.add_argument("--summary", type=str, required=True, help="Path to the summary file (one line per job)")
+    parser.add_argument("--items-suffix", type=str, default=None,
+                        help="Also write scored items next to each results file, e.g. '_acc.jsonl'")
+    args = parser.parse_args()
+
+    with RecordWriter(args.summary) as writer:
+        for dataset, result_file_path, test_file_path in args.jobs:
+            items_file_path = None
+            if args.items_suffix:
+                items_file_path = os.path.splitext(result_file_path)[0] + args.items_suffix
+            summary = score_file(LABEL_SPECS[dataset], result_file_path, test_file_path, items_file_path)
+            writer.write(summary)
+            print(f"{dataset} {result_file_path}: {summary['total']} items, accuracy {summary['accuracy']:.2%}")
+
+    print(f"Summary saved to: {args.summary}")
+
+
+if __name__ == "__main__":
+    main()
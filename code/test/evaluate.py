@@ -0,0 +1,306 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(TEST_DIR, 'accuracy'))
+sys.path.insert(0, TEST_DIR)
+
+from inference import BACKENDS, DATASETS, ORDERINGS, OVERFLOW_POLICIES, PromptCache, create_backend, run_paths, stream_inference
+from record_io import RecordWriter, iter_records, record_id
+from scorer import LABEL_SPECS, score_item, summarize
+
+
+class EvalJob:
+    """
+    One test set of a sweep: writes its results in order and scores them as they arrive.
+
+    Args:
+        dataset (str): Dataset name, a key of `scorer.LABEL_SPECS`.
+        ordering (str): Premise ordering of the test set.
+        test_file (str): Path to the test set with gold `output` labels.
+        output_file (str): Path to the results file.
+        items_file (str, optional): Path to write the scored test items.
+    """
+
+    def __init__(self, dataset, ordering, test_file, output_file, items_file=None):
+        self.dataset = dataset
+        self.ordering = ordering
+        self.spec = LABEL_SPECS[dataset]
+        self.test_file = test_file
+        self.output_file = output_file
+        self.items_file = items_file
+        self.pending = deque()
+        self.confusion = Counter()
+        self.writer = None
+        self.items = None
+
+    def open(self):
+        os.makedirs(os.path.dirname(self.output_file) or '.', exist_ok=True)
+        self.writer = RecordWriter(self.output_file)
+        self.items = RecordWriter(self.items_file) if self.items_file else None
+
+    def records(self):
+        """Yields the test items, keeping them until their result is written."""
+        for item in iter_records(self.test_file):
+            self.pending.append(item)
+            yield item
+
+    def write(self, result):
+        item = self.pending.popleft()
+        if result['id'] != record_id(item):
+            raise ValueError(f"Result {self.writer.count} of {self.output_file} does not belong to its test item.")
+        self.writer.write(result)
+        item = score_item(self.spec, self.confusion, item, result['model_output'])
+        if self.items is not None:
+            self.items.write(item)
+
+    def flush(self):
+        self.writer.flush()
+
+    def close(self):
+        self.writer.close()
+        if self.items is not None:
+            self.items.close()
+
+    def summary(self):
+        return {"ordering": self.ordering, **summarize(self.spec, self.confusion, self.output_file, self.test_file)}
+
+
+class Router:
+    """
+    Interleaves the test items of several jobs into one stream and routes the results back.
+
+    Items are taken round-robin from the jobs, so all test sets advance together and the stream
+    mixes their prompt lengths. `stream_inference` passes the results in stream order, which
+    `write` maps back to the job of each item.
+    """
+
+    def __init__(self, jobs):
+        self.jobs = jobs
+        self.order = deque()
+        self.dirty = set()
+
+    def records(self):
+        streams = deque((job, job.records()) for job in self.jobs)
+        while streams:
+            job, stream = streams.popleft()
+            item = next(stream, None)
+            if item is None:
+                continue
+            self.order.append(job)
+            streams.append((job, stream))
+            yield item
+
+    def write(self, result):
+        job = self.order.popleft()
+        job.write(result)
+        self.dirty.add(job)
+
+    def flush(self):
+        for job in self.dirty:
+            job.flush()
+        self.dirty.clear()
+
+
+def parse_checkpoint(value):
+    """
+    Parses a `[NAME=]PATH` model checkpoint; the name defaults to the last component of the path,
+    so checkpoints with the same last component need explicit names.
+    """
+    name, sep, path = value.partition('=')
+    if not sep:
+        path = value
+        name = os.path.basename(os.path.normpath(value))
+    return name, path
+
+
+def duplicate_names(checkpoints):
+    """
+    Returns the names shared by several (name, path) checkpoints.
+    """
+    return sorted(name for name, count in Counter(name for name, _ in checkpoints).items() if count > 1)
+
+
+def plan_jobs(checkpoint, datasets, orderings, data_dir, results_dir, items_suffix=None):
+    """
+    Returns the jobs of one checkpoint: every dataset in every ordering, with results under `results_dir/NAME`.
+    """
+    jobs = []
+    for ordering in orderings:
+        for dataset in datasets:
+            paths = run_paths(dataset, ordering, data_dir, os.path.join(results_dir, checkpoint))
+            if not os.path.exists(paths["input"]):
+                raise FileNotFoundError(f"Missing test set: {paths['input']}")
+            items_file = os.path.splitext(paths["output"])[0] + items_suffix if items_suffix else None
+            jobs.append(EvalJob(dataset, ordering, paths["input"], paths["output"], items_file))
+    return jobs
+
+
+def evaluate_checkpoint(checkpoint, model, datasets, orderings, data_dir='data/test', results_dir='results', backend='vllm',
+                        response=None, devices=None, cache_file=None, resume=True, items_suffix=None, concurrency=256, **render_options):
+    """
+    Evaluates one model checkpoint on every test set of the matrix with a single model load.
+
+    The prompts of all test sets go through one generation stream (see `Router`); results are
+    written to `results_dir/NAME/<ordering>/<dataset>.json` and scored inline. With `resume`, a
+    checkpoint log `results_dir/NAME/checkpoint.jsonl` lets a restarted sweep skip finished prompts.
+
+    Args:
+        checkpoint (str): Name of the checkpoint in the results.
+        model (str): Model path of the vllm backend.
+        datasets (list): Datasets of the matrix.
+        orderings (list): Premise orderings of the matrix.
+        data_dir (str): Directory of the test sets.
+        results_dir (str): Directory of the results.
+        backend (str): Generation backend, a key of `BACKENDS`.
+        response (str, optional): Fixed response of the echo backend.
+        devices (str, optional): `CUDA_VISIBLE_DEVICES` of the vllm backend.
+        cache_file (str, optional): Path to a `PromptCache` shared by the checkpoints.
+        resume (bool): Keep a checkpoint log of finished results.
+        items_suffix (str, optional): Also write scored items next to each results file.
+        concurrency (int): Maximum number of requests in flight.
+        render_options: Length-check and render-pool arguments of `stream_inference`.
+
+    Returns:
+        list: The `scorer.summarize` summary of every test set, with the checkpoint and ordering.
+    """
+    jobs = plan_jobs(checkpoint, datasets, orderings, data_dir, results_dir, items_suffix)
+    checkpoint_file = os.path.join(results_dir, checkpoint, "checkpoint.jsonl") if resume else None
+    model_backend = create_backend(backend, model, response, devices)
+    cache = PromptCache(cache_file) if cache_file else None
+    try:
+        for job in jobs:
+            job.open()
+        router = Router(jobs)
+        count = asyncio.run(stream_inference(router.records(), model_backend, router, concurrency, checkpoint_file=checkpoint_file,
+                                             cache=cache, **render_options))
+    finally:
+        for job in jobs:
+            if job.writer is not None:
+                job.close()
+        model_backend.close()
+        if cache is not None:
+            cache.close()
+    print(f"{checkpoint}: {count} results over {len(jobs)} test sets in one stream.")
+    return [{"checkpoint": checkpoint, **job.summary()} for job in jobs]
+
+
+def run_sweep(checkpoints, isolate=None, **options):
+    """
+    Evaluates every checkpoint with `evaluate_checkpoint`, one after the other.
+
+    With several checkpoints, each is evaluated in a fresh process (`isolate`), so the memory of a
+    model, GPU memory included, is released before the next one is loaded.
+
+    Checkpoint names must be unique: their results, checkpoint logs and summary rows are keyed by name.
+
+    Returns:
+        list: The summaries of all checkpoints.
+    """
+    duplicates = duplicate_names(checkpoints)
+    if duplicates:
+        raise ValueError(f"Duplicate checkpoint names: {', '.join(duplicates)}; name them with NAME=PATH.")
+    isolate = len(checkpoints) > 1 if isolate is None else isolate
+    summaries = []
+    for name, model in checkpoints:
+        if isolate:
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+                summaries.extend(executor.submit(evaluate_checkpoint, name, model, **options).result())
+        else:
+            summaries.extend(evaluate_checkpoint(name, model, **options))
+    return summaries
+
+
+def format_summaries(summaries):
+    """
+    Formats the accuracies of a sweep as one row per checkpoint and dataset, one column per ordering.
+    """
+    orderings = list(dict.fromkeys(summary["ordering"] for summary in summaries))
+    rows = {}
+    for summary in summaries:
+        rows.setdefault((summary["checkpoint"], summary["dataset"]), {})[summary["ordering"]] = summary
+    lines = ["checkpoint".ljust(24) + "dataset".ljust(12) + "".join(ordering.rjust(12) for ordering in orderings)]
+    for (checkpoint, dataset), cells in rows.items():
+        lines.append(checkpoint.ljust(24) + dataset.ljust(12) + "".join(
+            (f"{cells[ordering]['accuracy']:.2%}" if ordering in cells else "-").rjust(12) for ordering in orderings
+        ))
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate model checkpoints on a matrix of datasets and orderings, one model load each.")
+    parser.add_argument("--checkpoints", type=parse_checkpoint, nargs='+', required=True, metavar="[NAME=]PATH",
+                        help="Model checkpoints; results go to RESULTS_DIR/NAME")
+    parser.add_argument("--datasets", choices=DATASETS, nargs='+', default=list(DATASETS), help="Datasets")
+    parser.add_argument("--orderings", choices=ORDERINGS, nargs='+', default=list(ORDERINGS), help="Premise orderings")
+    parser.add_argument("--data-dir", type=str, default="data/test", help="Directory of the test sets")
+    parser.add_argument("--results-dir", type=str, default="results", help="Directory of the results")
+    parser.add_argument("--summary", type=str, default=None, help="Summary file, one line per test set (default: RESULTS_DIR/summary.jsonl)")
+    parser.add_argument("--items-suffix", type=str, default=None, help="Also write scored items next to each results file, e.g. '_acc.jsonl'")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="vllm", help="Generation backend")
+    parser.add_argument("--devices", type=str, default=None, help="CUDA_VISIBLE_DEVICES of the vllm backend (default: the environment's, else 0)")
+    parser.add_argument("--response", type=str, default=None, help="Fixed response of the echo backend (default: echo the prompt)")
+    parser.add_argument("--concurrency", type=int, default=256, help="Maximum number of requests in flight")
+    parser.add_argument("--no-checkpoint", action="store_true", help="Do not keep checkpoint logs of finished results")
+    parser.add_argument("--cache", type=str, default=None, help="SQLite prompt cache keyed by model, sampling parameters and prompt")
+    parser.add_argument("--max-prompt-tokens", type=int, default=None, help="Token limit of the rendered prompts")
+    parser.add_argument("--overflow", choices=OVERFLOW_POLICIES, default="reject", help="What happens to longer prompts")
+    parser.add_argument("--render-workers", type=int, default=1, help="Number of threads (or processes) rendering chat templates")
+    parser.add_argument("--render-processes", action="store_true", help="Render chat templates in processes instead of threads")
+    parser.add_argument("--order-sensitivity", type=str, default=None, metavar="REPORT",
+                        help="Compare the Sequential and Shuffled items of each checkpoint and write the report here (needs --items-suffix)")
+    args = parser.parse_args()
+    duplicates = duplicate_names(args.checkpoints)
+    if duplicates:
+        parser.error(f"duplicate checkpoint names: {', '.join(duplicates)}; name them with NAME=PATH")
+    if args.order_sensitivity and not args.items_suffix:
+        parser.error("--order-sensitivity needs the scored items of --items-suffix")
+
+    summaries = run_sweep(
+        args.checkpoints,
+        datasets=args.datasets,
+        orderings=args.orderings,
+        data_dir=args.data_dir,
+        results_dir=args.results_dir,
+        backend=args.backend,
+        response=args.response,
+        devices=args.devices,
+        cache_file=args.cache,
+        resume=not args.no_checkpoint,
+        items_suffix=args.items_suffix,
+        concurrency=args.concurrency,
+        max_prompt_tokens=args.max_prompt_tokens,
+        overflow=args.overflow,
+        render_workers=args.render_workers,
+        render_processes=args.render_processes,
+    )
+
+    print(format_summaries(summaries))
+    summary_file = args.summary or os.path.join(args.results_dir, "summary.jsonl")
+    os.makedirs(os.path.dirname(summary_file) or '.', exist_ok=True)
+    with RecordWriter(summary_file) as writer:
+        for summary in summaries:
+            writer.write(summary)
+    print(f"Summary saved to: {summary_file}")
+
+    if args.order_sensitivity:
+        # Imported here so that plain evaluation runs without numpy.
+        from order_sensitivity import analyze_files, format_reports, sweep_jobs
+
+        names = {name for name, _ in args.checkpoints}
+        reports = [{"name": f"{checkpoint}/{dataset}", **analyze_files(sequential, shuffled)}
+                   for checkpoint, dataset, sequential, shuffled in sweep_jobs(args.results_dir, args.items_suffix) if checkpoint in names]
+        print(format_reports(reports))
+        with open(args.order_sensitivity, 'w', encoding='utf-8') as file:
+            json.dump(reports, file, ensure_ascii=False, indent=2)
+        print(f"Order sensitivity report saved to: {args.order_sensitivity}")
+
+
+if __name__ == "__main__":
+    main()
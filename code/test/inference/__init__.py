@@ -0,0 +1,17 @@
+"""
+Inference tools for the Sequential and Shuffled test sets.
+
+With `code/test` on `sys.path`, `import inference` exposes the driver without loading any model:
+backends import vLLM or `transformers` only when they are created. The modules of this directory
+import each other by plain name, like the scripts of the other directories, so the directory is
+added to `sys.path` as well.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from driver import (BACKENDS, DATASETS, ORDERINGS, OVERFLOW_POLICIES, Backend, ChatTemplate, EchoBackend, VLLMBackend, build_messages,
+                    create_backend, dry_run, fit_prompt, generate_messages, identity_digest, load_checkpoint, main, process_question,
+                    render_chunk, render_pool, run_inference, run_inference_async, run_paths, stream_inference)
+from prompt_cache import PromptCache
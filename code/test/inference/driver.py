@@ -0,0 +1,615 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from record_io import RecordWriter, iter_records, open_text, record_id
+
+from prompt_cache import PromptCache
+
+# Test sets under `data_dir/<ordering>/<dataset>.json`.
+DATASETS = ("folio", "logicnli", "ruletaker")
+ORDERINGS = ("Sequential", "Shuffled")
+
+# What happens to prompts longer than `max_prompt_tokens`.
+OVERFLOW_POLICIES = ("reject", "truncate")
+
+
+def process_question(item):
+    question = item['instruction']
+    return question
+
+
+def build_messages(item):
+    return [
+        {"role": "user", "content": process_question(item)}
+    ]
+
+
+def generate_messages(data, batch_size):
+    all_batches = []
+
+    num_batches = (len(data) + batch_size - 1) // batch_size
+
+    for i in range(num_batches):
+        start_index = i * batch_size
+        end_index = min(start_index + batch_size, len(data))
+        all_batches.append([build_messages(item) for item in data[start_index:end_index]])
+
+    return all_batches, num_batches
+
+
+class Backend:
+    """
+    Interface of the generation backends used by `run_inference`.
+
+    `render` turns chat messages into a prompt string and runs in a render pool, so it can
+    overlap with generation; `count_tokens` measures a rendered prompt and `truncate` shortens a
+    text to a number of tokens. `renderer` returns the object providing these three methods; it is
+    sent to the render processes, so it must be picklable. `generate` is a coroutine; many requests
+    are in flight at once and the backend is free to batch them continuously. `identity` describes everything besides the
+    prompt that determines a generation; it is part of the prompt-cache key.
+    """
+
+    name = None
+
+    def identity(self):
+        return {"backend": self.name}
+
+    def render(self, messages):
+        raise NotImplementedError
+
+    def count_tokens(self, prompt):
+        raise NotImplementedError
+
+    def truncate(self, text, max_tokens):
+        raise NotImplementedError
+
+    def renderer(self):
+        return self
+
+    async def generate(self, prompt, request_id):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class EchoBackend(Backend):
+    """
+    Offline backend for tests and dry runs: returns a fixed response, or the prompt itself.
+    """
+
+    name = "echo"
+
+    def __init__(self, response=None, delay=0.0):
+        self.response = response
+        self.delay = delay
+
+    def identity(self):
+        return {"backend": self.name, "response": self.response}
+
+    def render(self, messages):
+        return "\n".join(f"{message['role']}: {message['content']}" for message in messages) + "\nassistant:"
+
+    def count_tokens(self, prompt):
+        return len(prompt.split())
+
+    def truncate(self, text, max_tokens):
+        words = text.split()
+        return " ".join(_middle_cut(words, max_tokens))
+
+    async def generate(self, prompt, request_id):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return prompt if self.response is None else self.response
+
+
+class ChatTemplate:
+    """
+    Renders chat messages with the chat template of a model and counts their tokens.
+
+    Only the tokenizer is loaded (`transformers` is imported on creation), not the inference engine,
+    so prompts can be inspected without a GPU. A pickled template only carries the model path, and
+    render processes load the tokenizer themselves.
+    """
+
+    def __init__(self, model_path):
+        from transformers import AutoTokenizer
+
+        self.model_path = model_path
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path)
+
+    def __reduce__(self):
+        return ChatTemplate, (self.model_path,)
+
+    def render(self, messages):
+        return self.tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+
+    def count_tokens(self, prompt):
+        return len(self.tokenizer.encode(prompt, add_special_tokens=False))
+
+    def truncate(self, text, max_tokens):
+        ids = self.tokenizer.encode(text, add_special_tokens=False)
+        return self.tokenizer.decode(_middle_cut(ids, max_tokens))
+
+
+class VLLMBackend(Backend):
+    """
+    vLLM backend built on `AsyncLLMEngine`, which batches the in-flight requests continuously.
+    """
+
+    name = "vllm"
+
+    def __init__(self, model_path, dtype='bfloat16', gpu_memory_utilization=0.8, temperature=0, max_tokens=2048, stop="<|eot_id|>"):
+        from vllm import AsyncEngineArgs, AsyncLLMEngine, SamplingParams
+
+        self.model_path = model_path
+        self.engine = AsyncLLMEngine.from_engine_args(
+            AsyncEngineArgs(model=model_path, dtype=dtype, gpu_memory_utilization=gpu_memory_utilization)
+        )
+        self.template = ChatTemplate(model_path)
+        self.sampling_params = SamplingParams(temperature=temperature, max_tokens=max_tokens, stop=stop)
+
+    def identity(self):
+        return {"backend": self.name, "model": self.model_path, "sampling_params": repr(self.sampling_params)}
+
+    def render(self, messages):
+        return self.template.render(messages)
+
+    def count_tokens(self, prompt):
+        return self.template.count_tokens(prompt)
+
+    def truncate(self, text, max_tokens):
+        return self.template.truncate(text, max_tokens)
+
+    def renderer(self):
+        return self.template
+
+    async def generate(self, prompt, request_id):
+        final_output = None
+        async for output in self.engine.generate(prompt, self.sampling_params, request_id):
+            final_output = output
+        return final_output.outputs[0].text
+
+
+BACKENDS = {
+    EchoBackend.name: EchoBackend,
+    VLLMBackend.name: VLLMBackend,
+}
+
+
+def create_backend(name, model=None, response=None, devices=None):
+    """
+    Creates a backend of `BACKENDS`: the echo backend with its fixed `response`, or the vllm backend
+    of `model` on `devices` (`CUDA_VISIBLE_DEVICES`; default: the environment's, else 0).
+    """
+    if name == EchoBackend.name:
+        return EchoBackend(response=response)
+    if devices is not None:
+        os.environ["CUDA_VISIBLE_DEVICES"] = devices
+    else:
+        os.environ.setdefault("CUDA_VISIBLE_DEVICES", "0")
+    return BACKENDS[name](model)
+
+
+def _middle_cut(tokens, max_tokens):
+    """Keeps the first and last tokens of a sequence, dropping its middle down to `max_tokens`."""
+    if len(tokens) <= max_tokens:
+        return tokens
+    head = max_tokens // 2
+    return tokens[:head] + tokens[len(tokens) - (max_tokens - head):]
+
+
+def fit_prompt(renderer, messages, max_prompt_tokens=None, overflow="reject"):
+    """
+    Renders chat messages and checks the length of the prompt.
+
+    A prompt longer than `max_prompt_tokens` is rejected, or with `overflow="truncate"` the middle
+    of the last message is cut until the rendered prompt fits; the beginning of the message (the
+    task) and its end (the question) are kept.
+
+    Args:
+        renderer: Object with `render`, `count_tokens` and `truncate` (see `Backend.renderer`).
+        messages (list): The chat messages.
+        max_prompt_tokens (int, optional): Token limit of the prompt; None skips the check.
+        overflow (str): One of `OVERFLOW_POLICIES`.
+
+    Returns:
+        tuple: (prompt, status), where status is None for a prompt within the limit, "truncated",
+            or the reason of the rejection, in which case the prompt is None.
+    """
+    prompt = renderer.render(messages)
+    if max_prompt_tokens is None:
+        return prompt, None
+    tokens = renderer.count_tokens(prompt)
+    if tokens <= max_prompt_tokens:
+        return prompt, None
+    rejection = f"prompt of {tokens} tokens exceeds {max_prompt_tokens}"
+    if overflow != "truncate":
+        return None, rejection
+
+    content = messages[-1]['content']
+    budget = renderer.count_tokens(content) - (tokens - max_prompt_tokens)
+    # Tokens may merge differently around the cut, so the rendered length is checked again.
+    for _ in range(3):
+        if budget <= 0:
+            break
+        shortened = [*messages[:-1], {**messages[-1], 'content': renderer.truncate(content, budget)}]
+        prompt = renderer.render(shortened)
+        tokens = renderer.count_tokens(prompt)
+        if tokens <= max_prompt_tokens:
+            return prompt, "truncated"
+        budget -= tokens - max_prompt_tokens
+    return None, rejection
+
+
+def render_chunk(renderer, chunk, max_prompt_tokens=None, overflow="reject"):
+    """
+    Renders a chunk of `(index, item_id, messages)` into `(index, item_id, prompt, status)` (see `fit_prompt`).
+    """
+    return [(index, item_id, *fit_prompt(renderer, messages, max_prompt_tokens, overflow)) for index, item_id, messages in chunk]
+
+
+# Renderer of a render process, set by the pool initializer.
+_PROCESS_RENDERER = None
+
+
+def _init_render_process(renderer):
+    global _PROCESS_RENDERER
+    _PROCESS_RENDERER = renderer
+
+
+def _render_in_process(chunk, max_prompt_tokens, overflow):
+    return render_chunk(_PROCESS_RENDERER, chunk, max_prompt_tokens, overflow)
+
+
+def render_pool(renderer, workers=1, processes=False):
+    """
+    Returns an executor and a function submitting `render_chunk` calls to it.
+
+    Threads share `renderer`. Chat templates are rendered in Python, though, so several threads
+    mostly help tokenizers that release the GIL; with `processes`, every process receives a pickled
+    copy of the renderer once and templates render in parallel.
+    """
+    if processes:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_render_process, initargs=(renderer,))
+        return executor, lambda chunk, *limits: executor.submit(_render_in_process, chunk, *limits)
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="render")
+    return executor, lambda chunk, *limits: executor.submit(render_chunk, renderer, chunk, *limits)
+
+
+def identity_digest(identity):
+    """
+    Returns a short hash of a backend identity, stored with every checkpointed result.
+    """
+    payload = json.dumps(identity, ensure_ascii=False, sort_keys=True, default=repr)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def load_checkpoint(checkpoint_file, backend=None):
+    """
+    Reads the finished results of a previous run from a checkpoint log.
+
+    A partially written last line, left by a crash, is ignored. With `backend`, results generated
+    by another backend identity (another model, sampling parameters or echo response), or by a run
+    that did not record one, are ignored as well, so they are generated again.
+
+    Args:
+        checkpoint_file (str): Path to the JSONL checkpoint log.
+        backend (str, optional): The `identity_digest` of the current backend.
+
+    Returns:
+        dict: Maps record IDs to their model output.
+    """
+    done = {}
+    if not os.path.exists(checkpoint_file):
+        return done
+    foreign = 0
+    with open_text(checkpoint_file, 'r') as file:
+        for line in file:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if backend is not None and entry.get('backend') != backend:
+                foreign += 1
+                continue
+            done[entry['id']] = entry['model_output']
+    if foreign:
+        print(f"Ignoring {foreign} results of {checkpoint_file} generated by another backend.")
+    # Terminate a truncated last line so that new results start on a line of their own.
+    if not checkpoint_file.endswith(('.gz', '.zst')):
+        with open(checkpoint_file, 'rb+') as file:
+            if file.seek(0, os.SEEK_END):
+                file.seek(-1, os.SEEK_END)
+                if file.read(1) != b'\n':
+                    file.write(b'\n')
+    return done
+
+
+async def stream_inference(records, backend, sink, concurrency=256, render_chunk_size=32, checkpoint_file=None, cache=None,
+                           max_prompt_tokens=None, overflow="reject", render_workers=1, render_processes=False, render_prefetch=8):
+    """
+    Streams records through the backend and passes `{'id': ..., 'model_output': ...}` results to `sink` in input order.
+
+    Chat templates are rendered by a pool of `render_workers` threads (or processes), up to
+    `render_prefetch` chunks ahead of the generation, and the rendered prompts fill a bounded
+    queue while up to `concurrency` requests are being generated, so neither rendering nor batch
+    boundaries leave the engine waiting. Results are written as soon as every earlier record has
+    finished, and the sink is flushed after every generated result.
+
+    With `max_prompt_tokens`, prompts are length-checked while they are rendered (see
+    `fit_prompt`). Rejected prompts are not generated: their result has an empty `model_output`
+    and a `rejected` reason, so results stay aligned with the test set, and they are neither
+    checkpointed nor cached.
+
+    With a checkpoint file, every finished result is appended to it with the record ID (a content
+    hash of the instruction, see `record_io.record_id`) and the digest of the backend identity as
+    soon as it is generated, and records already present in it with the same identity are not
+    generated again when the run is restarted.
+
+    With a prompt cache, prompts already generated with the same backend identity (model and
+    sampling parameters) are answered from the cache without calling the backend.
+
+    Args:
+        records (iterable): The test records containing `instruction`.
+        backend (Backend): The generation backend.
+        sink: Object with `write(result)` and `flush()`, e.g. a `RecordWriter`.
+        concurrency (int): Maximum number of requests in flight.
+        render_chunk_size (int): Number of prompts rendered per worker-thread call.
+        checkpoint_file (str, optional): Path to the JSONL checkpoint log.
+        cache (PromptCache, optional): Persistent prompt-level result cache.
+        max_prompt_tokens (int, optional): Token limit of the rendered prompts.
+        overflow (str): What happens to longer prompts, one of `OVERFLOW_POLICIES`.
+        render_workers (int): Number of render threads or processes.
+        render_processes (bool): Render in processes instead of threads.
+        render_prefetch (int): Number of chunks rendered ahead of the generation.
+
+    Returns:
+        int: The number of written results.
+    """
+    queue = asyncio.Queue(maxsize=concurrency)
+    finished = {}
+    written = 0
+    overflows = {"truncated": 0, "rejected": 0}
+    identity = backend.identity()
+    digest = identity_digest(identity)
+    done = load_checkpoint(checkpoint_file, digest) if checkpoint_file else {}
+    if done:
+        print(f"Resuming from {checkpoint_file}: {len(done)} results already generated.")
+
+    def emit(index, item_id, model_output, **extra):
+        nonlocal written
+        finished[index] = {'id': item_id, 'model_output': model_output, **extra}
+        while written in finished:
+            sink.write(finished.pop(written))
+            written += 1
+
+    async def produce():
+        pending = deque()
+        chunk = []
+        for index, item in enumerate(records):
+            item_id = record_id(item)
+            if item_id in done:
+                emit(index, item_id, done[item_id])
+                continue
+            chunk.append((index, item_id, build_messages(item)))
+            if len(chunk) == render_chunk_size:
+                pending.append(asyncio.wrap_future(submit(chunk, max_prompt_tokens, overflow)))
+                chunk = []
+                if len(pending) >= render_prefetch:
+                    await enqueue(pending.popleft())
+        if chunk:
+            pending.append(asyncio.wrap_future(submit(chunk, max_prompt_tokens, overflow)))
+        while pending:
+            await enqueue(pending.popleft())
+        for _ in range(concurrency):
+            await queue.put(None)
+
+    async def enqueue(rendered):
+        for index, item_id, prompt, status in await rendered:
+            if prompt is None:
+                overflows["rejected"] += 1
+                emit(index, item_id, '', rejected=status)
+                continue
+            if status == "truncated":
+                overflows["truncated"] += 1
+            await queue.put((index, item_id, prompt))
+
+    async def consume():
+        while True:
+            task = await queue.get()
+            if task is None:
+                return
+            index, item_id, prompt = task
+            cache_key = PromptCache.key(identity, prompt) if cache is not None else None
+            model_output = cache.get(cache_key) if cache is not None else None
+            if model_output is None:
+                model_output = await backend.generate(prompt, str(index))
+                if cache is not None:
+                    cache.put(cache_key, model_output)
+            if checkpoint is not None:
+                checkpoint.write({'id': item_id, 'backend': digest, 'model_output': model_output})
+                checkpoint.flush()
+            emit(index, item_id, model_output)
+            sink.flush()
+
+    executor, submit = render_pool(backend.renderer(), render_workers, render_processes)
+    checkpoint = RecordWriter(checkpoint_file, fmt="jsonl", mode='a') if checkpoint_file else None
+    try:
+        await asyncio.gather(produce(), *(consume() for _ in range(concurrency)))
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        if checkpoint is not None:
+            checkpoint.close()
+    if overflows["truncated"] or overflows["rejected"]:
+        print(f"Prompts over {max_prompt_tokens} tokens: {overflows['truncated']} truncated, {overflows['rejected']} rejected.")
+    return written
+
+
+async def run_inference_async(records, backend, output_file, concurrency=256, **options):
+    """
+    Streams records through the backend into a results file (JSONL unless it ends with .json);
+    `options` are the checkpoint, cache, length-check and render-pool arguments of `stream_inference`.
+
+    Returns:
+        int: The number of written results.
+    """
+    with RecordWriter(output_file) as writer:
+        return await stream_inference(records, backend, writer, concurrency, **options)
+
+
+def run_inference(records, backend, output_file, concurrency=256, checkpoint_file=None, cache=None, **render_options):
+    """
+    Synchronous wrapper around `run_inference_async`; `render_options` are the length-check and render-pool arguments of `stream_inference`.
+    """
+    count = asyncio.run(run_inference_async(records, backend, output_file, concurrency, checkpoint_file=checkpoint_file, cache=cache,
+                                            **render_options))
+    print(f"Saved {count} results to: {output_file}")
+    if cache is not None:
+        stats = cache.stats()
+        print(f"Prompt cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.2%}), "
+              f"{stats['evictions']} evictions, {stats['entries']} entries.")
+    return count
+
+
+def dry_run(records, renderer, output_file=None, max_prompt_tokens=None, overflow="reject"):
+    """
+    Renders the prompts of a test set and counts their tokens without generating anything.
+
+    Args:
+        records (iterable): The test records containing `instruction`.
+        renderer: Object with `render(messages)`, `count_tokens(prompt)` and `truncate(text, max_tokens)`,
+            e.g. a `ChatTemplate` or a `Backend`.
+        output_file (str, optional): Path receiving `{'id', 'prompt', 'prompt_tokens'}` records.
+        max_prompt_tokens (int, optional): Token limit checked as by `run_inference_async`; rejected
+            prompts are counted and left out of the other counts.
+        overflow (str): What happens to longer prompts, one of `OVERFLOW_POLICIES`.
+
+    Returns:
+        dict: Number of prompts, total, mean and maximum token counts, the ID of the longest prompt,
+            and the numbers of truncated and rejected prompts.
+    """
+    summary = {"prompts": 0, "tokens": 0, "mean_tokens": 0.0, "max_tokens": 0, "longest_id": None, "truncated": 0, "rejected": 0}
+    writer = RecordWriter(output_file) if output_file else None
+    try:
+        for item in records:
+            prompt, status = fit_prompt(renderer, build_messages(item), max_prompt_tokens, overflow)
+            if prompt is None:
+                summary["rejected"] += 1
+                continue
+            if status == "truncated":
+                summary["truncated"] += 1
+            tokens = renderer.count_tokens(prompt)
+            item_id = record_id(item)
+            summary["prompts"] += 1
+            summary["tokens"] += tokens
+            if tokens > summary["max_tokens"] or summary["longest_id"] is None:
+                summary["max_tokens"] = tokens
+                summary["longest_id"] = item_id
+            if writer is not None:
+                writer.write({'id': item_id, 'prompt': prompt, 'prompt_tokens': tokens})
+    finally:
+        if writer is not None:
+            writer.close()
+    if summary["prompts"]:
+        summary["mean_tokens"] = summary["tokens"] / summary["prompts"]
+    return summary
+
+
+def run_paths(dataset, ordering, data_dir='data/test', results_dir='results'):
+    """
+    Returns the default input, output and checkpoint paths of a test set.
+    """
+    return {
+        "input": os.path.join(data_dir, ordering, f"{dataset}.json"),
+        "output": os.path.join(results_dir, ordering, f"{dataset}.json"),
+        "checkpoint": os.path.join(results_dir, ordering, f"{dataset}.checkpoint.jsonl"),
+    }
+
+
+def main(argv=None):
+    """
+    Command-line entry point of the inference tools.
+
+    Only the standard library is imported up front: `--help`, `--dry-run` with the echo renderer
+    and planning scripts start immediately, and vLLM (or `transformers` for a dry run with
+    `--model`) is imported once a backend actually needs it.
+    """
+    parser = argparse.ArgumentParser(description="Run inference on a test set with continuous batching.")
+    parser.add_argument("--dataset", choices=DATASETS, default=None, help="Test set; selects the default input, output and checkpoint paths")
+    parser.add_argument("--ordering", choices=ORDERINGS, default="Sequential", help="Premise ordering of the test set")
+    parser.add_argument("--model", type=str, default=None, help="Model path (vllm backend; chat template of --dry-run)")
+    parser.add_argument("--dry-run", action="store_true", help="Only render the prompts and count their tokens; no model is loaded")
+    parser.add_argument("--input", type=str, default=None, help="Test JSON/JSONL file (default: DATA_DIR/ORDERING/DATASET.json)")
+    parser.add_argument("--output", type=str, default=None,
+                        help="Results file (default: RESULTS_DIR/ORDERING/DATASET.json); with --dry-run, optional file of rendered prompts")
+    parser.add_argument("--data-dir", type=str, default="data/test", help="Directory of the test sets")
+    parser.add_argument("--results-dir", type=str, default="results", help="Directory of the results")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="vllm", help="Generation backend")
+    parser.add_argument("--devices", type=str, default=None, help="CUDA_VISIBLE_DEVICES of the vllm backend (default: the environment's, else 0)")
+    parser.add_argument("--response", type=str, default=None, help="Fixed response of the echo backend (default: echo the prompt)")
+    parser.add_argument("--concurrency", type=int, default=256, help="Maximum number of requests in flight")
+    parser.add_argument("--checkpoint", type=str, default=None,
+                        help="JSONL log of finished results; finished records are skipped on restart (default with --dataset: next to the results)")
+    parser.add_argument("--no-checkpoint", action="store_true", help="Do not keep a checkpoint log")
+    parser.add_argument("--cache", type=str, default=None, help="SQLite prompt cache keyed by model, sampling parameters and prompt")
+    parser.add_argument("--cache-max-entries", type=int, default=None, help="Evict least recently used entries above this count")
+    parser.add_argument("--cache-max-mb", type=float, default=None, help="Evict least recently used entries above this size of outputs")
+    parser.add_argument("--max-prompt-tokens", type=int, default=None, help="Token limit of the rendered prompts")
+    parser.add_argument("--overflow", choices=OVERFLOW_POLICIES, default="reject",
+                        help="Longer prompts are rejected (empty output, 'rejected' reason) or truncated in the middle of the question")
+    parser.add_argument("--render-workers", type=int, default=1, help="Number of threads (or processes) rendering chat templates")
+    parser.add_argument("--render-processes", action="store_true", help="Render chat templates in processes instead of threads")
+    parser.add_argument("--render-prefetch", type=int, default=8, help="Number of 32-prompt chunks rendered ahead of the generation")
+    args = parser.parse_args(argv)
+
+    paths = run_paths(args.dataset, args.ordering, args.data_dir, args.results_dir) if args.dataset else {}
+    input_file = args.input or paths.get("input")
+    if input_file is None:
+        parser.error("--dataset or --input is required")
+
+    if args.dry_run:
+        renderer = ChatTemplate(args.model) if args.model and args.backend == "vllm" else EchoBackend()
+        summary = dry_run(iter_records(input_file), renderer, args.output, args.max_prompt_tokens, args.overflow)
+        print(f"{summary['prompts']} prompts, {summary['tokens']} tokens "
+              f"(mean {summary['mean_tokens']:.1f}, max {summary['max_tokens']} for {summary['longest_id']}).")
+        if args.max_prompt_tokens is not None:
+            print(f"Prompts over {args.max_prompt_tokens} tokens: {summary['truncated']} truncated, {summary['rejected']} rejected.")
+        if args.output:
+            print(f"Rendered prompts saved to: {args.output}")
+        return
+
+    output_file = args.output or paths.get("output")
+    if output_file is None:
+        parser.error("--output is required without --dataset")
+    checkpoint_file = None if args.no_checkpoint else args.checkpoint or paths.get("checkpoint")
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+
+    if args.backend == "vllm" and not args.model:
+        parser.error("--model is required with the vllm backend")
+    backend = create_backend(args.backend, args.model, args.response, args.devices)
+
+    cache = None
+    if args.cache:
+        max_bytes = int(args.cache_max_mb * 2 ** 20) if args.cache_max_mb is not None else None
+        cache = PromptCache(args.cache, max_entries=args.cache_max_entries, max_bytes=max_bytes)
+
+    try:
+        run_inference(iter_records(input_file), backend, output_file, args.concurrency, checkpoint_file, cache,
+                      max_prompt_tokens=args.max_prompt_tokens, overflow=args.overflow, render_workers=args.render_workers,
+                      render_processes=args.render_processes, render_prefetch=args.render_prefetch)
+    finally:
+        backend.close()
+        if cache is not None:
+            cache.close()
+
+
+if __name__ == "__main__":
+    main()
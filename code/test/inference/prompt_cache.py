@@ -0,0 +1,109 @@
+import hashlib
+import json
+import sqlite3
+import time
+
+
+class PromptCache:
+    """
+    Persistent cache of generations keyed by (model, sampling parameters, rendered prompt).
+
+    Entries are stored in a SQLite database and evicted in least-recently-used order once the
+    cache holds more than `max_entries` entries or `max_bytes` bytes of outputs.
+
+    Caching only makes sense for deterministic decoding (e.g. `temperature=0`): with sampling,
+    a cached run replays the first sample instead of drawing a new one.
+    """
+
+    def __init__(self, path, max_entries=None, max_bytes=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_access INTEGER NOT NULL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS cache_last_access ON cache (last_access)")
+        self.connection.commit()
+        self.entries, self.bytes = self.connection.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache"
+        ).fetchone()
+
+    @staticmethod
+    def key(identity, prompt):
+        """
+        Builds the cache key of a prompt.
+
+        Args:
+            identity (dict): Identifies the generation setup, i.e. the model path and the full sampling parameters.
+            prompt (str): The rendered chat-template prompt.
+
+        Returns:
+            str: The hexadecimal SHA-256 key.
+        """
+        payload = json.dumps([identity, prompt], ensure_ascii=False, sort_keys=True, default=repr)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        row = self.connection.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.connection.execute("UPDATE cache SET last_access = ? WHERE key = ?", (time.time_ns(), key))
+        return row[0]
+
+    def put(self, key, value):
+        size = len(value.encode('utf-8'))
+        previous = self.connection.execute("SELECT size FROM cache WHERE key = ?", (key,)).fetchone()
+        self.connection.execute(
+            "INSERT OR REPLACE INTO cache (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+            (key, value, size, time.time_ns()),
+        )
+        if previous is None:
+            self.entries += 1
+            self.bytes += size
+        else:
+            self.bytes += size - previous[0]
+        self._evict()
+        self.connection.commit()
+
+    def _evict(self):
+        while (self.max_entries is not None and self.entries > self.max_entries) or \
+                (self.max_bytes is not None and self.bytes > self.max_bytes and self.entries > 1):
+            excess = self.entries - self.max_entries if self.max_entries is not None else 0
+            rows = self.connection.execute(
+                "SELECT key, size FROM cache ORDER BY last_access LIMIT ?", (max(excess, 1),)
+            ).fetchall()
+            self.connection.executemany("DELETE FROM cache WHERE key = ?", [(key,) for key, _ in rows])
+            self.entries -= len(rows)
+            self.bytes -= sum(size for _, size in rows)
+            self.evictions += len(rows)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": self.entries,
+            "bytes": self.bytes,
+        }
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
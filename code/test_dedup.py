@@ -0,0 +1,94 @@
+import random
+
+from dedup import EXACT, NEAR, Deduplicator, fingerprint, similarity
+
+
+def sentence(rng, length=30):
+    return " ".join(rng.choice(["premise", "step", "therefore", "rina", "coffee", "drug", "aware", "student", "not",
+                                "every", "some", "person", "who", "drinks", "is", "a", "dependent", "jokes", "about"])
+                    + str(rng.randrange(1000)) for _ in range(length))
+
+
+def lines(seed, count=6):
+    rng = random.Random(seed)
+    return [f"Step {number}: {sentence(rng)}" for number in range(1, count + 1)]
+
+
+def key(text_lines):
+    return fingerprint({"output": "\n".join(text_lines)})
+
+
+def test_exact_duplicates_ignore_whitespace():
+    index = Deduplicator()
+    text = lines(0)
+    assert index.check(key(text), "first") == (None, None, None)
+    spaced = [line.replace(" ", "  ") + " " for line in text]
+    assert index.check(key(spaced), "second") == (EXACT, "first", 1.0)
+
+
+def test_near_duplicate_at_the_threshold():
+    original = lines(1)
+    # One word changed in every other step.
+    edited = [line.replace(line.split()[10], "changed", 1) if number % 2 else line for number, line in enumerate(original)]
+    score = similarity(key(original)[1], key(edited)[1])
+    assert 0.8 < score < 1
+
+    index = Deduplicator(threshold=score)
+    index.check(key(original), "first")
+    assert index.check(key(edited), "second") == (NEAR, "first", score)
+
+    index = Deduplicator(threshold=score + 1 / 128)
+    index.check(key(original), "first")
+    assert index.check(key(edited), "second") == (None, None, None)
+
+
+def reordered(text_lines):
+    """Swaps the last two steps and renumbers them, so only the numbers and the line order differ."""
+    first, second = text_lines[-2].split(": ", 1)[1], text_lines[-1].split(": ", 1)[1]
+    count = len(text_lines)
+    return text_lines[:-2] + [f"Step {count - 1}: {second}", f"Step {count}: {first}"]
+
+
+def test_order_variants_are_kept():
+    original = lines(2)
+    variant = reordered(original)
+    assert key(variant)[2] == key(original)[2]
+    threshold = similarity(key(original)[1], key(variant)[1])
+    assert threshold > 0.6
+
+    index = Deduplicator(threshold=threshold)
+    index.check(key(original), "first")
+    assert index.check(key(variant), "second") == (None, None, None)
+    assert index.order_variants == 1
+
+    index = Deduplicator(threshold=threshold, keep_order_variants=False)
+    index.check(key(original), "first")
+    assert index.check(key(variant), "second") == (NEAR, "first", threshold)
+
+
+def test_evicted_records_no_longer_match():
+    first, second = lines(3), lines(4)
+    index = Deduplicator(threshold=0.8, max_entries=1)
+    index.check(key(first), "first")
+    index.check(key(second), "second")
+    assert index.evictions == 1
+    assert list(index.entries) == [1] and len(index.exact) == 1
+    # The buckets only hold the bands of the remaining record.
+    assert all(len(bucket) == 1 for bucket in index.buckets)
+    assert index.check(key(first), "again") == (None, None, None)
+
+
+def test_eviction_keeps_bands_overwritten_by_a_later_record():
+    original = lines(5)
+    variant = reordered(original)
+    threshold = similarity(key(original)[1], key(variant)[1])
+    index = Deduplicator(threshold=threshold, max_entries=1)
+    index.check(key(original), "first")
+    # The variant takes over the bands it shares with the first record, which is then evicted.
+    index.check(key(variant), "variant")
+    assert index.evictions == 1
+    assert [list(bucket.values()) for bucket in index.buckets] == [[1]] * index.bands
+
+    edited = variant[:-1] + [variant[-1] + " again"]
+    kind, match, score = index.check(key(edited), "edited")
+    assert (kind, match) == (NEAR, "variant") and score >= threshold
@@ -0,0 +1,93 @@
+import random
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+
+def record_rng(seed, index):
+    """
+    Returns the random generator of the record at position `index`.
+
+    The generator only depends on `seed` and the record index, so results are identical whatever
+    the number of workers or the way records are sharded between them.
+
+    Args:
+        seed (int or None): Base seed of the run; None draws fresh entropy for every record.
+        index (int): Position of the record in the input.
+
+    Returns:
+        random.Random: The seeded random generator.
+    """
+    if seed is None:
+        return random.Random()
+    return random.Random(f"{seed}:{index}")
+
+
+def sample_ranks(total, k, rng=None):
+    """
+    Draws `k` distinct integers uniformly from `range(total)` without materializing the range.
+
+    `random.sample` needs `len(range(total))`, which overflows beyond `sys.maxsize`; larger spaces
+    (e.g. the n! orderings of 21+ items) are sampled by rejection, where collisions are negligible.
+
+    Args:
+        total (int): Size of the space.
+        k (int): Number of integers to draw (at most `total`).
+        rng (random.Random, optional): Random generator; defaults to the `random` module.
+
+    Returns:
+        list: The sampled integers, in sampling order.
+    """
+    rng = rng or random
+    if total <= sys.maxsize:
+        return rng.sample(range(total), k)
+    seen = set()
+    ranks = []
+    while len(ranks) < k:
+        rank = rng.randrange(total)
+        if rank not in seen:
+            seen.add(rank)
+            ranks.append(rank)
+    return ranks
+
+
+def map_records(func, records, workers=1, seed=None, chunk_size=64):
+    """
+    Applies `func(record, rng)` to every record and yields the results in input order.
+
+    With more than one worker the records are sharded by index into contiguous chunks that are
+    processed by a process pool. Only a bounded number of chunks is in flight at once, so the
+    input is consumed lazily.
+
+    Args:
+        func (callable): Module-level (picklable) function taking a record and its random generator.
+        records (iterable): The input records.
+        workers (int): Number of worker processes; 1 runs in the current process.
+        seed (int, optional): Base seed passed to `record_rng`. Without a seed and with a single
+            worker, `func` receives None and may fall back to the global `random` module.
+        chunk_size (int): Number of consecutive records sent to a worker at once.
+
+    Yields:
+        The result of `func` for each record, in input order.
+    """
+    if workers <= 1:
+        for index, record in enumerate(records):
+            yield func(record, record_rng(seed, index) if seed is not None else None)
+        return
+
+    indexed = enumerate(records)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        while True:
+            chunk = list(islice(indexed, chunk_size))
+            if chunk:
+                pending.append(executor.submit(_run_chunk, func, seed, chunk))
+            if pending and (not chunk or len(pending) >= 2 * workers):
+                yield from pending.popleft().result()
+            elif not chunk:
+                return
+
+
+def _run_chunk(func, seed, chunk):
+    return [func(record, record_rng(seed, index)) for index, record in chunk]